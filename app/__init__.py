@@ -15,12 +15,17 @@ from app.config.settings import Config
 # Global variables
 weaviate_client = None
 selenium_driver = None
+shutdown_hooks = []
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # Load and validate the prompt templates up front, so a broken template fails the startup
+    from app.utils.prompt import prompt_registry
+    print(f"Loaded {prompt_registry.load_all()} prompt templates")
+
     # Initialize clients connections
     global weaviate_client
     global selenium_driver
@@ -33,9 +38,20 @@ def create_app(config_class=Config):
     signal.signal(signal.SIGINT, handle_shutdown_signal)
 
     # Register blueprints
-    from app.routes import recommendation_routes, ingestion_routes
+    from app.routes import recommendation_routes, ingestion_routes, metrics_routes
     app.register_blueprint(recommendation_routes.bp)
     app.register_blueprint(ingestion_routes.bp)
+    app.register_blueprint(metrics_routes.bp)
+
+    # Stop background work on shutdown (hooks run in reverse order, jobs first)
+    # and pick up the posts the ingestion jobs left unfinished on startup
+    from app.services.compute.process_pool_service import ProcessPoolService
+    from app.services.client.llm_agent_service import batch_service
+    register_shutdown_hook(ProcessPoolService.shutdown)
+    register_shutdown_hook(batch_service.shutdown)
+    register_shutdown_hook(ingestion_routes.job_service.shutdown)
+    if Config.RESUME_INGESTION_ON_STARTUP:
+        ingestion_routes.job_service.resume()
 
     return app
 
@@ -74,13 +90,28 @@ def connect_to_browser():
     return driver
 
 
+def register_shutdown_hook(hook):
+    """Register a function to run before the client connections are closed on shutdown"""
+    shutdown_hooks.append(hook)
+
+
 def shutdown_app():
     """Perform cleanup when app shuts down"""
     print("Application shutting down, cleaning up resources...")
+    run_shutdown_hooks()
     close_weaviate_connection()
     close_selenium_driver()
 
 
+def run_shutdown_hooks():
+    while shutdown_hooks:
+        hook = shutdown_hooks.pop()
+        try:
+            hook()
+        except Exception as e:
+            print(f"Error in shutdown hook: {e}")
+
+
 def close_weaviate_connection():
     global weaviate_client
     if weaviate_client:
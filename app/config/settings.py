@@ -1,10 +1,14 @@
 import os
+import tempfile
 from enum import Enum
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Suffix of the default cache directories, so every user of the shared temp directory gets their own
+_USER_ID = str(os.getuid()) if hasattr(os, 'getuid') else os.getenv('USERNAME', 'user')
+
 
 class Model(Enum):
     CLAUDE_3_HAIKU = "claude-3-haiku-20240307"
@@ -20,9 +24,144 @@ class Config:
 
     MAX_TOKENS = 1500
 
+    # LLM client settings
+    # Max number of requests in flight to the API across all threads, also the size of the connection pool
+    LLM_MAX_CONCURRENCY = 8
+
+    # LLM response cache settings
+    # Identical requests (same model, prompt and images) are answered from disk instead of the API
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join(tempfile.gettempdir(), f'tapestry_llm_cache_{_USER_ID}'))
+    LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    LLM_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+    # Prompt caching settings
+    # Mark the static prefix of the prompts for provider-side caching
+    LLM_PROMPT_CACHING = True
+    # Price of a cached input token relative to a regular one
+    LLM_PROMPT_CACHE_READ_COST_RATIO = 0.1
+    # Price of writing an input token to the cache relative to a regular one
+    LLM_PROMPT_CACHE_WRITE_COST_RATIO = 1.25
+
+    # LLM cost settings
+    # USD per million input and output tokens of each model
+    LLM_PRICES = {
+        Model.CLAUDE_3_HAIKU.value: {"input": 0.25, "output": 1.25},
+        Model.CLAUDE_3_SONNET.value: {"input": 3.0, "output": 15.0},
+        Model.CLAUDE_3_5_HAIKU.value: {"input": 0.8, "output": 4.0}
+    }
+    # Price of the requests sent in message batches relative to regular ones
+    LLM_BATCH_COST_RATIO = 0.5
+
+    # LLM rate limit settings
+    # Starting pace per model, adapted to the limits the API reports in its response headers
+    LLM_REQUESTS_PER_MINUTE = 50
+    LLM_INPUT_TOKENS_PER_MINUTE = 50000
+    # Rough input token count of an image, to pace requests before their actual usage is known
+    LLM_IMAGE_TOKEN_ESTIMATE = 1600
+    # Retries of failed requests, with jittered exponential backoff
+    LLM_MAX_ATTEMPTS = 5
+    LLM_RETRY_BASE_DELAY_SECONDS = 1
+    LLM_RETRY_MAX_DELAY_SECONDS = 60
+    LLM_RETRY_DEADLINE_SECONDS = 300
+    # Attempts at getting a response that parses as JSON
+    LLM_JSON_MAX_ATTEMPTS = 3
+
+    # LLM latency settings
+    # Timeouts of each request, the read timeout is also cut to the time left before the deadline of the endpoint
+    LLM_CONNECT_TIMEOUT_SECONDS = 10
+    LLM_READ_TIMEOUT_SECONDS = 120
+    # Deadline of each interactive endpoint, its LLM calls stop retrying and fail once it is reached
+    ENDPOINT_DEADLINES_SECONDS = {
+        "analyze_video": 240,
+        "suggest_edits": 90
+    }
+    # On the interactive endpoints, send a duplicate of a request taking longer than this percentile of the recent
+    # latencies of its model and method, and keep the first answer. Off by default since duplicates are billed
+    LLM_HEDGING_ENABLED = os.getenv('LLM_HEDGING_ENABLED', 'false').lower() == 'true'
+    LLM_HEDGE_PERCENTILE = 0.95
+    # Latencies needed before hedging a kind of call, and the number of recent latencies kept
+    LLM_HEDGE_MIN_SAMPLES = 20
+    LLM_HEDGE_WINDOW_SIZE = 200
+    LLM_HEDGE_MIN_DELAY_SECONDS = 1.0
+
+    # Style feature settings
+    # Keyframes per style request, and max number of requests of a video in flight at once
+    LLM_STYLE_CHUNK_SIZE = 5
+    LLM_STYLE_MAX_CONCURRENT_CHUNKS = 3
+    # Threads running the chunk requests of all videos. They mostly wait, on a request slot or on a message batch
+    LLM_STYLE_CHUNK_WORKERS = 256
+
+    # Deferred LLM mode settings
+    # Bulk ingestions can send their LLM requests through the Message Batches API instead of one by one
+    LLM_BATCH_API_URL = os.getenv('LLM_BATCH_API_URL', "https://api.anthropic.com/v1/messages/batches")
+    # A batch is sent once it holds this many requests or its oldest request has waited this long
+    LLM_BATCH_MAX_REQUESTS = 1000
+    LLM_BATCH_MAX_WAIT_SECONDS = 30
+    LLM_BATCH_POLL_SECONDS = 30
+    LLM_BATCH_HTTP_TIMEOUT_SECONDS = 60
+    # A sent batch is failed after this many polls failing in a row, or once it is older than the provider's
+    # 24 hour processing window (with some margin)
+    LLM_BATCH_MAX_POLL_FAILURES = 10
+    LLM_BATCH_MAX_AGE_SECONDS = 25 * 60 * 60
+    # Number of worker threads of the LLM stages in deferred mode, they mostly wait on their batch
+    LLM_DEFERRED_STAGE_CONCURRENCY = 128
+
     # Video processing settings
     MIN_SCENE_CHANGE_THRESHOLD = 15.0
     MIN_INTERVAL_SECONDS = 1.0
+    # Width the frames are downscaled to for the scene change detection, None compares them at full size
+    SCENE_DETECTION_WIDTH = 320
+    # Shot boundary detector of the keyframe extraction (see app/utils/shot_detection.py) and the threshold of each
+    # detector: mean grayscale difference (0-255), histogram Bhattacharyya distance (0-1), differing phash bits (0-64)
+    SHOT_DETECTOR = os.getenv('SHOT_DETECTOR', 'mean_difference')
+    SHOT_DETECTOR_THRESHOLDS = {
+        "mean_difference": MIN_SCENE_CHANGE_THRESHOLD,
+        "histogram": 0.3,
+        "phash": 14
+    }
+    # The adaptive detector raises the threshold of its base detector to factor standard deviations above the mean
+    # of the recent differences, and lowers it down to min ratio of it
+    SHOT_DETECTOR_ADAPTIVE_BASE = 'mean_difference'
+    SHOT_DETECTOR_ADAPTIVE_WINDOW = 30
+    SHOT_DETECTOR_ADAPTIVE_FACTOR = 3.0
+    SHOT_DETECTOR_ADAPTIVE_MIN_RATIO = 0.5
+    # Random access to frames: number of videos whose keyframe index is kept, time allowed to index a video,
+    # and the gap past which a video without an index is sought through instead of decoded forward
+    FRAME_INDEX_CACHE_SIZE = 64
+    FRAME_INDEX_TIMEOUT_SECONDS = 30
+    FRAME_READER_MAX_FORWARD_SECONDS = 2.0
+    # Keyframes of a video analysis are kept as JPEG, in memory up to this size per request and on disk beyond it
+    KEYFRAME_STORE_MAX_MEMORY_BYTES = 32 * 1024 * 1024
+    KEYFRAME_STORE_QUALITY = 95
+    KEYFRAME_STORE_DIR = os.getenv('KEYFRAME_STORE_DIR', tempfile.gettempdir())
+
+    # Image payload settings
+    # Longest edge in pixels (None keeps the frame size) and JPEG quality of the frames sent by each LLM call site.
+    # A frame is encoded once per policy, so call sites sharing frames (style and visual) share the encoding
+    # as long as their policies are the same
+    IMAGE_POLICIES = {
+        "default": {"max_edge": 1568, "quality": 90},
+        "summary": {"max_edge": 1092, "quality": 85},
+        "hook": {"max_edge": 1092, "quality": 85},
+        "visual": {"max_edge": 1092, "quality": 85},
+        "style": {"max_edge": 1092, "quality": 85}
+    }
+    # Keyframes whose perceptual hashes differ by at most this many bits are sent once, -1 sends them all
+    IMAGE_DEDUP_MAX_DISTANCE = 6
+    # Max number of encoded frames memoized in memory, enough for the call sites of a few posts to share them
+    ENCODED_FRAME_MEMO_SIZE = 64
+
+    # CPU worker pool settings
+    # Number of worker processes for transcription and audio/video feature extraction, 0 runs them inline
+    CPU_POOL_WORKERS = max((os.cpu_count() or 2) - 1, 1)
+    CPU_POOL_THREADS_PER_WORKER = 1
+    CPU_POOL_START_METHOD = "spawn"
+    # Load the transcription model when a worker starts
+    CPU_POOL_WARM_UP = True
+    # Videos at least this long are split into segments of at least the given length, decoded on several workers
+    SEGMENTED_DECODE_MIN_SECONDS = 120
+    SEGMENTED_DECODE_MIN_SEGMENT_SECONDS = 30
 
     # Audio processing settings
     AUDIO_MODELS = [
@@ -43,6 +182,10 @@ class Config:
     WEAVIATE_URL = os.getenv('WEAVIATE_URL')
     WEAVIATE_API_KEY = os.getenv('WEAVIATE_API_KEY')
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    # How long known collections and records are remembered in memory
+    VECTOR_DB_KNOWN_TTL_SECONDS = 600
+    # Max number of ids per existence check query
+    VECTOR_DB_EXISTS_CHUNK_SIZE = 500
 
     # Scoring Settings
     WEIGHTS = {
@@ -53,9 +196,48 @@ class Config:
         "recentness": 0.1  # Recentness
     }
 
+    # Video download settings
+    # Max number of scrapes in flight
+    DOWNLOAD_CONCURRENCY = 4
+    # Random gap between two scrapes of the same host
+    DOWNLOAD_MIN_DELAY_SECONDS = 5
+    DOWNLOAD_MAX_DELAY_SECONDS = 15
+
     # Mini batch size for processing videos
     BATCH_SIZE = 10
 
+    # Streaming ingestion settings
+    # When enabled, every post moves through the stages on its own instead of waiting for its batch
+    STREAMING_INGESTION = True
+    # Max number of posts waiting in front of each stage
+    STAGE_QUEUE_SIZE = 2
+    # Number of worker threads per ingestion stage
+    STAGE_CONCURRENCY = {
+        "download": 4,
+        "prepare_media": 4,
+        "transcribe": 4,
+        # Style, hook and visual features of a post are extracted in parallel
+        "features": 4,
+        "audio": 4,
+        "shooting_style": 2,
+        "cleanup": 1
+    }
+
+    # Ingestion job settings
+    # Jobs share the scraper browser, so they run one at a time by default
+    INGEST_JOB_WORKERS = 1
+    # Max number of finished jobs kept in memory for polling
+    INGEST_JOB_HISTORY = 100
+
+    # Ingestion journal settings, kept in the user's data directory so it survives reboots and redeploys
+    # (set INGESTION_JOURNAL_PATH to move it, e.g. to a persistent volume). Its directory is made private to the user.
+    INGESTION_JOURNAL_PATH = os.getenv('INGESTION_JOURNAL_PATH', os.path.join(
+        os.getenv('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share'),
+        'tapestry', 'ingestion_journal.db'
+    ))
+    # Resume the posts left unfinished by the previous run when the app starts
+    RESUME_INGESTION_ON_STARTUP = True
+
     # Dataframe constants
     LOCAL_VIDEO_PATH = "local_video_path"
     LOCAL_AUDIO_PATH = "local_audio_path"
@@ -67,3 +249,40 @@ class Config:
     HOOK = "hook"
     VISUAL = "visual"
     AUDIO = "audio"
+    MEDIA = "media"
+
+    # LLM budget settings
+    # Default token and cost budget of each ingestion job, None for no limit
+    LLM_JOB_TOKEN_BUDGET = None
+    LLM_JOB_COST_BUDGET_USD = None
+    # Share of the budget after which the calls of the job are moved to the cheaper model below
+    LLM_BUDGET_DEGRADE_RATIO = 0.8
+    LLM_DEGRADED_MODELS = {
+        Model.CLAUDE_3_SONNET.value: Model.CLAUDE_3_5_HAIKU.value,
+        Model.CLAUDE_3_5_HAIKU.value: Model.CLAUDE_3_HAIKU.value
+    }
+    # Stages skipped once the budget is used up: the visual features, and the UGC style call of the shooting style
+    LLM_BUDGET_OPTIONAL_STAGES = [VISUAL, SHOOTING_STYLE]
+
+    # Artifact cache settings
+    ARTIFACT_CACHE_ENABLED = True
+    ARTIFACT_CACHE_DIR = os.getenv(
+        'ARTIFACT_CACHE_DIR', os.path.join(tempfile.gettempdir(), f'tapestry_artifacts_{_USER_ID}')
+    )
+    ARTIFACT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+    # Bump a stage version to invalidate its cached artifacts
+    ARTIFACT_STAGE_VERSIONS = {
+        TRANSCRIPT: "1",
+        STYLE: "2",
+        HOOK: "1",
+        VISUAL: "2",
+        AUDIO: "1",
+        SHOOTING_STYLE: "1"
+    }
+    # LLM stages are also versioned by the content of their prompts
+    ARTIFACT_STAGE_PROMPTS = {
+        STYLE: ["style_feature_extractor"],
+        HOOK: ["hook_frame_analyzer"],
+        VISUAL: ["visual_feature_extractor"],
+        SHOOTING_STYLE: ["UGC_style_identifier"]
+    }
@@ -0,0 +1,119 @@
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Dict, List, Optional
+
+from app.utils.usage import UsageTracker
+
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLING = "cancelling"
+    CANCELLED = "cancelled"
+
+
+class PostStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    SAVED = "saved"
+
+
+@dataclass
+class PostProgress:
+    post_id: str
+    status: PostStatus = PostStatus.QUEUED
+    stage: Optional[str] = None
+    completed_stages: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "post_id": self.post_id,
+            "status": self.status.value,
+            "stage": self.stage,
+            "completed_stages": list(self.completed_stages),
+            "error": self.error
+        }
+
+
+@dataclass
+class IngestionJob:
+    total: int
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    # LLM requests go through message batches
+    deferred_llm: bool = False
+    # LLM usage of the job's posts, and its optional budget
+    usage: UsageTracker = field(default_factory=UsageTracker, repr=False)
+    posts: Dict[str, PostProgress] = field(default_factory=dict)
+    results: List[dict] = field(default_factory=list)
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+    def start_stage(self, post_id, stage: str):
+        with self.lock:
+            progress = self._get_post(post_id)
+            progress.status = PostStatus.RUNNING
+            progress.stage = stage
+
+    def complete_stage(self, post_id, stage: str):
+        with self.lock:
+            self._get_post(post_id).completed_stages.append(stage)
+
+    def set_post_status(self, post_id, status: PostStatus, error: Optional[str] = None):
+        with self.lock:
+            progress = self._get_post(post_id)
+            progress.status = status
+            progress.error = error
+
+    def add_results(self, saved_posts: List[dict]):
+        with self.lock:
+            self.results.extend(saved_posts)
+            for post in saved_posts:
+                self._get_post(post["post_id"]).status = PostStatus.SAVED
+
+    def to_dict(self, include_results: bool = True) -> dict:
+        with self.lock:
+            counts = {status.value: 0 for status in PostStatus}
+            for progress in self.posts.values():
+                counts[progress.status.value] += 1
+
+            job = {
+                "job_id": self.job_id,
+                "status": self.status.value,
+                "llm_mode": "deferred" if self.deferred_llm else "interactive",
+                "total": self.total,
+                "progress": counts,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "error": self.error,
+                "llm_usage": self.usage.to_dict(include_posts=include_results)
+            }
+            if include_results:
+                job["posts"] = [progress.to_dict() for progress in self.posts.values()]
+                job["count"] = len(self.results)
+                job["data"] = list(self.results)
+            return job
+
+    def _get_post(self, post_id) -> PostProgress:
+        post_id = str(post_id)
+        if post_id not in self.posts:
+            self.posts[post_id] = PostProgress(post_id=post_id)
+        return self.posts[post_id]
@@ -1,11 +1,13 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Dict
-from typing import List, Optional
+from typing import List, Optional, Union
 
 import numpy as np
 from pydantic import BaseModel, HttpUrl
 
+from app.utils.frame_store import StoredFrame
+
 
 class TaggedUser(BaseModel):
     user_id: str
@@ -100,7 +102,7 @@ class VideoRequest(BaseModel):
 class KeyframeContext:
     frame_number: int
     timestamp: float
-    image: np.ndarray
+    image: Union[np.ndarray, StoredFrame]
     audio_transcript: Optional[str]
     window_start: float
     window_end: float
@@ -153,3 +155,30 @@ class Video(BaseModel):
     # url: str
     # post_id: int
     visual: VisualFeatures
+
+
+@dataclass
+class MediaBundle:
+    """
+    Everything the feature stages need from one video, produced by a single decoding pass
+    """
+    video_path: str
+    fps: float
+    frame_count: int
+    duration: float
+    # (frame_number, timestamp, frame) for the whole video, the frames are StoredFrame when a KeyframeStore is used
+    keyframes: List[tuple] = field(default_factory=list)
+    # Number of keyframes within the opening segment and the closing frame of that segment
+    prefix_count: Optional[int] = None
+    prefix_tail: Optional[tuple] = None
+    hook_frame: Optional[Union[np.ndarray, StoredFrame]] = None
+    # PCM wav of the audio track
+    audio_path: Optional[str] = None
+
+    @property
+    def prefix_keyframes(self) -> List[tuple]:
+        """Keyframes of the opening segment, sharing the frames of the full list"""
+        if self.prefix_count is None:
+            return self.keyframes
+        prefix = self.keyframes[:self.prefix_count]
+        return prefix + [self.prefix_tail] if self.prefix_tail else prefix
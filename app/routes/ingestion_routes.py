@@ -1,29 +1,82 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, url_for
 
 from app.services.ingestion_service import IngestionService
+from app.services.job_service import JobService
 from app.utils.dataframe import get_dataframe
+from app.utils.usage import LlmBudget
 
 bp = Blueprint('ingestion_routes', __name__, url_prefix='/ingest')
 
 ingestion_service = IngestionService()
+job_service = JobService(ingestion_service)
 
 
 @bp.route('/', methods=['POST'])
-def ingest_records() -> Response:
+def ingest_records():
     data = request.json
     if not isinstance(data, list):
         data = [data]
 
     posts = get_dataframe(data)
+    if posts.empty or 'post_id' not in posts.columns:
+        return jsonify({'error': 'No posts provided'}), 400
 
-    # TODO: remove this line later
-    posts = posts.head(25)
+    # Backfills can trade latency for the higher limits and lower price of message batches
+    llm_mode = request.args.get('llm_mode', 'interactive')
+    if llm_mode not in ('interactive', 'deferred'):
+        return jsonify({'error': "llm_mode must be 'interactive' or 'deferred'"}), 400
 
-    saved_posts = ingestion_service.process(posts)
+    # Optional LLM budget of the job, past which it moves to cheaper models and then skips the optional stages
+    try:
+        token_budget = _get_positive_arg('token_budget', int)
+        cost_budget_usd = _get_positive_arg('cost_budget_usd', float)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    budget = LlmBudget(token_budget, cost_budget_usd) if token_budget or cost_budget_usd else None
 
-    response = {
-        'count': len(saved_posts),
-        'data': saved_posts
-    }
+    # Posts are processed in the background, the client polls the job for progress
+    job = job_service.submit(posts, deferred_llm=llm_mode == 'deferred', budget=budget)
 
-    return jsonify(response)
+    status_url = url_for('ingestion_routes.get_ingest_job', job_id=job.job_id)
+    return jsonify(job.to_dict(include_results=False)), 202, {'Location': status_url}
+
+
+@bp.route('/resume', methods=['POST'])
+def resume_ingestion():
+    job = job_service.resume()
+    if job is None:
+        return jsonify({'message': 'No unfinished posts to resume'})
+
+    status_url = url_for('ingestion_routes.get_ingest_job', job_id=job.job_id)
+    return jsonify(job.to_dict(include_results=False)), 202, {'Location': status_url}
+
+
+@bp.route('/<job_id>', methods=['GET'])
+def get_ingest_job(job_id: str):
+    job = job_service.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job.to_dict())
+
+
+@bp.route('/<job_id>', methods=['DELETE'])
+def cancel_ingest_job(job_id: str):
+    job = job_service.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job.to_dict(include_results=False)), 202
+
+
+def _get_positive_arg(name: str, number_type):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        number = number_type(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got '{value}'")
+    if number <= 0:
+        raise ValueError(f"{name} must be positive, got {value}")
+    return number
@@ -0,0 +1,17 @@
+from flask import Blueprint, Response, jsonify
+
+from app.utils.metrics import registry
+from app.utils.usage import usage_tracker
+
+bp = Blueprint('metrics_routes', __name__)
+
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@bp.route('/usage', methods=['GET'])
+def get_llm_usage():
+    # Usage of every LLM call since the app started, see the ingestion jobs for the usage of their posts
+    return jsonify(usage_tracker.to_dict())
@@ -3,8 +3,10 @@ from typing import List
 
 from flask import Blueprint, request, jsonify
 
+from app.config.settings import Config
 from app.models.video import Video
 from app.services.recommendation_service import RecommendationService
+from app.utils.context import DeadlineExceededError, request_deadline
 
 bp = Blueprint('video', __name__)
 recommendation_service = RecommendationService()
@@ -26,13 +28,16 @@ def analyze_video():
             return jsonify({'error': 'Video file not found at specified path'}), 404
 
         # Process the video directly from the path
-        summary, screenplay = recommendation_service.process_video(video_path, caption)
+        with request_deadline(Config.ENDPOINT_DEADLINES_SECONDS.get('analyze_video')):
+            summary, screenplay = recommendation_service.process_video(video_path, caption)
 
         return jsonify({
             'summary': summary,
             'screenplay': screenplay['screenplay'],
         })
 
+    except DeadlineExceededError as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -53,9 +58,12 @@ def suggest_edits():
         2. then perform comparison
         """
 
-        edits = recommendation_service.suggest_edits(high_performing_videos, low_performing_video)
+        with request_deadline(Config.ENDPOINT_DEADLINES_SECONDS.get('suggest_edits')):
+            edits = recommendation_service.suggest_edits(high_performing_videos, low_performing_video)
 
         return jsonify(edits)
 
+    except DeadlineExceededError as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
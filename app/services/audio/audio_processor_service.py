@@ -39,6 +39,18 @@ class AudioProcessorService:
             print(f"Error transcribing audio: {e}")
             return ""
 
+    def warm_up(self):
+        """
+        Load the transcription model ahead of the first request by transcribing a second of silence
+        """
+        if self.model != 'whisper':
+            return
+        silence = AudioData(b'\x00\x00' * 16000, sample_rate=16000, sample_width=2)
+        try:
+            self.recognizer.recognize_whisper(silence)
+        except Exception as e:
+            print(f"Error warming up the transcription model: {e}")
+
     def _get_transcript(self, audio: AudioData) -> str:
         if self.model == 'google':
             return self.recognizer.recognize_google(audio)
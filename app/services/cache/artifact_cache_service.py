@@ -0,0 +1,67 @@
+import hashlib
+from typing import Any, Callable, Optional
+
+from app.config.settings import Config
+from app.utils.disk_cache import DiskCache
+from app.utils.prompt import load_prompt
+
+
+class ArtifactCacheService:
+    """
+    Persistent store for the expensive per-post stage outputs (transcript, LLM features, audio features).
+    Artifacts are keyed by post_id, stage name and stage version, where the version of an LLM stage
+    also covers the content of its prompts, so editing a prompt invalidates the stale artifacts.
+    """
+
+    def __init__(self):
+        self.enabled = Config.ARTIFACT_CACHE_ENABLED
+        self.store = DiskCache(Config.ARTIFACT_CACHE_DIR, Config.ARTIFACT_CACHE_MAX_BYTES) if self.enabled else None
+        self.versions = {}
+
+    def get_or_compute(self, post_id: Any, stage: str, compute: Callable[[], Any],
+                       should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Return the cached artifact of the stage, or compute and store it.
+
+        Args:
+            post_id: Post the artifact belongs to, nothing is cached without it
+            stage: Stage name
+            compute: Function computing the artifact
+            should_cache: Optional check to skip storing failed results (None is never stored)
+
+        Returns:
+            The stage artifact
+        """
+        if not self.enabled or post_id is None:
+            return compute()
+
+        key = self._get_key(post_id, stage)
+        artifact = self.store.get(key)
+        if artifact is not None:
+            print(f"Using cached {stage} artifact for post {post_id}")
+            return artifact
+
+        artifact = compute()
+        if artifact is not None and (should_cache is None or should_cache(artifact)):
+            self.store.set(key, artifact)
+        return artifact
+
+    def contains(self, post_id: Any, stage: str) -> bool:
+        if not self.enabled or post_id is None:
+            return False
+        return self.store.get(self._get_key(post_id, stage)) is not None
+
+    def get_stage_version(self, stage: str) -> str:
+        if stage not in self.versions:
+            version = hashlib.sha256(Config.ARTIFACT_STAGE_VERSIONS.get(stage, "1").encode('utf-8'))
+            for prompt_name in Config.ARTIFACT_STAGE_PROMPTS.get(stage, []):
+                version.update(load_prompt(prompt_name).encode('utf-8'))
+            self.versions[stage] = version.hexdigest()[:16]
+        return self.versions[stage]
+
+    """
+        Helper functions
+    """
+
+    def _get_key(self, post_id: Any, stage: str) -> str:
+        return DiskCache.make_key(str(post_id), stage, self.get_stage_version(stage))
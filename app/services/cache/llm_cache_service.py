@@ -0,0 +1,47 @@
+import json
+from typing import Any, Optional
+
+from app.config.settings import Config
+from app.utils.disk_cache import DiskCache
+from app.utils.metrics import registry
+
+llm_cache_lookups = registry.counter(
+    "tapestry_llm_cache_lookups_total", "Number of LLM response cache lookups", ["result"]
+)
+
+
+class LlmCacheService:
+    """
+    Content-addressed store of LLM responses. A response is keyed by the model, max tokens and the whole request
+    content, prompt text and image data included, so an identical request is answered without calling the API.
+    """
+
+    def __init__(self):
+        self.enabled = Config.LLM_CACHE_ENABLED
+        self.store = DiskCache(
+            Config.LLM_CACHE_DIR, Config.LLM_CACHE_MAX_BYTES, Config.LLM_CACHE_TTL_SECONDS
+        ) if self.enabled else None
+
+    def get(self, model: str, max_tokens: int, content: Any) -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        response = self.store.get(self._get_key(model, max_tokens, content))
+        llm_cache_lookups.inc(result="hit" if response is not None else "miss")
+        return response
+
+    def set(self, model: str, max_tokens: int, content: Any, response: str):
+        if self.enabled:
+            self.store.set(self._get_key(model, max_tokens, content), response)
+
+    def delete(self, model: str, max_tokens: int, content: Any):
+        if self.enabled:
+            self.store.delete(self._get_key(model, max_tokens, content))
+
+    """
+        Helper functions
+    """
+
+    def _get_key(self, model: str, max_tokens: int, content: Any) -> str:
+        # Images are base64 blocks of the content, so their bytes are part of the key
+        return DiskCache.make_key(model, max_tokens, json.dumps(content, sort_keys=True))
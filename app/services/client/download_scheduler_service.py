@@ -0,0 +1,42 @@
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from app.config.settings import Config
+from app.services.client.scraper_service import ScraperService
+from app.utils.rate_limit import PolitenessPolicy
+
+
+class DownloadSchedulerService:
+    """
+    Runs scraper downloads concurrently up to a limit while keeping a polite, randomized gap
+    between requests to the same host. Only the scrapes wait, S3 hits and other stages never do.
+    """
+
+    def __init__(self, scraper: ScraperService):
+        self.scraper = scraper
+        self.slots = threading.BoundedSemaphore(Config.DOWNLOAD_CONCURRENCY)
+        self.policies: Dict[str, PolitenessPolicy] = {}
+        self.lock = threading.Lock()
+
+    def download(self, video_url: str, filename: str) -> Optional[str]:
+        policy = self._get_policy(urlparse(video_url).netloc)
+
+        waited = policy.wait_turn()
+        if waited > 0:
+            print(f"Waited {waited:.1f}s before scraping {video_url}")
+
+        with self.slots:
+            return self.scraper.download_video(video_url, filename)
+
+    """
+        Helper functions
+    """
+
+    def _get_policy(self, host: str) -> PolitenessPolicy:
+        with self.lock:
+            if host not in self.policies:
+                self.policies[host] = PolitenessPolicy(
+                    Config.DOWNLOAD_MIN_DELAY_SECONDS, Config.DOWNLOAD_MAX_DELAY_SECONDS
+                )
+            return self.policies[host]
@@ -1,61 +1,137 @@
 import json
+import threading
 import time
-from typing import List, Optional, Dict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import List, Optional, Dict, Tuple
 
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 
 from app.config.settings import Config
 from app.models.video import KeyframeContext
 from app.models.video import ShootingStyle
-from app.utils.prompt import load_prompt, extract_json
-from app.utils.video import frame_to_base64
+from app.services.cache.llm_cache_service import LlmCacheService
+from app.services.client.llm_batch_service import LlmBatchError, LlmBatchService
+from app.utils.context import (
+    DeadlineExceededError, check_deadline, get_llm_post_id, get_llm_usage_tracker, get_remaining_seconds,
+    is_deferred_llm, submit_in_context
+)
+from app.utils.hedging import HedgePolicy, hedged_call
+from app.utils.metrics import llm_cost, llm_hedged_requests, llm_prompt_cache_saved_tokens, llm_requests, llm_tokens
+from app.utils.prompt import extract_json, prompt_blocks
+from app.utils.rate_limit import AdaptiveRateLimiter, RetryPolicy, parse_reset_seconds
+from app.utils.usage import BudgetState, LlmUsage, get_llm_budget_state, usage_tracker
+from app.utils.video import frame_to_base64, get_image_policy, order_by_information
+
+
+class LlmApiError(Exception):
+    """Failed request to the LLM API"""
+
+    RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+    def __init__(self, message: str, status_code: Optional[int] = None, error_type: Optional[str] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.error_type = error_type
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        # Requests that never got a response (connection errors, timeouts) are retried as well
+        return self.status_code is None or self.status_code in self.RETRYABLE_STATUS_CODES
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.LLM_MAX_CONCURRENCY)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Shared by all the agents: keep-alive connections to the API, a cap on the requests in flight
+# and the rate limiters of the models
+_session = _create_session()
+_request_slots = threading.BoundedSemaphore(Config.LLM_MAX_CONCURRENCY)
+# Runs the style chunk requests of all the videos, these are leaf calls so waiting on them can't deadlock
+_chunk_executor = ThreadPoolExecutor(max_workers=Config.LLM_STYLE_CHUNK_WORKERS, thread_name_prefix="llm-chunk")
+_rate_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+# Latencies of the interactive calls, and the workers sending them when they are hedged
+_hedge_policy = HedgePolicy(
+    Config.LLM_HEDGE_PERCENTILE,
+    Config.LLM_HEDGE_MIN_SAMPLES,
+    Config.LLM_HEDGE_WINDOW_SIZE,
+    Config.LLM_HEDGE_MIN_DELAY_SECONDS
+)
+_hedge_executor = ThreadPoolExecutor(max_workers=2 * Config.LLM_MAX_CONCURRENCY, thread_name_prefix="llm-hedge")
+# Collects the requests made in deferred mode into message batches
+batch_service = LlmBatchService()
 
 
 class LlmAgentService:
     def __init__(self):
         self.base_model = Config.MODEL.CLAUDE_3_HAIKU.value
+        self.cache = LlmCacheService()
+        self.retry_policy = RetryPolicy(
+            Config.LLM_MAX_ATTEMPTS,
+            Config.LLM_RETRY_BASE_DELAY_SECONDS,
+            Config.LLM_RETRY_MAX_DELAY_SECONDS,
+            Config.LLM_RETRY_DEADLINE_SECONDS
+        )
+
+    def _generate_response(self, content, model=None, method="unknown", refresh_cache=False):
+        """
+        In deferred mode (see app.utils.context) the request goes into a message batch
+        and the call blocks until the batch has ended.
 
-    def _generate_response(self, content, model=None):
-        model = self.base_model if not model else model
-        while True:
-            try:
-                response = requests.post(
-                    Config.LLM_API_URL,
-                    headers={
-                        "x-api-key": Config.LLM_API_KEY,
-                        "anthropic-version": Config.LLM_API_VERSION,
-                        "content-type": "application/json"
-                    },
-                    json={
-                        "model": model,
-                        "max_tokens": Config.MAX_TOKENS,
-                        "messages": [{
-                            "role": "user",
-                            "content": content
-                        }]
-                    }
-                )
-
-                if response.status_code != 200:
-                    res = response.json()
-                    if res['type'] == "error" and res['error']['type'] == "rate_limit_error":
-                        time.sleep(60)
-                        continue
-
-                    raise Exception(res)
+        Args:
+            content: Message content blocks
+            model: Model to use, defaults to the base model
+            method: Agent method making the request, for the metrics
+            refresh_cache: Skip the cached response and replace it with a new one
 
-                return response.json()["content"][0]["text"]
-            except Exception as e:
-                raise e
+        Returns:
+            Text of the response
 
-    def _generate_json_response(self, content, model=None):
-        while True:
+        Raises:
+            LlmApiError: The request failed and could not be retried, or ran out of attempts
+        """
+        model = self._get_model(model)
+        if not refresh_cache:
+            cached_response = self.cache.get(model, Config.MAX_TOKENS, content)
+            if cached_response is not None:
+                self._track_usage(model, method, LlmUsage(cached_calls=1))
+                return cached_response
+
+        deferred = is_deferred_llm()
+        if deferred:
+            body = self._get_deferred_response(content, model, method)
+        else:
+            body = self._get_interactive_response(content, model, method)
+        self._record_usage(model, method, body.get("usage", {}), batch=deferred)
+
+        text = body["content"][0]["text"]
+        self.cache.set(model, Config.MAX_TOKENS, content, text)
+        return text
+
+    def _generate_json_response(self, content, model=None, method="unknown"):
+        refresh_cache = False
+        for attempt in range(1, Config.LLM_JSON_MAX_ATTEMPTS + 1):
             try:
-                raw_response = self._generate_response(content, model)
+                raw_response = self._generate_response(content, model, method, refresh_cache)
                 return extract_json(raw_response)
-            except json.JSONDecodeError:
+            except json.JSONDecodeError as e:
+                if attempt == Config.LLM_JSON_MAX_ATTEMPTS:
+                    raise e
                 print(f"Retrying JSON response generation...")
+                # The cached response is the one that didn't parse
+                refresh_cache = True
+            except ValueError as e:
+                self.cache.delete(self._get_model(model), Config.MAX_TOKENS, content)
+                raise e
             except Exception as e:
                 raise e
 
@@ -81,21 +157,20 @@ class LlmAgentService:
 
         try:
             # Load and format the prompt
-            prompt_template = load_prompt('summary_generator')
             post_caption = caption if caption is not None else ""
-            prompt = prompt_template.replace("{caption}", post_caption)
-
-            content = [{"type": "text", "text": prompt}]
+            content = prompt_blocks('summary_generator', {"{caption}": post_caption})
             for kf in keyframes:
                 content.extend([
                     create_moment_header(kf),
-                    frame_to_base64(kf.image),
+                    frame_to_base64(kf.image, get_image_policy("summary")),
                     create_audio_transcript(kf)
                 ])
 
-            analysis_data = self._generate_json_response(content)
+            analysis_data = self._generate_json_response(content, method="generate_summary")
             summary = analysis_data["summary"]
             return summary
+        except DeadlineExceededError:
+            raise
         except Exception as e:
             print(f"Error in generate_summary: {str(e)}")
             return {}
@@ -105,10 +180,8 @@ class LlmAgentService:
         Generate screenplay from video analysis and complete transcript.
         """
         try:
-            prompt_template = load_prompt('screenplay_generator', provider='recommendation')
-
             content = [
-                {"type": "text", "text": prompt_template},
+                *prompt_blocks('screenplay_generator', provider='recommendation'),
                 {"type": "text",
                  "text": f"=== Video Analysis ===\n"
                          f"{json.dumps(summary, indent=2)}\n\n"
@@ -116,153 +189,68 @@ class LlmAgentService:
                          f"{complete_transcript}"}
             ]
 
-            screenplay_data = self._generate_json_response(content)
+            screenplay_data = self._generate_json_response(content, method="generate_screenplay")
             return screenplay_data
+        except DeadlineExceededError:
+            raise
         except Exception as e:
             print(f"Error in generate_screenplay: {str(e)}")
             return {}
 
-    def generate_screen_hook(self, frame: np.ndarray) -> str:
-        """
-        Extract the hook text from a video frame using Claude AI
-
-        Args:
-            frame: Frame in numpy array
-
-        Returns:
-            str: Extracted hook text or error message
-        """
-        if frame is None:
-            return "Error: Could not extract frame from video."
-
-        base64_image = frame_to_base64(frame)
-        content = [{
-            "type": "text",
-            "text": "This is a frame from a video. Please identify and extract the main caption or hook text that "
-                    "appears on the screen. Focus only on the text that appears to be the main attention-grabbing "
-                    "statement or hook. If there is no hook, return 'NO HOOK'."
-                    "Return just the text without any additional commentary."
-        }, base64_image]
-
-        try:
-            response = self._generate_response(content)
-            if response == 'NO HOOK':
-                return 'No caption text detected on screen.'
-            return response
-        except Exception as e:
-            print(f"API error in caption extraction: {e}")
-            return f"Error: Caption extraction failed"
-
-    def generate_visual_style(self, frame: np.ndarray) -> str:
-        """
-        Get a concise 10-15 word description of what the creator is doing
-
-        Args:
-            frame (np.ndarray): Video image frame
-
-        Returns:
-            str: Concise description of the visual style
-        """
-        if frame is None:
-            return "Error: Could not extract frame from video."
-
-        prompt = load_prompt("visual_style_generator")
-
-        base64_image = frame_to_base64(frame)
-        content = [{
-            "type": "text",
-            "text": prompt
-        }, base64_image]
-
-        try:
-            response = self._generate_response(content)
-            words = response.split()
-            if len(words) > 15:
-                response = ' '.join(words[:15])
-            return response
-        except Exception as e:
-            print(f"API error in visual style generation: {e}")
-            return f"Error: Visual Style generation failed"
-
-    def generate_hook_analysis(self, frame: np.ndarray, transcript: str = "") -> ShootingStyle:
+    def analyze_hook_frame(self, frame: np.ndarray, transcript: str = "") -> Tuple[str, ShootingStyle]:
         """
-        Analyze the given frame and transcript to describe what the creator is doing and provide actionable instructions
+        Extract the screen hook and analyze the style of the hook frame in a single call
 
         Args:
-            frame (np.ndarray): Image frame from the TikTok video
+            frame (np.ndarray): Hook frame of the TikTok video
             transcript (str): The video transcript to enhance style analysis
 
         Returns:
-            ShootingStyle: Detailed style information with actionable instructions
+            tuple[screen hook text, ShootingStyle]
         """
-
-        def format_hook_details(analysis_text: str) -> Dict:
-            creator_instructions = ""
-
-            if "VISUAL_STYLE:" in analysis_text and "AUDIO_STYLE:" in analysis_text:
-                parts = analysis_text.split("AUDIO_STYLE:")
-                visual_part = parts[0].split("VISUAL_STYLE:")[1].strip()
-                visual_style = visual_part
-
-                if "CREATOR_INSTRUCTIONS:" in parts[1]:
-                    remaining = parts[1].split("CREATOR_INSTRUCTIONS:")
-                    audio_style = remaining[0].strip()
-                    creator_instructions = remaining[1].strip()
-                else:
-                    audio_style = parts[1].strip()
-            else:
-                # Fallback if the format is different
-                visual_style = "Could not parse visual style from analysis."
-                audio_style = "Could not parse audio style from analysis."
-                creator_instructions = analysis_text  # Just use the full text as instructions
-
-            return {
-                "visual_style": visual_style,
-                "audio_style": audio_style,
-                "creator_instructions": creator_instructions
-            }
-
         if frame is None:
-            return ShootingStyle(
-                visual_style_summary="Error: Could not extract frame from video.",
-                visual_style="Error: Could not extract frame from video.",
+            error = "Error: Could not extract frame from video."
+            return error, ShootingStyle(
+                visual_style_summary=error,
+                visual_style=error,
                 audio_style="Error: Could not analyze audio style.",
                 creator_instructions="Error: Could not generate instructions."
             )
 
-        visual_style_summary = self.generate_visual_style(frame)
-
-        """
-        We should remove the below code. 
-        We are asking LLM to generate something without providing much context.
-        [hook_analysis_generator] prompt
-        """
-
         transcript = transcript if transcript else ''
         transcript = transcript if len(transcript) <= 500 else transcript[:500] + '...'
 
-        prompt_template = load_prompt('hook_analysis_generator')
-        prompt = prompt_template.replace("{transcript}", transcript)
-
-        base64_image = frame_to_base64(frame)
-        content = [{
-            "type": "text",
-            "text": prompt
-        }, base64_image]
+        content = [
+            *prompt_blocks('hook_frame_analyzer', {"{transcript}": transcript}),
+            frame_to_base64(frame, get_image_policy("hook"))
+        ]
 
         try:
-            response = self._generate_response(content)
-            formatted_response = format_hook_details(response)
-            return ShootingStyle(
+            response = self._generate_json_response(content, method="analyze_hook_frame")
+
+            screen_hook = str(response.get("screen_hook") or "NO HOOK").strip()
+            if screen_hook == 'NO HOOK':
+                screen_hook = 'No caption text detected on screen.'
+
+            visual_style_summary = str(response.get("visual_style_summary", "")).strip()
+            words = visual_style_summary.split()
+            if len(words) > 15:
+                visual_style_summary = ' '.join(words[:15])
+
+            creator_instructions = response.get("creator_instructions", "")
+            if isinstance(creator_instructions, list):
+                creator_instructions = "\n".join(str(step) for step in creator_instructions)
+
+            return screen_hook, ShootingStyle(
                 visual_style_summary=visual_style_summary,
-                visual_style=formatted_response['visual_style'],
-                audio_style=formatted_response['audio_style'],
-                creator_instructions=formatted_response['creator_instructions']
+                visual_style=str(response.get("visual_style", "")).strip(),
+                audio_style=str(response.get("audio_style", "")).strip(),
+                creator_instructions=str(creator_instructions).strip()
             )
         except Exception as e:
-            print(f"API error in scene analysis: {e}")
-            return ShootingStyle(
-                visual_style_summary=visual_style_summary,
+            print(f"API error in hook frame analysis: {e}")
+            return "Error: Caption extraction failed", ShootingStyle(
+                visual_style_summary="Error: Visual Style generation failed",
                 visual_style="Error: Scene analysis failed",
                 audio_style="Error: Could not analyze audio style",
                 creator_instructions="Error: Could not generate instructions"
@@ -270,18 +258,18 @@ class LlmAgentService:
 
     def generate_visual_features(self, keyframes: List[KeyframeContext]):
         try:
-            prompt = load_prompt('visual_feature_extractor')
-
-            content = [{"type": "text", "text": prompt}]
+            content = prompt_blocks('visual_feature_extractor')
 
             # Add each moment as input
             for kf in keyframes:
                 content.extend([
                     {"type": "text", "text": f"\n=== Moment {kf.frame_number} ===\n"},
-                    frame_to_base64(kf.image)
+                    frame_to_base64(kf.image, get_image_policy("visual"))
                 ])
 
-            response = self._generate_json_response(content, model=Config.MODEL.CLAUDE_3_SONNET.value)
+            response = self._generate_json_response(
+                content, model=Config.MODEL.CLAUDE_3_SONNET.value, method="generate_visual_features"
+            )
             return response
 
         except Exception as e:
@@ -291,18 +279,17 @@ class LlmAgentService:
     def suggest_edits(self, comparison_request: dict) -> Optional[str]:
 
         try:
-            prompt = load_prompt('edit_recommendations', provider='recommendation')
-
-            content = [{
-                "type": "text",
-                "text": prompt
-            }, {
+            content = [*prompt_blocks('edit_recommendations', provider='recommendation'), {
                 "type": "text",
                 "text": json.dumps(comparison_request)
             }]
 
-            response = self._generate_response(content, model=Config.MODEL.CLAUDE_3_SONNET.value)
+            response = self._generate_response(
+                content, model=Config.MODEL.CLAUDE_3_SONNET.value, method="suggest_edits"
+            )
             return response
+        except DeadlineExceededError:
+            raise
         except Exception as e:
             print(f"Error in suggest_edits: {str(e)}")
             return None
@@ -323,49 +310,238 @@ class LlmAgentService:
                 "product_visible": None
             }
 
-        prompt = load_prompt('style_feature_extractor')
+        prompt = prompt_blocks('style_feature_extractor')
 
-        image_contents = [frame_to_base64(keyframe[2]) for keyframe in keyframes]
+        # Frames that differ the most from each other go first, so the first chunks are the most likely to settle it
+        image_policy = get_image_policy("style")
+        image_contents = [frame_to_base64(keyframe[2], image_policy) for keyframe in order_by_information(keyframes)]
 
-        chunks = [image_contents[x:x + 5] for x in range(0, len(image_contents), 5)]
+        chunk_size = Config.LLM_STYLE_CHUNK_SIZE
+        chunks = [image_contents[x:x + chunk_size] for x in range(0, len(image_contents), chunk_size)]
 
         face_visible = hand_visible = product_visible = False
+        pending = set()
+        next_chunk = 0
 
-        for chunk in chunks:
-            content = [{
-                "type": "text",
-                "text": prompt
-            }]
-            content.extend(chunk)
+        # At most LLM_STYLE_MAX_CONCURRENT_CHUNKS chunks are in flight, the next one is only sent when one finishes.
+        # Once the answer is settled (or failed) the remaining chunks are never sent, the ones in flight finish
+        # on their own since a sent request can't be taken back.
+        try:
+            while True:
+                while next_chunk < len(chunks) and len(pending) < Config.LLM_STYLE_MAX_CONCURRENT_CHUNKS:
+                    pending.add(
+                        submit_in_context(_chunk_executor, self._analyze_style_chunk, prompt, chunks[next_chunk])
+                    )
+                    next_chunk += 1
+                if not pending:
+                    break
 
-            try:
-                response = self._generate_json_response(content, model=Config.MODEL.CLAUDE_3_5_HAIKU.value)
-                face_visible = face_visible or response['face_visible']
-                hand_visible = hand_visible or response['hand_visible']
-                product_visible = product_visible or response['product_visible']
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    response = future.result()
+                    face_visible = face_visible or response['face_visible']
+                    hand_visible = hand_visible or response['hand_visible']
+                    product_visible = product_visible or response['product_visible']
                 if face_visible and product_visible:
                     break
-            except Exception as e:
-                print(f"API error in keyframe analysis: {e}")
-                return {
-                    "creator_visible": None,
-                    "product_visible": None
-                }
+        except Exception as e:
+            print(f"API error in keyframe analysis: {e}")
+            return {
+                "creator_visible": None,
+                "product_visible": None
+            }
 
         return {
             'creator_visible': "Face is visible" if face_visible else ("Only hands" if hand_visible else "No"),
             'product_visible': product_visible
         }
 
-    def identify_UGC_style(self, full_script: str) -> Optional[str]:
-        prompt_template = load_prompt('UGC_style_identifier')
-        prompt = prompt_template.replace("{{TRANSCRIPT}}", full_script)
-
-        content = [{"type": "text", "text": prompt}]
+    def identify_UGC_style(self, full_script: str, refresh_cache: bool = False) -> Optional[str]:
+        content = prompt_blocks('UGC_style_identifier', {"{{TRANSCRIPT}}": full_script})
 
         try:
-            response = self._generate_response(content)
+            response = self._generate_response(content, method="identify_UGC_style", refresh_cache=refresh_cache)
             return response
         except Exception as e:
             print(f"API error in UGC style identification: {str(e)}")
             return None
+
+    """
+        Helper functions
+    """
+
+    def _get_interactive_response(self, content, model: str, method: str) -> dict:
+        rate_limiter = self._get_rate_limiter(model)
+        estimated_tokens = self._estimate_input_tokens(content)
+        start = time.monotonic()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            check_deadline(method)
+            rate_limiter.acquire(estimated_tokens)
+            try:
+                response = self._send(content, model, method)
+            except requests.RequestException as e:
+                error = LlmApiError(f"Request to the LLM API failed: {e}")
+                rate_limiter.record_usage(estimated_tokens, 0)
+            else:
+                rate_limiter.update_from_headers(
+                    response.headers, "anthropic-ratelimit-requests", "anthropic-ratelimit-input-tokens"
+                )
+                if response.status_code == 200:
+                    body = response.json()
+                    usage = body.get("usage", {})
+                    rate_limiter.record_usage(
+                        estimated_tokens,
+                        usage.get("input_tokens", estimated_tokens) + usage.get("cache_creation_input_tokens", 0)
+                    )
+                    return body
+                error = self._get_api_error(response)
+
+            delay = self.retry_policy.get_delay(attempt, error.retry_after)
+            if error.status_code == 429:
+                # Hold back the other requests to the model too, the backoff stands in for a missing retry-after
+                rate_limiter.pause(delay)
+            if not error.retryable or not self.retry_policy.can_retry(attempt, time.monotonic() - start, delay):
+                raise error
+            remaining = get_remaining_seconds()
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceededError(f"Deadline exceeded while retrying {method}: {error}")
+
+            print(f"Retrying {method} in {delay:.1f}s (attempt {attempt}): {error}")
+            time.sleep(delay)
+
+    def _get_deferred_response(self, content, model: str, method: str) -> dict:
+        # Batches have their own limits, so the request neither waits on the rate limiter nor holds a request slot
+        try:
+            body = batch_service.submit(self._get_request_params(content, model)).result()
+        except LlmBatchError as e:
+            raise LlmApiError(f"Deferred {method} request failed: {e}")
+        return body
+
+    def _get_request_params(self, content, model: str) -> dict:
+        return {
+            "model": model,
+            "max_tokens": Config.MAX_TOKENS,
+            "messages": [{
+                "role": "user",
+                "content": content
+            }]
+        }
+
+    def _send(self, content, model: str, method: str) -> requests.Response:
+        # Only the interactive endpoints, which run under a deadline, are hedged
+        if not Config.LLM_HEDGING_ENABLED or get_remaining_seconds() is None:
+            return self._post(content, model, method)
+        delay = _hedge_policy.get_delay((model, method))
+        if delay is None:
+            return self._post(content, model, method)
+
+        response, winner = hedged_call(
+            _hedge_executor,
+            lambda: self._post(content, model, method),
+            delay,
+            on_discarded=lambda future: self._record_discarded_response(future, model, method),
+            # A fast 429 or 5xx must not beat a slower success, the retries handle the case where both fail
+            is_success=lambda response: response.status_code == 200
+        )
+        if winner != "not_hedged":
+            llm_hedged_requests.inc(model=model, method=method, winner=winner)
+        return response
+
+    def _post(self, content, model: str, method: str) -> requests.Response:
+        remaining = get_remaining_seconds()
+        read_timeout = Config.LLM_READ_TIMEOUT_SECONDS
+        if remaining is not None:
+            read_timeout = max(min(read_timeout, remaining), 0.1)
+
+        start = time.monotonic()
+        with _request_slots, llm_requests.track(model=model, method=method) as call:
+            response = _session.post(
+                Config.LLM_API_URL,
+                headers={
+                    "x-api-key": Config.LLM_API_KEY,
+                    "anthropic-version": Config.LLM_API_VERSION,
+                    "content-type": "application/json"
+                },
+                json=self._get_request_params(content, model),
+                timeout=(Config.LLM_CONNECT_TIMEOUT_SECONDS, read_timeout)
+            )
+            if response.status_code != 200:
+                call.set_error()
+        _hedge_policy.observe((model, method), time.monotonic() - start)
+        return response
+
+    def _record_discarded_response(self, future: Future, model: str, method: str):
+        # The losing request of a hedge is billed as well
+        try:
+            response = future.result()
+            if response.status_code == 200:
+                self._record_usage(model, method, response.json().get("usage", {}))
+        except Exception as e:
+            print(f"Error in reading the discarded response of {method}: {e}")
+
+    def _analyze_style_chunk(self, prompt: List[dict], images: List[dict]) -> dict:
+        return self._generate_json_response(
+            [*prompt, *images], model=Config.MODEL.CLAUDE_3_5_HAIKU.value, method="generate_style_features"
+        )
+
+    def _get_model(self, model: Optional[str]) -> str:
+        model = self.base_model if not model else model
+        # Past the degrade threshold of the job's budget, calls move to a cheaper model
+        if get_llm_budget_state() != BudgetState.OK:
+            return Config.LLM_DEGRADED_MODELS.get(model, model)
+        return model
+
+    def _record_usage(self, model: str, method: str, usage: dict, batch: bool = False):
+        call_usage = LlmUsage.from_response(model, usage, batch)
+        llm_tokens.inc(call_usage.input_tokens, model=model, kind="input")
+        llm_tokens.inc(call_usage.output_tokens, model=model, kind="output")
+        llm_tokens.inc(call_usage.cache_write_tokens, model=model, kind="cache_write")
+        llm_tokens.inc(call_usage.cache_read_tokens, model=model, kind="cache_read")
+        llm_cost.inc(call_usage.cost_usd, model=model, method=method)
+        llm_prompt_cache_saved_tokens.inc(
+            call_usage.cache_read_tokens * (1 - Config.LLM_PROMPT_CACHE_READ_COST_RATIO), model=model
+        )
+        self._track_usage(model, method, call_usage)
+
+    def _track_usage(self, model: str, method: str, call_usage: LlmUsage):
+        usage_tracker.record(model, method, call_usage)
+        job_tracker = get_llm_usage_tracker()
+        if job_tracker is not None:
+            job_tracker.record(model, method, call_usage, get_llm_post_id())
+
+    def _get_api_error(self, response: requests.Response) -> LlmApiError:
+        try:
+            res = response.json()
+            error_type = res.get('error', {}).get('type')
+        except ValueError:
+            res = response.text
+            error_type = None
+        return LlmApiError(
+            str(res),
+            status_code=response.status_code,
+            error_type=error_type,
+            retry_after=parse_reset_seconds(response.headers.get("retry-after"))
+        )
+
+    def _get_rate_limiter(self, model: str) -> AdaptiveRateLimiter:
+        # The API limits each model separately
+        with _rate_limiters_lock:
+            if model not in _rate_limiters:
+                _rate_limiters[model] = AdaptiveRateLimiter(
+                    Config.LLM_REQUESTS_PER_MINUTE, Config.LLM_INPUT_TOKENS_PER_MINUTE
+                )
+            return _rate_limiters[model]
+
+    def _estimate_input_tokens(self, content) -> int:
+        if isinstance(content, str):
+            return len(content) // 4
+        tokens = 0
+        for block in content:
+            if block.get("type") == "image":
+                tokens += Config.LLM_IMAGE_TOKEN_ESTIMATE
+            else:
+                tokens += len(block.get("text", "")) // 4
+        return tokens
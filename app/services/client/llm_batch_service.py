@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from app.config.settings import Config
+
+
+class LlmBatchError(Exception):
+    """Deferred request that failed, expired or was cancelled"""
+
+
+@dataclass
+class BatchRequest:
+    params: dict
+    custom_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    future: Future = field(default_factory=Future)
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class SentBatch:
+    requests: Dict[str, BatchRequest]
+    created_at: float = field(default_factory=time.monotonic)
+    # Polls that failed in a row
+    poll_failures: int = 0
+
+
+class LlmBatchService:
+    """
+    Collects the deferred LLM requests of every thread and sends them to the Message Batches API in bulk.
+    A batch is sent once it is full or its oldest request has waited long enough, and the ended batches' results
+    resolve the futures of their requests. Batches trade latency for higher throughput limits and a lower price.
+    """
+
+    def __init__(self):
+        self.pending: List[BatchRequest] = []
+        self.in_flight: Dict[str, SentBatch] = {}
+        self.session = requests.Session()
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = False
+
+    def submit(self, params: dict) -> Future:
+        """
+        Queue a request for the next batch
+
+        Args:
+            params: Messages API parameters of the request (model, max_tokens, messages)
+
+        Returns:
+            Future resolved with the response message, or failed with an LlmBatchError
+        """
+        request = BatchRequest(params)
+        with self.condition:
+            if self.stopped:
+                raise LlmBatchError("The batch service is shut down")
+            self.pending.append(request)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="llm-batches", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return request.future
+
+    def shutdown(self):
+        """Stop collecting, failing the requests that were not sent yet. Sent batches are left to the provider."""
+        with self.condition:
+            self.stopped = True
+            pending, self.pending = self.pending, []
+            in_flight, self.in_flight = self.in_flight, {}
+            self.condition.notify()
+
+        sent = [request for batch in in_flight.values() for request in batch.requests.values()]
+        for request in pending + sent:
+            request.future.set_exception(LlmBatchError("The batch service was shut down"))
+
+    """
+        Helper functions
+    """
+
+    def _run(self):
+        last_poll = 0.0
+        while True:
+            with self.condition:
+                if self.stopped:
+                    return
+                self.condition.wait(timeout=1.0)
+                batch = self._take_batch()
+
+            if batch:
+                self._create_batch(batch)
+
+            if self.in_flight and time.monotonic() - last_poll >= Config.LLM_BATCH_POLL_SECONDS:
+                last_poll = time.monotonic()
+                for batch_id in list(self.in_flight):
+                    self._poll_batch(batch_id)
+
+    def _take_batch(self) -> List[BatchRequest]:
+        if not self.pending:
+            return []
+        full = len(self.pending) >= Config.LLM_BATCH_MAX_REQUESTS
+        waited = time.monotonic() - self.pending[0].queued_at >= Config.LLM_BATCH_MAX_WAIT_SECONDS
+        if not full and not waited:
+            return []
+
+        batch = self.pending[:Config.LLM_BATCH_MAX_REQUESTS]
+        self.pending = self.pending[Config.LLM_BATCH_MAX_REQUESTS:]
+        return batch
+
+    def _create_batch(self, batch: List[BatchRequest]):
+        try:
+            response = self.session.post(
+                Config.LLM_BATCH_API_URL,
+                headers=self._get_headers(),
+                json={"requests": [{"custom_id": request.custom_id, "params": request.params} for request in batch]},
+                timeout=Config.LLM_BATCH_HTTP_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+            batch_id = response.json()["id"]
+        except Exception as e:
+            print(f"Error in creating a message batch of {len(batch)} requests: {e}")
+            for request in batch:
+                request.future.set_exception(LlmBatchError(f"Batch creation failed: {e}"))
+            return
+
+        print(f"Created message batch {batch_id} with {len(batch)} requests")
+        with self.condition:
+            stopped = self.stopped
+            if not stopped:
+                self.in_flight[batch_id] = SentBatch({request.custom_id: request for request in batch})
+        if stopped:
+            for request in batch:
+                request.future.set_exception(LlmBatchError("The batch service was shut down"))
+
+    def _poll_batch(self, batch_id: str):
+        try:
+            response = self.session.get(
+                f"{Config.LLM_BATCH_API_URL}/{batch_id}",
+                headers=self._get_headers(),
+                timeout=Config.LLM_BATCH_HTTP_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+            batch = response.json()
+            if batch.get("processing_status") != "ended":
+                self._fail_stale_batch(batch_id)
+                return
+            results = self._get_results(batch["results_url"])
+        except Exception as e:
+            # Polling errors are usually transient and the batch is polled again later, unless they keep coming
+            print(f"Error in polling message batch {batch_id}: {e}")
+            self._fail_stale_batch(batch_id, e)
+            return
+
+        with self.condition:
+            sent_batch = self.in_flight.pop(batch_id, None)
+        # Failed by shutdown or _fail_stale_batch meanwhile
+        if sent_batch is None:
+            return
+        requests_by_id = sent_batch.requests
+
+        for result in results:
+            request = requests_by_id.pop(result.get("custom_id"), None)
+            if request is None:
+                continue
+            outcome = result.get("result", {})
+            if outcome.get("type") == "succeeded":
+                request.future.set_result(outcome["message"])
+            else:
+                request.future.set_exception(LlmBatchError(f"Deferred request {outcome.get('type')}: {outcome}"))
+
+        for request in requests_by_id.values():
+            request.future.set_exception(LlmBatchError("Deferred request missing from the batch results"))
+        print(f"Message batch {batch_id} ended")
+
+    def _fail_stale_batch(self, batch_id: str, error: Optional[Exception] = None):
+        """
+        Fail the requests of a batch whose polls keep failing (e.g. unknown id, expired results, revoked key)
+        or that is older than any batch should be, so their callers don't wait forever
+        """
+        with self.condition:
+            sent_batch = self.in_flight.get(batch_id)
+            if sent_batch is None:
+                return
+            sent_batch.poll_failures = sent_batch.poll_failures + 1 if error is not None else 0
+            if sent_batch.poll_failures >= Config.LLM_BATCH_MAX_POLL_FAILURES:
+                reason = f"{sent_batch.poll_failures} polls failed in a row, last error: {error}"
+            elif time.monotonic() - sent_batch.created_at >= Config.LLM_BATCH_MAX_AGE_SECONDS:
+                reason = f"batch still not ended after {Config.LLM_BATCH_MAX_AGE_SECONDS}s"
+            else:
+                return
+            del self.in_flight[batch_id]
+
+        print(f"Giving up on message batch {batch_id}: {reason}")
+        for request in sent_batch.requests.values():
+            request.future.set_exception(LlmBatchError(f"Message batch {batch_id} failed: {reason}"))
+
+    def _get_results(self, results_url: str) -> List[Dict[str, Any]]:
+        response = self.session.get(
+            results_url, headers=self._get_headers(), timeout=Config.LLM_BATCH_HTTP_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+    def _get_headers(self) -> dict:
+        return {
+            "x-api-key": Config.LLM_API_KEY,
+            "anthropic-version": Config.LLM_API_VERSION,
+            "content-type": "application/json"
+        }
@@ -4,6 +4,7 @@ import boto3
 from botocore.exceptions import ClientError
 
 from app.config.settings import Config
+from app.utils.metrics import dependency_calls
 
 
 class S3Service:
@@ -13,6 +14,7 @@ class S3Service:
                                    aws_secret_access_key=Config.AWS_SECRET_KEY,
                                    region_name=Config.AWS_REGION)
 
+    @dependency_calls.wrap(dependency="s3", operation="exists_in_bucket")
     def exists_in_bucket(self, bucket_name: str, filename: str) -> bool:
         try:
             self.client.head_object(Bucket=bucket_name, Key=filename)
@@ -23,6 +25,7 @@ class S3Service:
             else:
                 raise e
 
+    @dependency_calls.wrap(dependency="s3", operation="upload", is_error=lambda location: location is None)
     def upload_to_s3(self, bucket_name: str, filename: str, temp_file: str) -> str | None:
         try:
             object_name = f"{filename}"
@@ -48,6 +51,7 @@ class S3Service:
     #         print(f"Error downloading {s3_url}: {e}")
     #         return False
 
+    @dependency_calls.wrap(dependency="s3", operation="download", is_error=lambda downloaded: not downloaded)
     def download_from_s3(self, s3_url: str, local_path: str) -> bool:
         try:
             # Parse the S3 URL
@@ -1,12 +1,19 @@
-from typing import List, Optional
+from typing import Iterable, List, Optional, Set
 
 from weaviate.classes.query import Filter
 from weaviate.util import generate_uuid5
 
+from app.config.settings import Config
+from app.utils.cache import TtlSet
+from app.utils.metrics import dependency_calls
+
 
 class VectorDBService:
     def __init__(self, client):
         self.client = client
+        # Short-lived memory of collections and records known to exist, to save DB round trips
+        self.known_collections = TtlSet(Config.VECTOR_DB_KNOWN_TTL_SECONDS)
+        self.known_records = TtlSet(Config.VECTOR_DB_KNOWN_TTL_SECONDS)
 
     def create_collection(self, schema: dict) -> bool:
         collection_name = schema.get('collection_name', None)
@@ -18,14 +25,16 @@ class VectorDBService:
             return False
 
         try:
-            if self.client.collections.exists(collection_name):
+            if self._collection_exists(collection_name):
                 return True
 
-            self.client.collections.create(
-                name=collection_name,
-                vectorizer_config=vectorizer,
-                properties=properties
-            )
+            with dependency_calls.track(dependency="weaviate", operation="create_collection"):
+                self.client.collections.create(
+                    name=collection_name,
+                    vectorizer_config=vectorizer,
+                    properties=properties
+                )
+            self.known_collections.add(collection_name)
             print(f"Collection created: {collection_name}")
             return True
         except Exception as e:
@@ -40,65 +49,114 @@ class VectorDBService:
             print(f"Error: Incorrect schema object - {schema}")
             return False
 
-        if not self.client.collections.exists(collection_name):
+        if not self._collection_exists(collection_name):
             print(f"Error: Collection does not exist - {collection_name}")
             return False
 
         collection = self.client.collections.get(collection_name)
 
-        with collection.batch.dynamic() as batch:
-            for record in records:
-                record_uuid = generate_uuid5(record[primary_key])
-                batch.add_object(
-                    properties=record,
-                    uuid=record_uuid
-                )
-                if batch.number_errors > 10:
-                    print("Batch import stopped due to excessive errors.")
-                    break
-
-        failed_objects = collection.batch.failed_objects
-        if failed_objects:
-            print(f"Number of failed imports: {len(failed_objects)}")
-            return False
-
+        with dependency_calls.track(dependency="weaviate", operation="batch_add") as call:
+            with collection.batch.dynamic() as batch:
+                for record in records:
+                    record_uuid = generate_uuid5(record[primary_key])
+                    batch.add_object(
+                        properties=record,
+                        uuid=record_uuid
+                    )
+                    if batch.number_errors > 10:
+                        print("Batch import stopped due to excessive errors.")
+                        break
+
+            failed_objects = collection.batch.failed_objects
+            if failed_objects:
+                call.set_error()
+                print(f"Number of failed imports: {len(failed_objects)}")
+                return False
+
+        self.known_records.update((collection_name, str(record[primary_key])) for record in records)
         print(f"Added batch of size {len(records)} to the Vector DB")
         return True
 
     def record_exists(self, schema: dict, primary_key: any) -> bool:
+        return str(primary_key) in self.records_exist(schema, [primary_key])
+
+    def records_exist(self, schema: dict, primary_keys: Iterable) -> Set[str]:
+        """
+        Check which records already exist in the collection.
+        Keys seen recently are answered from memory, the rest are resolved with one filtered fetch on their uuids.
+
+        Args:
+            schema: Collection schema
+            primary_keys: Primary keys of the records to check
+
+        Returns:
+            Set of the primary keys (as strings) that exist in the collection
+        """
         collection_name = schema.get('collection_name', None)
 
-        if not self.client.collections.exists(collection_name):
+        keys = {str(primary_key) for primary_key in primary_keys}
+        existing = {key for key in keys if (collection_name, key) in self.known_records}
+        unknown = list(keys - existing)
+        if not unknown:
+            return existing
+
+        if not self._collection_exists(collection_name):
             print(f"Error: Collection does not exist - {collection_name}")
-            return False
+            return existing
 
-        record_uuid = generate_uuid5(primary_key)
         collection = self.client.collections.get(collection_name)
+        chunk_size = Config.VECTOR_DB_EXISTS_CHUNK_SIZE
+
+        for start in range(0, len(unknown), chunk_size):
+            uuid_to_key = {generate_uuid5(key): key for key in unknown[start:start + chunk_size]}
+            with dependency_calls.track(dependency="weaviate", operation="fetch_objects"):
+                response = collection.query.fetch_objects(
+                    filters=Filter.by_id().contains_any(list(uuid_to_key.keys())),
+                    limit=len(uuid_to_key),
+                    return_properties=[]
+                )
+            found = {uuid_to_key[str(obj.uuid)] for obj in response.objects if str(obj.uuid) in uuid_to_key}
+            existing.update(found)
+            self.known_records.update((collection_name, key) for key in found)
 
-        if collection.data.exists(record_uuid):
-            print(f"Record exists in Vector DB already: {record_uuid}")
-            return True
-        return False
+        if existing:
+            print(f"Records exist in Vector DB already: {len(existing)} of {len(keys)}")
+        return existing
 
     def search(self, schema: dict, query: str, limit: int = 5, offset: int = 0) -> Optional[List[dict]]:
 
         collection_name = schema.get('collection_name', None)
-        if not self.client.collections.exists(collection_name):
+        if not self._collection_exists(collection_name):
             print(f"Error: Collection does not exist - {collection_name}")
             return None
 
         collection = self.client.collections.get(collection_name)
         try:
-            response = collection.query.hybrid(
-                query=query,
-                filters=(
-                        Filter.by_property("shooting_style").equal("Problem - Solution") &
-                        Filter.by_property("impact_score").greater_than(50)
-                ),
-                limit=limit,
-                offset=offset
-            )
+            with dependency_calls.track(dependency="weaviate", operation="hybrid_search"):
+                response = collection.query.hybrid(
+                    query=query,
+                    filters=(
+                            Filter.by_property("shooting_style").equal("Problem - Solution") &
+                            Filter.by_property("impact_score").greater_than(50)
+                    ),
+                    limit=limit,
+                    offset=offset
+                )
             return response.objects
         except Exception as e:
             print(f"Error in search query: {e}")
             return None
+
+    """
+        Helper functions
+    """
+
+    def _collection_exists(self, collection_name: str) -> bool:
+        if collection_name in self.known_collections:
+            return True
+        with dependency_calls.track(dependency="weaviate", operation="collection_exists"):
+            exists = self.client.collections.exists(collection_name)
+        if exists:
+            self.known_collections.add(collection_name)
+            return True
+        return False
@@ -0,0 +1,176 @@
+import dataclasses
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import Config
+from app.models.video import MediaBundle
+from app.utils.frame_store import KeyframeStore
+from app.utils.shot_detection import ShotDetector
+from app.utils.video import encode_frame
+
+# Per-process services, created once by the pool initializer so every task runs on a warm worker
+_audio_processor = None
+_video_processor = None
+
+
+def _init_worker():
+    global _audio_processor
+    global _video_processor
+
+    # Import the heavy libraries once per worker instead of on the first task
+    import cv2  # noqa: F401
+    import librosa  # noqa: F401
+    import parselmouth  # noqa: F401
+
+    from app.services.audio.audio_processor_service import AudioProcessorService
+    from app.services.visual.video_processor_service import VideoProcessorService
+
+    _audio_processor = AudioProcessorService()
+    _video_processor = VideoProcessorService()
+    if Config.CPU_POOL_WARM_UP:
+        _audio_processor.warm_up()
+
+
+def _transcribe(audio_path: str, start_time: Optional[float], end_time: Optional[float]) -> str:
+    return _audio_processor.transcribe(audio_path, start_time, end_time)
+
+
+def _isolate_speech(audio_path: str) -> Optional[str]:
+    return _audio_processor.isolate_speech(audio_path)
+
+
+def _extract_audio_features(speech_audio_path: str) -> dict:
+    return _audio_processor.extract_audio_features(speech_audio_path)
+
+
+def _extract_keyframes(video_path: str, max_duration_seconds: Optional[float]) -> List[tuple]:
+    return _video_processor.extract_keyframes(video_path, max_duration_seconds)
+
+
+def _scan_segment(video_path: str, start_frame: int, end_frame: Optional[int],
+                  shot_detector: Optional[ShotDetector]) -> np.ndarray:
+    return _video_processor.scan_segment(video_path, start_frame, end_frame, shot_detector)
+
+
+def _prepare_media(video_path: str, include_video: bool, include_audio: bool,
+                   quality: Optional[int]) -> MediaBundle:
+    bundle = _video_processor.prepare_media(video_path, include_video=include_video, include_audio=include_audio)
+    if quality is None:
+        return bundle
+    # Frames going to a keyframe store are encoded here, once and at the store's quality, so the parent keeps the
+    # bytes as they are and they cross the process boundary at a fraction of the size of the arrays
+    return _map_bundle_frames(bundle, lambda frame: encode_frame(frame, quality))
+
+
+def _map_bundle_frames(bundle: MediaBundle, func) -> MediaBundle:
+    keyframes = [(frame_number, timestamp, func(frame)) for frame_number, timestamp, frame in bundle.keyframes]
+    prefix_tail = None
+    if bundle.prefix_tail:
+        frame_number, timestamp, frame = bundle.prefix_tail
+        prefix_tail = (frame_number, timestamp, func(frame))
+    hook_frame = func(bundle.hook_frame) if bundle.hook_frame is not None else None
+    return dataclasses.replace(bundle, keyframes=keyframes, prefix_tail=prefix_tail, hook_frame=hook_frame)
+
+
+class ProcessPoolService:
+    """
+    Runs the CPU-bound audio and video work on a shared pool of warm worker processes,
+    so that concurrent posts use all the cores instead of the calling thread's one.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _lock = threading.Lock()
+
+    def __init__(self, max_workers: int = Config.CPU_POOL_WORKERS):
+        self.max_workers = max_workers
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def transcribe(self, audio_path: str, start_time: float | None = None, end_time: float | None = None) -> str:
+        return self._run(_transcribe, audio_path, start_time, end_time)
+
+    def isolate_speech(self, audio_path: str) -> Optional[str]:
+        return self._run(_isolate_speech, audio_path)
+
+    def extract_audio_features(self, speech_audio_path: str) -> dict:
+        return self._run(_extract_audio_features, speech_audio_path)
+
+    def extract_keyframes(self, video_path: str, max_duration_seconds: Optional[float] = None) -> List[tuple]:
+        return self._run(_extract_keyframes, video_path, max_duration_seconds)
+
+    def prepare_media(self, video_path: str, include_video: bool = True, include_audio: bool = True,
+                      keyframe_store: Optional[KeyframeStore] = None) -> MediaBundle:
+        # Frames come back as arrays, or as JPEG bytes ready for the store, never encoded twice
+        if keyframe_store is None:
+            return self._run(_prepare_media, video_path, include_video, include_audio, None)
+        bundle = self._run(_prepare_media, video_path, include_video, include_audio, keyframe_store.quality)
+        return _map_bundle_frames(bundle, keyframe_store.add_encoded)
+
+    def scan_segments(self, video_path: str, segments: List[Tuple[int, Optional[int]]],
+                      shot_detector: Optional[ShotDetector] = None) -> np.ndarray:
+        """
+        Scan the segments of a video on several workers at once
+
+        Args:
+            video_path: Path to the video file
+            segments: Consecutive (start frame, end frame) segments, see VideoProcessorService.get_segments
+            shot_detector: Detector computing the differences, the one select_keyframes will apply
+                (None for the workers' default one)
+
+        Returns:
+            Scene differences of all the frames, in order
+        """
+        return np.concatenate(self._run_all(
+            _scan_segment, [(video_path, start, end, shot_detector) for start, end in segments]
+        ))
+
+    @classmethod
+    def shutdown(cls, wait: bool = False):
+        """Stop the pool, cancelling the queued tasks. wait blocks until the worker processes have exited."""
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    """
+        Helper functions
+    """
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if ProcessPoolService._executor is None:
+                # Each worker gets its own cores, keep the numeric libraries from spawning threads of their own
+                os.environ.setdefault("OMP_NUM_THREADS", str(Config.CPU_POOL_THREADS_PER_WORKER))
+                os.environ.setdefault("MKL_NUM_THREADS", str(Config.CPU_POOL_THREADS_PER_WORKER))
+                ProcessPoolService._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(Config.CPU_POOL_START_METHOD),
+                    initializer=_init_worker
+                )
+            return ProcessPoolService._executor
+
+    def _run(self, func, *args):
+        return self._run_all(func, [args])[0]
+
+    def _run_all(self, func, args_list: List[tuple]) -> list:
+        executor = self._get_executor()
+        try:
+            futures = [executor.submit(func, *args) for args in args_list]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory), start a fresh pool and retry once
+            print(f"Process pool is broken, restarting it to retry {func.__name__}")
+            with self._lock:
+                if ProcessPoolService._executor is executor:
+                    ProcessPoolService._executor = None
+            executor = self._get_executor()
+            futures = [executor.submit(func, *args) for args in args_list]
+            return [future.result() for future in futures]
@@ -1,12 +1,19 @@
-from typing import Optional, List
+import math
+from typing import Any, Optional, List
 
 import cv2
 
-from app.models.video import KeyframeContext
+from app.config.settings import Config
+from app.models.video import KeyframeContext, MediaBundle
 from app.services.audio.audio_processor_service import AudioProcessorService
+from app.services.cache.artifact_cache_service import ArtifactCacheService
 from app.services.client.llm_agent_service import LlmAgentService
+from app.services.compute.process_pool_service import ProcessPoolService
 from app.services.visual.video_processor_service import VideoProcessorService
+from app.utils.frame_store import KeyframeStore
 from app.utils.transcript import get_audio_hook
+from app.utils.usage import BudgetState, get_llm_budget_state, is_skipped_for_budget
+from app.utils.video import prune_similar_frames
 
 
 class FeatureExtractionService:
@@ -14,6 +21,9 @@ class FeatureExtractionService:
         self.llm = LlmAgentService()
         self.audio_processor = AudioProcessorService()
         self.video_processor = VideoProcessorService()
+        self.artifact_cache = ArtifactCacheService()
+        # CPU-bound calls go to the worker processes when the pool is enabled
+        self.process_pool = ProcessPoolService()
 
     def get_video_duration(self, video_path: str) -> float:
         """
@@ -32,13 +42,51 @@ class FeatureExtractionService:
 
         return duration
 
+    def prepare_media(self, video_path: str, post_id: Any = None,
+                      keyframe_store: Optional[KeyframeStore] = None) -> MediaBundle:
+        """
+        Decode the video once for all the feature stages.
+        The frames are not decoded when every frame-based artifact of the post is already cached,
+        and the audio is not extracted when the audio-based ones are.
+        The frames are kept compressed in keyframe_store when one is given.
+        """
+        include_video = not all(
+            self.artifact_cache.contains(post_id, stage) for stage in (Config.STYLE, Config.HOOK, Config.VISUAL)
+        )
+        include_audio = not all(
+            self.artifact_cache.contains(post_id, stage) for stage in (Config.TRANSCRIPT, Config.AUDIO)
+        )
+
+        if self.process_pool.enabled:
+            if include_video and self._is_long_video(video_path):
+                return self._prepare_media_segmented(video_path, include_audio, keyframe_store)
+            return self.process_pool.prepare_media(video_path, include_video, include_audio, keyframe_store)
+        return self.video_processor.prepare_media(
+            video_path, include_video=include_video, include_audio=include_audio, keyframe_store=keyframe_store
+        )
+
     def get_keyframes(self, video_path: str, max_duration_seconds: Optional[float] = None) -> List[tuple]:
+        if self.process_pool.enabled:
+            if self._is_long_video(video_path, max_duration_seconds):
+                return self._get_keyframes_segmented(video_path, max_duration_seconds)
+            return self.process_pool.extract_keyframes(video_path, max_duration_seconds)
         return self.video_processor.extract_keyframes(video_path, max_duration_seconds)
 
-    def get_visual_features(self, video_path: str):
-        video_duration = self.get_video_duration(video_path)
-        keyframes = self.get_keyframes(video_path, min(video_duration, 5.0))
+    def get_visual_features(self, video_path: str, post_id: Any = None, media: Optional[MediaBundle] = None):
+        return self.artifact_cache.get_or_compute(
+            post_id, Config.VISUAL, lambda: self._get_visual_features(video_path, media),
+            should_cache=lambda _: self._is_full_budget()
+        )
+
+    def _get_visual_features(self, video_path: str, media: Optional[MediaBundle] = None):
+        # The bundle has no frames when they were expected to come from the cache
+        if media and media.keyframes:
+            keyframes = media.prefix_keyframes
+        else:
+            video_duration = self.get_video_duration(video_path)
+            keyframes = self.get_keyframes(video_path, min(video_duration, 5.0))
 
+        keyframes = prune_similar_frames(keyframes)
         keyframe_contexts = [
             KeyframeContext(
                 frame_number=i + 1,
@@ -56,9 +104,17 @@ class FeatureExtractionService:
         visual_features = self.llm.generate_visual_features(keyframe_contexts)
         return visual_features
 
-    def get_style_features(self, video_path: str, transcript: str) -> Optional[dict]:
+    def get_style_features(self, video_path: str, transcript: str, post_id: Any = None,
+                           media: Optional[MediaBundle] = None) -> Optional[dict]:
+        return self.artifact_cache.get_or_compute(
+            post_id, Config.STYLE, lambda: self._get_style_features(video_path, transcript, media),
+            should_cache=lambda style: style["creator_visible"] is not None and self._is_full_budget()
+        )
+
+    def _get_style_features(self, video_path: str, transcript: str, media: Optional[MediaBundle] = None) -> dict:
         creator_speaking = len(transcript.strip()) > 35
-        keyframes = self.get_keyframes(video_path)
+        keyframes = media.keyframes if media and media.keyframes else self.get_keyframes(video_path)
+        keyframes = prune_similar_frames(keyframes)
 
         print("Calling AGENT to generate style features...")
         analysis = self.llm.generate_style_features(keyframes)
@@ -72,28 +128,46 @@ class FeatureExtractionService:
             "product_visible": product_visible
         }
 
-    def transcribe(self, audio_path: str, start_time: float | None = None, end_time: float | None = None) -> str:
-        return self.audio_processor.transcribe(audio_path, start_time, end_time)
+    def transcribe(self, audio_path: str, start_time: float | None = None, end_time: float | None = None,
+                   post_id: Any = None) -> str:
+        if start_time is not None or end_time is not None:
+            return self._transcribe(audio_path, start_time, end_time)
+
+        # Only full transcripts are stored, an empty one can also mean the transcription failed
+        return self.artifact_cache.get_or_compute(
+            post_id, Config.TRANSCRIPT, lambda: self._transcribe(audio_path),
+            should_cache=lambda transcript: bool(transcript)
+        )
 
-    def get_audio_visual_hook(self, video_file_path: str, full_script: Optional[str] = None):
+    def get_audio_visual_hook(self, video_file_path: str, full_script: Optional[str] = None, post_id: Any = None,
+                              media: Optional[MediaBundle] = None):
         """
         :param video_file_path:
         :param full_script:
+        :param post_id: post to look up and store the hook artifact for
+        :param media: decoded media of the video, holding the hook frame
         :return:
             on screen hook,
             audio hook,
             shooting style
         """
-        frame = self.video_processor.extract_hook_frame(video_file_path, frame_time=1)
-        print("Calling AGENT to generate screen hook...")
-        screen_hook = self.llm.generate_screen_hook(frame)
+        return self.artifact_cache.get_or_compute(
+            post_id, Config.HOOK, lambda: self._get_audio_visual_hook(video_file_path, full_script, media),
+            should_cache=lambda hook: not self._has_errors(hook) and self._is_full_budget()
+        )
 
+    def _get_audio_visual_hook(self, video_file_path: str, full_script: Optional[str] = None,
+                               media: Optional[MediaBundle] = None):
+        if media and media.keyframes:
+            frame = media.hook_frame
+        else:
+            frame = self.video_processor.extract_hook_frame(video_file_path, frame_time=1)
         if not full_script:
             full_script = self.transcribe(video_file_path)
 
         audio_hook = get_audio_hook(full_script)
-        print("Calling AGENT to analyze hook...")
-        shooting_style = self.llm.generate_hook_analysis(frame, full_script)
+        print("Calling AGENT to extract the screen hook and analyze the hook...")
+        screen_hook, shooting_style = self.llm.analyze_hook_frame(frame, full_script)
 
         return {
             "screen_hook": screen_hook,
@@ -102,12 +176,23 @@ class FeatureExtractionService:
         }
 
     def isolate_speech(self, audio_path: str) -> Optional[str]:
+        if self.process_pool.enabled:
+            return self.process_pool.isolate_speech(audio_path)
         return self.audio_processor.isolate_speech(audio_path)
 
     def get_audio_features(self, speech_audio_path: str):
+        if self.process_pool.enabled:
+            return self.process_pool.extract_audio_features(speech_audio_path)
         return self.audio_processor.extract_audio_features(speech_audio_path)
 
-    def get_shooting_style(self, style: Optional[dict], full_script: str) -> str:
+    def get_shooting_style(self, style: Optional[dict], full_script: str, post_id: Any = None) -> str:
+        # The fallback style of a post whose UGC style call was skipped for the budget is not cached
+        return self.artifact_cache.get_or_compute(
+            post_id, Config.SHOOTING_STYLE, lambda: self._get_shooting_style(style, full_script),
+            should_cache=lambda _: self._is_full_budget()
+        )
+
+    def _get_shooting_style(self, style: Optional[dict], full_script: str) -> str:
         print(f"Extracting Shooting Style...")
         if style is None:
             return 'Other'
@@ -119,6 +204,9 @@ class FeatureExtractionService:
         elif style['creator_visible'] == 'Face is visible':
             if not style['creator_speaking']:
                 return 'Vibes Marketing'
+            if is_skipped_for_budget(Config.SHOOTING_STYLE):
+                print("Skipping the UGC style identification, the LLM budget of the job is used up")
+                return 'UGC Style'
             print("Calling AGENT to identify UGC Style")
             return self._get_UGC_type(full_script)
         else:
@@ -128,10 +216,73 @@ class FeatureExtractionService:
         Helper Function
     """
 
+    def _is_long_video(self, video_path: str, max_duration_seconds: Optional[float] = None) -> bool:
+        # Long videos are split into segments decoded on several workers at once
+        duration = self.get_video_duration(video_path)
+        if max_duration_seconds:
+            duration = min(duration, max_duration_seconds)
+        return duration >= Config.SEGMENTED_DECODE_MIN_SECONDS and self.process_pool.max_workers > 1
+
+    def _get_keyframes_segmented(self, video_path: str, max_duration_seconds: Optional[float] = None) -> List[tuple]:
+        index = self.video_processor.frame_reader.get_index(video_path)
+        if index is None:
+            raise ValueError(f"Could not open video file: {video_path}")
+
+        frame_count = index.frame_count
+        if max_duration_seconds:
+            frame_count = min(frame_count, int(max_duration_seconds * index.fps))
+        segments = self.video_processor.get_segments(frame_count, index.fps)
+        # The last segment runs to the end of the video, cut it at the requested duration
+        if max_duration_seconds:
+            segments[-1] = (segments[-1][0], frame_count)
+
+        # The workers compute the differences with the detector select_keyframes applies
+        differences = self.process_pool.scan_segments(video_path, segments, self.video_processor.shot_detector)
+        return self.video_processor.select_keyframes(video_path, differences, index.fps)["keyframes"]
+
+    def _prepare_media_segmented(self, video_path: str, include_audio: bool,
+                                 keyframe_store: Optional[KeyframeStore] = None,
+                                 prefix_seconds: float = 5.0, hook_frame_time: int = 1) -> MediaBundle:
+        # Same bundle as VideoProcessorService.prepare_media, with the frames scanned in segments
+        bundle = self.process_pool.prepare_media(video_path, include_video=False, include_audio=include_audio)
+        fps = bundle.fps
+
+        segments = self.video_processor.get_segments(bundle.frame_count, fps)
+        differences = self.process_pool.scan_segments(video_path, segments, self.video_processor.shot_detector)
+
+        prefix_duration = min(bundle.duration, prefix_seconds)
+        scan = self.video_processor.select_keyframes(
+            video_path, differences, fps,
+            prefix_frame=int(prefix_duration * fps) if prefix_duration else None,
+            hook_frame_number=math.ceil(fps * hook_frame_time) - 1,
+            keyframe_store=keyframe_store
+        )
+        bundle.keyframes = scan["keyframes"]
+        bundle.prefix_count = scan["prefix_count"]
+        bundle.prefix_tail = scan["prefix_tail"]
+        bundle.hook_frame = scan["hook_frame"]
+        return bundle
+
+    def _transcribe(self, audio_path: str, start_time: float | None = None, end_time: float | None = None) -> str:
+        if self.process_pool.enabled:
+            return self.process_pool.transcribe(audio_path, start_time, end_time)
+        return self.audio_processor.transcribe(audio_path, start_time, end_time)
+
+    def _is_full_budget(self) -> bool:
+        # Once the job's budget is degraded the LLM calls use cheaper models (or are skipped), don't keep their
+        # results for the later jobs
+        return get_llm_budget_state() == BudgetState.OK
+
+    def _has_errors(self, hook: dict) -> bool:
+        # A missing audio hook is a valid result for videos without speech
+        values = [hook["screen_hook"], *hook["shooting_style"].values()]
+        return any(isinstance(value, str) and value.startswith("Error:") for value in values)
+
     def _get_UGC_type(self, full_script: str) -> str:
         retry_count = 5
         while retry_count > 0:
-            style_type = self.llm.identify_UGC_style(full_script)
+            # Retries must not get the same cached answer back
+            style_type = self.llm.identify_UGC_style(full_script, refresh_cache=retry_count < 5)
             if style_type == 'Hook & Sell' or style_type == 'Problem - Solution':
                 return style_type
             retry_count -= 1
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from enum import Enum
+from typing import Iterable, List, Optional
+
+from app.config.settings import Config
+from app.utils.disk_cache import make_private_directory
+
+
+class JournalStage(Enum):
+    QUEUED = "queued"
+    DOWNLOADED = "downloaded"
+    TRANSCRIBED = "transcribed"
+    FEATURES_EXTRACTED = "features_extracted"
+    WRITTEN = "written"
+
+
+class JournalStatus(Enum):
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class IngestionJournalService:
+    """
+    Durable SQLite journal of each post's progress through the ingestion stages.
+    Posts left pending by a restart or crash are picked up again by IngestionService.resume.
+    """
+
+    def __init__(self, db_path: str = Config.INGESTION_JOURNAL_PATH):
+        make_private_directory(os.path.dirname(os.path.abspath(db_path)))
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_journal (
+                post_id TEXT PRIMARY KEY,
+                job_id TEXT,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                record TEXT NOT NULL,
+                db_object TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_journal_status ON ingestion_journal (status)")
+
+    def start_posts(self, records: List[dict], job_id: Optional[str] = None):
+        now = time.time()
+        rows = [
+            (str(record['post_id']), job_id, JournalStage.QUEUED.value, JournalStatus.PENDING.value,
+             json.dumps(record, default=str), now)
+            for record in records
+        ]
+        with self.lock:
+            self.connection.executemany("""
+                INSERT INTO ingestion_journal (post_id, job_id, stage, status, record, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(post_id) DO UPDATE SET
+                    job_id = excluded.job_id,
+                    stage = excluded.stage,
+                    status = excluded.status,
+                    record = excluded.record,
+                    db_object = NULL,
+                    error = NULL,
+                    updated_at = excluded.updated_at
+            """, rows)
+
+    def mark_stage(self, post_id, stage: JournalStage, db_object: Optional[dict] = None):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE ingestion_journal SET stage = ?, db_object = COALESCE(?, db_object), updated_at = ? "
+                "WHERE post_id = ?",
+                (stage.value, json.dumps(db_object) if db_object else None, time.time(), str(post_id))
+            )
+
+    def mark_written(self, post_ids: Iterable):
+        self._set_status(post_ids, JournalStatus.DONE, stage=JournalStage.WRITTEN)
+
+    def mark_failed(self, post_id, error: str):
+        self._set_status([post_id], JournalStatus.FAILED, error=error)
+
+    def mark_cancelled(self, post_ids: Iterable):
+        self._set_status(post_ids, JournalStatus.CANCELLED)
+
+    def get_unfinished(self) -> List[dict]:
+        """
+        Returns:
+            Pending journal entries with their original post record, and their DB object once features are extracted
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT post_id, job_id, stage, record, db_object FROM ingestion_journal "
+                "WHERE status = ? ORDER BY updated_at",
+                (JournalStatus.PENDING.value,)
+            ).fetchall()
+
+        return [{
+            "post_id": post_id,
+            "job_id": job_id,
+            "stage": JournalStage(stage),
+            "record": json.loads(record),
+            "db_object": json.loads(db_object) if db_object else None
+        } for post_id, job_id, stage, record, db_object in rows]
+
+    """
+        Helper functions
+    """
+
+    def _set_status(self, post_ids: Iterable, status: JournalStatus, stage: Optional[JournalStage] = None,
+                    error: Optional[str] = None):
+        now = time.time()
+        rows = [(status.value, stage.value if stage else None, error, now, str(post_id)) for post_id in post_ids]
+        with self.lock:
+            self.connection.executemany(
+                "UPDATE ingestion_journal SET status = ?, stage = COALESCE(?, stage), error = ?, updated_at = ? "
+                "WHERE post_id = ?",
+                rows
+            )
@@ -1,7 +1,6 @@
 import os
-import random
 import tempfile
-import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
 from pandas.core.frame import DataFrame
@@ -9,23 +8,51 @@ from pandas.core.frame import DataFrame
 from app import weaviate_client, selenium_driver
 from app.config.settings import Config
 from app.models import post as Post
+from app.models.job import IngestionJob, PostStatus
+from app.services.client.download_scheduler_service import DownloadSchedulerService
 from app.services.client.s3_service import S3Service
 from app.services.client.scraper_service import ScraperService
 from app.services.client.vector_db_service import VectorDBService
 from app.services.feature_extraction_service import FeatureExtractionService
-from app.utils.audio import extract_audio
-from app.utils.dataframe import calculate_impact_scores, create_db_objects
+from app.services.ingestion_journal_service import IngestionJournalService, JournalStage
+from app.utils.context import deferred_llm_calls, llm_usage_scope, submit_in_context
+from app.utils.dataframe import calculate_impact_scores, create_db_objects, get_dataframe, get_dict
+from app.utils.metrics import ingest_stages
+from app.utils.pipeline import PipelineCancelledError, Stage, StreamingPipeline
+from app.utils.usage import is_skipped_for_budget
 
 
 class IngestionService:
+    # Journal milestone reached when a streaming stage completes
+    JOURNAL_MILESTONES = {
+        "download": JournalStage.DOWNLOADED,
+        "transcribe": JournalStage.TRANSCRIBED,
+        "cleanup": JournalStage.FEATURES_EXTRACTED
+    }
+    # Stages calling the LLM, which get more workers in deferred mode
+    LLM_STAGES = ("features", "shooting_style")
+
     def __init__(self):
         self.feature_extraction_service = FeatureExtractionService()
         self.s3 = S3Service()
         self.vector_db = VectorDBService(weaviate_client)
         self.scraper = ScraperService(selenium_driver)
+        self.download_scheduler = DownloadSchedulerService(self.scraper)
+        self.journal = IngestionJournalService()
+        # Runs the hook and visual features of a post while its style features are extracted
+        self.feature_executor = ThreadPoolExecutor(
+            max_workers=2 * max(Config.STAGE_CONCURRENCY.get("features", 1), Config.LLM_DEFERRED_STAGE_CONCURRENCY),
+            thread_name_prefix="features"
+        )
         self.video_bucket = Config.AWS_S3_BUCKET
 
-    def process(self, posts: DataFrame) -> List[dict]:
+    def process(self, posts: DataFrame, deferred_llm: bool = False) -> List[dict]:
+        # Deferred LLM calls need many posts in flight at once to fill their batches
+        if Config.STREAMING_INGESTION or deferred_llm:
+            return self.process_streaming(posts, deferred_llm=deferred_llm)
+        return self.process_batches(posts)
+
+    def process_batches(self, posts: DataFrame) -> List[dict]:
         processed_batches = []
 
         batch_size = Config.BATCH_SIZE
@@ -38,25 +65,100 @@ class IngestionService:
                 self.filter_records(batch)
                 .pipe(self.download_videos)
                 .pipe(calculate_impact_scores)
+                .pipe(self.prepare_media)
                 .pipe(self.transcribe)
-                .pipe(self.extract_style_features)
-                .pipe(self.add_hook)
-                .pipe(self.extract_visual_features)
+                .pipe(self.extract_features)
                 .pipe(self.extract_audio_features)
                 .pipe(self.extract_shooting_style)
                 .pipe(self.cleanup)
-                .drop(
-                    columns=[Config.LOCAL_VIDEO_PATH, Config.LOCAL_AUDIO_PATH, Config.LOCAL_SPEECH_PATH],
-                    errors='ignore'
-                )
+                .pipe(self._drop_local_columns)
             )
             saved_batch = self.add_to_vector_db(processed_batch)
             processed_batches.extend(saved_batch)
 
         return processed_batches
 
+    def process_streaming(self, posts: DataFrame, job: Optional[IngestionJob] = None,
+                          deferred_llm: bool = False) -> List[dict]:
+        """
+        Process posts through a stage-parallel pipeline.
+        Each stage has its own workers, so one post downloads while another is transcribed
+        and a third one waits on the LLM. Finished posts are written to the DB in batches of Config.BATCH_SIZE.
+
+        Args:
+            posts: Posts to ingest
+            job: Optional job to report per-post progress and partial results to, and to cancel the run
+            deferred_llm: Send the LLM requests through message batches, for backfills that don't need low latency
+
+        Returns:
+            List of saved posts
+        """
+        saved_posts = []
+        finished_rows = []
+
+        # Resolve duplicates for the whole request up front with a single DB lookup
+        new_posts = self.filter_records(posts)
+        existing_ids = posts.loc[~posts.index.isin(new_posts.index), 'post_id'].tolist()
+        self.journal.mark_written(existing_ids)
+        if job:
+            for post_id in existing_ids:
+                job.set_post_status(post_id, PostStatus.SKIPPED, "Post already exists in the vector DB")
+
+        self.journal.start_posts(get_dict(new_posts), job.job_id if job else None)
+
+        posts = calculate_impact_scores(new_posts.copy())
+        pipeline = StreamingPipeline(
+            self._get_streaming_stages(job, deferred_llm),
+            queue_size=Config.STAGE_QUEUE_SIZE,
+            on_error=lambda stage, row, error: self._discard_row(row, error, job)
+        )
+        stop_event = job.cancel_event if job else None
+
+        for row in pipeline.run((row for _, row in posts.iterrows()), stop_event):
+            finished_rows.append(row)
+            if len(finished_rows) >= Config.BATCH_SIZE:
+                saved_posts.extend(self._save_rows(finished_rows, job))
+                finished_rows = []
+
+        if finished_rows:
+            saved_posts.extend(self._save_rows(finished_rows, job))
+
+        return saved_posts
+
+    def resume(self, job: Optional[IngestionJob] = None) -> List[dict]:
+        """
+        Resume every post the journal still has pending, e.g. after a restart in the middle of an ingest.
+        Posts whose features were already extracted are written straight to the DB. The others go through
+        the pipeline again, where the artifact cache skips the transcription and LLM work done before.
+
+        Args:
+            job: Optional job to report progress to
+
+        Returns:
+            List of saved posts
+        """
+        entries = self.journal.get_unfinished()
+        if not entries:
+            return []
+        print(f"Resuming {len(entries)} unfinished posts from the ingestion journal")
+
+        saved_posts = []
+
+        db_objects = [entry['db_object'] for entry in entries if entry['db_object']]
+        for start in range(0, len(db_objects), Config.BATCH_SIZE):
+            saved_posts.extend(self._save_db_objects(db_objects[start:start + Config.BATCH_SIZE], job))
+
+        records = [entry['record'] for entry in entries if not entry['db_object']]
+        if records and not (job and job.cancel_event.is_set()):
+            saved_posts.extend(self.process_streaming(get_dataframe(records), job))
+
+        return saved_posts
+
     def filter_records(self, df: DataFrame) -> DataFrame:
-        df = df[~df['post_id'].apply(lambda x: self.vector_db.record_exists(Post.get_schema(), x))]
+        # Overlapping search terms can return the same post more than once
+        df = df.drop_duplicates(subset='post_id')
+        existing_ids = self.vector_db.records_exist(Post.get_schema(), df['post_id'])
+        df = df[~df['post_id'].astype(str).isin(existing_ids)]
         return df
 
     def download_videos(self, df: DataFrame) -> DataFrame:
@@ -69,20 +171,16 @@ class IngestionService:
 
         return df
 
-    def transcribe(self, df: DataFrame) -> DataFrame:
-        df = df.apply(self._transcribe_video, axis=1)
-        return df
-
-    def add_hook(self, df: DataFrame) -> DataFrame:
-        df = df.apply(self._get_hook, axis=1)
+    def prepare_media(self, df: DataFrame) -> DataFrame:
+        df = df.apply(self._prepare_media, axis=1)
         return df
 
-    def extract_visual_features(self, df: DataFrame) -> DataFrame:
-        df = df.apply(self._extract_visual_features, axis=1)
+    def transcribe(self, df: DataFrame) -> DataFrame:
+        df = df.apply(self._transcribe_video, axis=1)
         return df
 
-    def extract_style_features(self, df: DataFrame) -> DataFrame:
-        df = df.apply(self._extract_style_features, axis=1)
+    def extract_features(self, df: DataFrame) -> DataFrame:
+        df = df.apply(self._extract_features, axis=1)
         return df
 
     def extract_audio_features(self, df: DataFrame) -> DataFrame:
@@ -93,6 +191,7 @@ class IngestionService:
         df = df.apply(self._extract_shooting_style, axis=1)
         return df
 
+    @ingest_stages.wrap(stage="write", is_error=lambda posts: posts is None)
     def add_to_vector_db(self, df: DataFrame) -> Optional[List[dict]]:
         if not self.vector_db.create_collection(Post.get_schema()):
             return None
@@ -113,10 +212,116 @@ class IngestionService:
         Helper functions
     """
 
+    def _get_streaming_stages(self, job: Optional[IngestionJob] = None, deferred_llm: bool = False) -> List[Stage]:
+        concurrency = dict(Config.STAGE_CONCURRENCY)
+        if deferred_llm:
+            for name in self.LLM_STAGES:
+                concurrency[name] = max(concurrency.get(name, 1), Config.LLM_DEFERRED_STAGE_CONCURRENCY)
+        stages = [
+            ("download", self._download_video),
+            ("prepare_media", self._prepare_media),
+            ("transcribe", self._transcribe_video),
+            ("features", self._extract_features),
+            ("audio", self._extract_audio_features),
+            ("shooting_style", self._extract_shooting_style),
+            ("cleanup", self._cleanup_local_files)
+        ]
+        return [
+            Stage(name, self._track_stage(name, func, job, deferred_llm), concurrency.get(name, 1))
+            for name, func in stages
+        ]
+
+    def _track_stage(self, name: str, func, job: Optional[IngestionJob] = None, deferred_llm: bool = False):
+        def run_stage(row):
+            post_id = row['post_id']
+            if job:
+                job.start_stage(post_id, name)
+
+            # LLM calls made for the post are accounted to it and its job
+            with deferred_llm_calls(deferred_llm), llm_usage_scope(job.usage if job else None, post_id):
+                result = func(row)
+            if result is None:
+                error = f"Post dropped at stage '{name}'"
+                self.journal.mark_failed(post_id, error)
+                if job:
+                    job.set_post_status(post_id, PostStatus.FAILED, error)
+                return None
+
+            if name in self.JOURNAL_MILESTONES:
+                milestone = self.JOURNAL_MILESTONES[name]
+                db_object = self._to_db_object(result) if milestone == JournalStage.FEATURES_EXTRACTED else None
+                self.journal.mark_stage(post_id, milestone, db_object)
+            if job:
+                job.complete_stage(post_id, name)
+            return result
+
+        return run_stage
+
+    def _discard_row(self, row, error: Exception, job: Optional[IngestionJob] = None):
+        self._cleanup_local_files(row)
+
+        # Cancelled posts stay pending in the journal, so a shutdown in the middle of a job can be resumed
+        cancelled = isinstance(error, PipelineCancelledError)
+        if not cancelled:
+            self.journal.mark_failed(row['post_id'], str(error))
+        if job:
+            job.set_post_status(row['post_id'], PostStatus.CANCELLED if cancelled else PostStatus.FAILED, str(error))
+
+    def _drop_local_columns(self, df: DataFrame) -> DataFrame:
+        return df.drop(
+            columns=[Config.LOCAL_VIDEO_PATH, Config.LOCAL_AUDIO_PATH, Config.LOCAL_SPEECH_PATH, Config.MEDIA],
+            errors='ignore'
+        )
+
+    def _to_db_object(self, row) -> dict:
+        df = self._drop_local_columns(DataFrame([row]))
+        return create_db_objects(df)[0]
+
+    def _save_db_objects(self, db_objects: List[dict], job: Optional[IngestionJob] = None) -> List[dict]:
+        saved = self.vector_db.create_collection(Post.get_schema()) and self.vector_db.batch_add(
+            Post.get_schema(), db_objects
+        )
+        post_ids = [db_object['post_id'] for db_object in db_objects]
+        if not saved:
+            print(f"Error: Unable to write {len(db_objects)} journaled posts to the DB")
+            if job:
+                for post_id in post_ids:
+                    job.set_post_status(post_id, PostStatus.FAILED, "Unable to write the post to the vector DB")
+            return []
+
+        self.journal.mark_written(post_ids)
+        if job:
+            job.add_results(db_objects)
+        return db_objects
+
+    def _save_rows(self, rows: list, job: Optional[IngestionJob] = None) -> List[dict]:
+        df = self._drop_local_columns(DataFrame(rows))
+        saved_posts = self.add_to_vector_db(df)
+        if saved_posts:
+            self.journal.mark_written([post['post_id'] for post in saved_posts])
+        if job:
+            if saved_posts:
+                job.add_results(saved_posts)
+            else:
+                for row in rows:
+                    job.set_post_status(row['post_id'], PostStatus.FAILED, "Unable to write the post to the vector DB")
+        return saved_posts if saved_posts else []
+
+    def _download_video(self, row):
+        s3_video_link, local_video_path = self._get_video_links(row['url'], row['post_id'])
+        if local_video_path is None:
+            print(f"Skipping post {row['post_id']}: video could not be downloaded")
+            return None
+
+        row[Config.S3_VIDEO_URL] = s3_video_link
+        row[Config.LOCAL_VIDEO_PATH] = local_video_path
+        return row
+
+    @ingest_stages.wrap(stage="cleanup")
     def _cleanup_local_files(self, row):
-        speech_file_path = row[Config.LOCAL_SPEECH_PATH]
-        audio_file_path = row[Config.LOCAL_AUDIO_PATH]
-        video_file_path = row[Config.LOCAL_VIDEO_PATH]
+        speech_file_path = row.get(Config.LOCAL_SPEECH_PATH)
+        audio_file_path = row.get(Config.LOCAL_AUDIO_PATH)
+        video_file_path = row.get(Config.LOCAL_VIDEO_PATH)
 
         if speech_file_path and os.path.exists(speech_file_path):
             os.remove(speech_file_path)
@@ -125,8 +330,12 @@ class IngestionService:
         if video_file_path and os.path.exists(video_file_path):
             os.remove(video_file_path)
 
+        # Release the decoded frames
+        row[Config.MEDIA] = None
+
         return row
 
+    @ingest_stages.wrap(stage="download", is_error=lambda links: links[1] is None)
     def _get_video_links(self, video_url: str, post_id: str) -> tuple[str | None, str | None]:
         """
         :param video_url:
@@ -147,92 +356,120 @@ class IngestionService:
             else:
                 return s3_link, None
         else:
-            temp_file = self.scraper.download_video(video_url, filename)
+            # The scheduler keeps a polite gap between scrapes of the same host
+            temp_file = self.download_scheduler.download(video_url, filename)
             if temp_file is None:
                 return None, None
 
             s3_link = self.s3.upload_to_s3(self.video_bucket, filename, temp_file)
             # os.remove(temp_file)
 
-            # Wait for 5-15 secs before downloading the next video
-            time.sleep(random.randint(5, 15))
             return s3_link, temp_file
 
-    def _transcribe_video(self, row):
-
+    @ingest_stages.wrap(stage="prepare_media")
+    def _prepare_media(self, row):
         video_file_path = row[Config.LOCAL_VIDEO_PATH]
-        video_dir = os.path.dirname(video_file_path)
-        video_filename = os.path.basename(video_file_path)
 
-        audio_file_path = f"{os.path.join(video_dir, os.path.splitext(video_filename)[0])}.wav"
+        print("Decoding video...")
+        row[Config.MEDIA] = self.feature_extraction_service.prepare_media(video_file_path, row['post_id'])
+        return row
 
-        if not extract_audio(video_file_path, audio_file_path):
+    @ingest_stages.wrap(stage="transcribe")
+    def _transcribe_video(self, row):
+        post_id = row['post_id']
+        audio_file_path = row[Config.MEDIA].audio_path
+        row[Config.LOCAL_AUDIO_PATH] = audio_file_path
+
+        # The audio is not extracted when the transcript is already cached
+        if audio_file_path is None and not self.feature_extraction_service.artifact_cache.contains(
+                post_id, Config.TRANSCRIPT
+        ):
             row[Config.TRANSCRIPT] = None
-            row[Config.LOCAL_AUDIO_PATH] = None
             return row
 
         print("Transcribing audio...")
-        transcription = self.feature_extraction_service.transcribe(audio_file_path)
+        transcription = self.feature_extraction_service.transcribe(audio_file_path, post_id=post_id)
 
         row[Config.TRANSCRIPT] = transcription
-        row[Config.LOCAL_AUDIO_PATH] = audio_file_path
 
         return row
 
+    def _extract_features(self, row):
+        # The style, hook and visual features only depend on the media and the transcript, extract them in parallel
+        hook_future = submit_in_context(self.feature_executor, self._get_hook, row.copy())
+        visual_future = None
+        if not is_skipped_for_budget(Config.VISUAL):
+            visual_future = submit_in_context(self.feature_executor, self._extract_visual_features, row.copy())
+        row = self._extract_style_features(row)
+
+        row[Config.HOOK] = hook_future.result()[Config.HOOK]
+        row[Config.VISUAL] = visual_future.result()[Config.VISUAL] if visual_future else None
+        return row
+
+    @ingest_stages.wrap(stage="hook")
     def _get_hook(self, row):
         video_file_path = row[Config.LOCAL_VIDEO_PATH]
         full_script = row[Config.TRANSCRIPT]
 
-        hook = self.feature_extraction_service.get_audio_visual_hook(video_file_path, full_script)
+        hook = self.feature_extraction_service.get_audio_visual_hook(
+            video_file_path, full_script, row['post_id'], row[Config.MEDIA]
+        )
 
         row[Config.HOOK] = hook
 
         return row
 
+    @ingest_stages.wrap(stage="visual")
     def _extract_visual_features(self, row):
         video_file_path = row[Config.LOCAL_VIDEO_PATH]
 
-        visual_features = self.feature_extraction_service.get_visual_features(video_file_path)
+        visual_features = self.feature_extraction_service.get_visual_features(
+            video_file_path, row['post_id'], row[Config.MEDIA]
+        )
 
         row[Config.VISUAL] = visual_features
         return row
 
+    @ingest_stages.wrap(stage="style")
     def _extract_style_features(self, row):
         video_file_path = row[Config.LOCAL_VIDEO_PATH]
         transcript = row[Config.TRANSCRIPT]
 
-        style_features = self.feature_extraction_service.get_style_features(video_file_path, transcript)
+        style_features = self.feature_extraction_service.get_style_features(
+            video_file_path, transcript, row['post_id'], row[Config.MEDIA]
+        )
 
         row[Config.STYLE] = style_features
 
         return row
 
+    @ingest_stages.wrap(stage="audio")
     def _extract_audio_features(self, row):
         audio_file_path = row[Config.LOCAL_AUDIO_PATH]
+        row[Config.LOCAL_SPEECH_PATH] = None
 
-        if audio_file_path is None:
-            row[Config.LOCAL_SPEECH_PATH] = None
-            row[Config.AUDIO] = None
-            return row
+        def compute_audio_features():
+            if audio_file_path is None:
+                return None
 
-        print(f"Generating Audio features...")
-        speech_audio_path = self.feature_extraction_service.isolate_speech(audio_file_path)
+            print(f"Generating Audio features...")
+            speech_audio_path = self.feature_extraction_service.isolate_speech(audio_file_path)
+            row[Config.LOCAL_SPEECH_PATH] = speech_audio_path
 
-        if speech_audio_path is None:
-            row[Config.LOCAL_SPEECH_PATH] = None
-            row[Config.AUDIO] = None
-            return row
-
-        audio_features = self.feature_extraction_service.get_audio_features(speech_audio_path)
+            if speech_audio_path is None:
+                return None
+            return self.feature_extraction_service.get_audio_features(speech_audio_path)
 
-        row[Config.LOCAL_SPEECH_PATH] = speech_audio_path
-        row[Config.AUDIO] = audio_features
+        row[Config.AUDIO] = self.feature_extraction_service.artifact_cache.get_or_compute(
+            row['post_id'], Config.AUDIO, compute_audio_features
+        )
         return row
 
+    @ingest_stages.wrap(stage="shooting_style")
     def _extract_shooting_style(self, row):
         style = row[Config.STYLE]
         full_script = row[Config.TRANSCRIPT]
 
-        shooting_style = self.feature_extraction_service.get_shooting_style(style, full_script)
+        shooting_style = self.feature_extraction_service.get_shooting_style(style, full_script, row['post_id'])
         row[Config.SHOOTING_STYLE] = shooting_style
         return row
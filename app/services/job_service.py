@@ -0,0 +1,137 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pandas.core.frame import DataFrame
+
+from app.config.settings import Config
+from app.models.job import IngestionJob, JobStatus, PostStatus
+from app.services.ingestion_service import IngestionService
+from app.utils.usage import LlmBudget, UsageTracker
+
+
+class JobService:
+    """
+    Runs ingestion jobs on background workers and keeps their progress in memory
+    """
+
+    def __init__(self, ingestion_service: IngestionService):
+        self.ingestion_service = ingestion_service
+        self.executor = ThreadPoolExecutor(max_workers=Config.INGEST_JOB_WORKERS, thread_name_prefix="ingest-job")
+        self.jobs: Dict[str, IngestionJob] = {}
+        self.resume_job: Optional[IngestionJob] = None
+        self.lock = threading.Lock()
+
+    def submit(self, posts: DataFrame, deferred_llm: bool = False, budget: Optional[LlmBudget] = None) -> IngestionJob:
+        job = self._create_job(posts['post_id'], deferred_llm, budget)
+        self.executor.submit(
+            self._run, job, lambda: self.ingestion_service.process_streaming(posts, job=job, deferred_llm=deferred_llm)
+        )
+        return job
+
+    def resume(self) -> Optional[IngestionJob]:
+        """
+        Start a job that resumes all the unfinished posts of the ingestion journal.
+        Returns the running resume job instead of starting a second one.
+        """
+        with self.lock:
+            if self.resume_job and not self.resume_job.is_finished:
+                return self.resume_job
+
+        entries = self.ingestion_service.journal.get_unfinished()
+        if not entries:
+            return None
+
+        job = self._create_job([entry['post_id'] for entry in entries])
+        with self.lock:
+            self.resume_job = job
+        self.executor.submit(self._run, job, lambda: self.ingestion_service.resume(job=job))
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return job
+
+        job.cancel_event.set()
+        with job.lock:
+            unfinished = [
+                progress.post_id for progress in job.posts.values()
+                if progress.status in (PostStatus.QUEUED, PostStatus.RUNNING)
+            ]
+            if job.status == JobStatus.QUEUED:
+                # _run won't start it, so it is finished here
+                self._finish_job(job, JobStatus.CANCELLED)
+            else:
+                job.status = JobStatus.CANCELLING
+
+        # Cancelled posts must not be picked up by a later resume
+        self.ingestion_service.journal.mark_cancelled(unfinished)
+        return job
+
+    def shutdown(self):
+        """
+        Stop the running jobs without cancelling their posts in the journal, so they are resumed after a restart
+        """
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if not job.is_finished]
+        for job in jobs:
+            job.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    """
+        Helper functions
+    """
+
+    def _create_job(self, post_ids: Iterable, deferred_llm: bool = False,
+                    budget: Optional[LlmBudget] = None) -> IngestionJob:
+        post_ids = list(post_ids)
+        job = IngestionJob(
+            total=len(post_ids), deferred_llm=deferred_llm, usage=UsageTracker(budget or LlmBudget.from_config())
+        )
+        for post_id in post_ids:
+            job.set_post_status(post_id, PostStatus.QUEUED)
+
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self._evict_finished_jobs()
+        return job
+
+    def _run(self, job: IngestionJob, work: Callable[[], List[dict]]):
+        with job.lock:
+            if job.status == JobStatus.CANCELLED:
+                return
+            job.status = JobStatus.RUNNING
+            job.started_at = datetime.now(timezone.utc)
+
+        try:
+            work()
+            status = JobStatus.CANCELLED if job.cancel_event.is_set() else JobStatus.COMPLETED
+            error = None
+        except Exception as e:
+            print(f"Error in ingestion job {job.job_id}: {e}")
+            status = JobStatus.FAILED
+            error = str(e)
+
+        with job.lock:
+            self._finish_job(job, status, error)
+
+    def _finish_job(self, job: IngestionJob, status: JobStatus, error: Optional[str] = None):
+        # Called with the job's lock held. Posts that never left the queue are finished with the job,
+        # so the post counts add up whether it was cancelled queued or running
+        for progress in job.posts.values():
+            if progress.status in (PostStatus.QUEUED, PostStatus.RUNNING):
+                progress.status = PostStatus.CANCELLED if status == JobStatus.CANCELLED else PostStatus.FAILED
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now(timezone.utc)
+
+    def _evict_finished_jobs(self):
+        finished = [job for job in self.jobs.values() if job.is_finished]
+        for job in finished[:max(len(self.jobs) - Config.INGEST_JOB_HISTORY, 0)]:
+            del self.jobs[job.job_id]
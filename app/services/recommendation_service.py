@@ -1,11 +1,10 @@
 import os
-import tempfile
 from typing import List
 
 from app.models.video import KeyframeContext, Video
 from app.services.client.llm_agent_service import LlmAgentService
 from app.services.feature_extraction_service import FeatureExtractionService
-from app.utils.audio import extract_audio
+from app.utils.frame_store import KeyframeStore
 
 
 class RecommendationService:
@@ -16,57 +15,55 @@ class RecommendationService:
     def process_video(self, video_path: str, caption: str):
         """Process video and generate analysis."""
 
-        video_duration = self.feature_extraction_service.get_video_duration(video_path)
-
-        print("Extracting keyframes...")
-        keyframes = self.feature_extraction_service.get_keyframes(video_path, video_duration)
-        print(f"Found {len(keyframes)} keyframes")
-
-        audio_dir = tempfile.gettempdir()
-        filename = os.path.basename(video_path)
-        audio_path = f"{audio_dir}/{os.path.splitext(filename)[0]}.wav"
-
-        if not extract_audio(video_path, audio_path):
-            print(f"Error in extracting audio to {audio_path}")
-            raise ValueError(f"Unable to extract audio from {video_path}")
-
-        complete_transcript = self.feature_extraction_service.transcribe(audio_path)
-
-        print("Processing audio for each keyframe...")
-        keyframe_contexts = []
-
-        for i, (frame_num, timestamp, frame) in enumerate(keyframes):
-            print(f"Processing keyframe {i + 1}/{len(keyframes)}")
-            start_time = 0 if i == 0 else keyframes[i - 1][1]
-
-            audio_transcript = self.feature_extraction_service.transcribe(
-                audio_path,
-                start_time,
-                timestamp
-            )
-
-            context = KeyframeContext(
-                frame_number=i + 1,
-                timestamp=timestamp,
-                image=frame,
-                audio_transcript=audio_transcript,
-                window_start=start_time,
-                window_end=timestamp
-            )
-            keyframe_contexts.append(context)
-
-        # clean up
-        os.remove(audio_path)
-
-        # call summary generator
-        print("Calling AGENT to generate summary...")
-        summary = self.llm_agent_service.generate_summary(keyframe_contexts, caption)
-
-        # call screenplay generator
-        print("Calling AGENT to generate screenplay...")
-        screenplay = self.llm_agent_service.generate_screenplay(summary, complete_transcript)
-
-        return summary, screenplay
+        # The keyframes are kept compressed, with at most KEYFRAME_STORE_MAX_MEMORY_BYTES of them in memory
+        with KeyframeStore() as keyframe_store:
+            print("Extracting keyframes...")
+            media = self.feature_extraction_service.prepare_media(video_path, keyframe_store=keyframe_store)
+            keyframes = media.keyframes
+            print(f"Found {len(keyframes)} keyframes")
+
+            audio_path = media.audio_path
+            if audio_path is None:
+                print(f"Error in extracting audio from {video_path}")
+                raise ValueError(f"Unable to extract audio from {video_path}")
+
+            complete_transcript = self.feature_extraction_service.transcribe(audio_path)
+
+            print("Processing audio for each keyframe...")
+            keyframe_contexts = []
+
+            for i, (frame_num, timestamp, frame) in enumerate(keyframes):
+                print(f"Processing keyframe {i + 1}/{len(keyframes)}")
+                start_time = 0 if i == 0 else keyframes[i - 1][1]
+
+                audio_transcript = self.feature_extraction_service.transcribe(
+                    audio_path,
+                    start_time,
+                    timestamp
+                )
+
+                context = KeyframeContext(
+                    frame_number=i + 1,
+                    timestamp=timestamp,
+                    image=frame,
+                    audio_transcript=audio_transcript,
+                    window_start=start_time,
+                    window_end=timestamp
+                )
+                keyframe_contexts.append(context)
+
+            # clean up
+            os.remove(audio_path)
+
+            # call summary generator
+            print("Calling AGENT to generate summary...")
+            summary = self.llm_agent_service.generate_summary(keyframe_contexts, caption)
+
+            # call screenplay generator
+            print("Calling AGENT to generate screenplay...")
+            screenplay = self.llm_agent_service.generate_screenplay(summary, complete_transcript)
+
+            return summary, screenplay
 
     def suggest_edits(self, high_performing_videos: List[Video], low_performing_video: Video):
         """
@@ -0,0 +1,172 @@
+import bisect
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.config.settings import Config
+
+
+@dataclass
+class VideoIndex:
+    fps: float
+    frame_count: int
+    # Sorted frame numbers of the keyframes, empty when ffprobe could not index the video
+    keyframes: List[int] = field(default_factory=list)
+
+    def get_keyframe_before(self, frame_number: int) -> Optional[int]:
+        position = bisect.bisect_right(self.keyframes, frame_number)
+        return self.keyframes[position - 1] if position else None
+
+    def get_frame_number(self, timestamp: float) -> int:
+        frame_number = int(timestamp * self.fps)
+        return min(max(frame_number, 0), self.frame_count - 1) if self.frame_count > 0 else max(frame_number, 0)
+
+
+# Indexes of the recently read videos, keyed by path, size and modification time
+_indexes: "OrderedDict[Tuple[str, int, int], VideoIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+class FrameReaderService:
+    """
+    Random access to the frames of a video. A frame is read by seeking to the keyframe before it and decoding
+    forward from there, so it costs at most a GOP of decoding instead of every frame since the start.
+    The keyframe positions come from the container index (ffprobe) and are cached per file.
+    """
+
+    def get_index(self, video_path: str) -> Optional[VideoIndex]:
+        try:
+            stat = os.stat(video_path)
+        except OSError as e:
+            print(f"Error reading video file {video_path}: {e}")
+            return None
+
+        key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+        with _indexes_lock:
+            if key in _indexes:
+                _indexes.move_to_end(key)
+                return _indexes[key]
+
+        index = self._build_index(video_path)
+        if index is None:
+            return None
+
+        with _indexes_lock:
+            _indexes[key] = index
+            while len(_indexes) > Config.FRAME_INDEX_CACHE_SIZE:
+                _indexes.popitem(last=False)
+        return index
+
+    def read_frames(self, video_path: str, frame_numbers: List[int]) -> List[Optional[np.ndarray]]:
+        """
+        Read frames by number with a single capture, in one forward pass over the sorted frame numbers.
+        The reader decodes forward to the next frame when no keyframe lies in between, and seeks otherwise.
+
+        Args:
+            video_path: Path to the video file
+            frame_numbers: Frame numbers to read, in any order
+
+        Returns:
+            The frames in the order of frame_numbers, None for the ones that could not be read
+        """
+        index = self.get_index(video_path)
+        if index is None or not frame_numbers:
+            return [None] * len(frame_numbers)
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            print(f"Error opening video file: {video_path}")
+            return [None] * len(frame_numbers)
+
+        frames: Dict[int, Optional[np.ndarray]] = {}
+        # Number of the next frame grab() returns
+        position = 0
+        try:
+            for frame_number in sorted(set(frame_numbers)):
+                if self._should_seek(index, position, frame_number):
+                    seek_to = index.get_keyframe_before(frame_number)
+                    # Without an index the capture seeks to the frame itself
+                    position = seek_to if seek_to is not None else frame_number
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+
+                frame = None
+                while position <= frame_number:
+                    if not cap.grab():
+                        break
+                    position += 1
+                if position == frame_number + 1:
+                    ret, frame = cap.retrieve()
+                    frame = frame if ret else None
+                frames[frame_number] = frame
+        finally:
+            cap.release()
+
+        return [frames.get(frame_number) for frame_number in frame_numbers]
+
+    def read_frames_at(self, video_path: str, timestamps: List[float]) -> List[Optional[np.ndarray]]:
+        """Read the frames shown at the given times in seconds, see read_frames"""
+        index = self.get_index(video_path)
+        if index is None:
+            return [None] * len(timestamps)
+        return self.read_frames(video_path, [index.get_frame_number(timestamp) for timestamp in timestamps])
+
+    """
+        Helper functions
+    """
+
+    def _should_seek(self, index: VideoIndex, position: int, frame_number: int) -> bool:
+        if frame_number < position:
+            return True
+        if not index.keyframes:
+            return frame_number - position > Config.FRAME_READER_MAX_FORWARD_SECONDS * index.fps
+        # Decoding forward is cheaper as long as no keyframe lies between the position and the frame
+        keyframe = index.get_keyframe_before(frame_number)
+        return keyframe is not None and keyframe > position
+
+    def _build_index(self, video_path: str) -> Optional[VideoIndex]:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            print(f"Error opening video file: {video_path}")
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if not fps:
+            print(f"Error reading the frame rate of {video_path}")
+            return None
+
+        return VideoIndex(fps=fps, frame_count=frame_count, keyframes=self._probe_keyframes(video_path, fps))
+
+    def _probe_keyframes(self, video_path: str, fps: float) -> List[int]:
+        # Packet flags come from the container, nothing is decoded
+        command = [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", video_path
+        ]
+        try:
+            result = subprocess.run(
+                command, capture_output=True, text=True, check=True, timeout=Config.FRAME_INDEX_TIMEOUT_SECONDS
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"Error indexing the keyframes of {video_path}, seeking without the index: {e}")
+            return []
+
+        packets = []
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(",")
+            try:
+                packets.append((float(pts_time), "K" in flags))
+            except ValueError:
+                continue
+        if not packets:
+            return []
+
+        # Frame numbers count from the first frame, whose timestamp is not always 0
+        start_time = min(pts_time for pts_time, _ in packets)
+        return sorted({round((pts_time - start_time) * fps) for pts_time, is_keyframe in packets if is_keyframe})
@@ -1,31 +1,28 @@
-from typing import Optional, List
+import math
+import os
+import tempfile
+from typing import Optional, List, Tuple
 
 import cv2
 import numpy as np
 
 from app import Config
+from app.models.video import MediaBundle
+from app.services.visual.frame_reader_service import FrameReaderService
+from app.utils.audio import extract_audio
+from app.utils.frame_store import KeyframeStore
+from app.utils.shot_detection import ShotDetector, get_shot_detector
 
 
 class VideoProcessorService:
-    def __init__(self):
-        pass
+    def __init__(self, shot_detector: Optional[ShotDetector] = None):
+        self.frame_reader = FrameReaderService()
+        # Decides which frames start a new shot, Config.SHOT_DETECTOR by default
+        self.shot_detector = shot_detector or get_shot_detector()
 
-    def _is_scene_change(self, frame, prev_frame, threshold=Config.MIN_SCENE_CHANGE_THRESHOLD) -> bool:
-        """
-        Helper function to detect scene changes between two frames.
-
-        Args:
-            frame: Current frame.
-            prev_frame: Previous frame.
-            threshold: Minimum mean difference to consider a scene change.
-
-        Returns:
-            True if a scene change is detected, False otherwise.
-        """
-        curr_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-        frame_diff = cv2.absdiff(curr_gray, prev_gray)
-        return np.mean(frame_diff) > threshold
+    def _get_keep(self, keyframe_store: Optional[KeyframeStore]):
+        """Function applied to the frames a scan returns, storing them compressed when there is a store"""
+        return keyframe_store.add if keyframe_store is not None else (lambda frame: frame)
 
     def extract_keyframes(self, video_path: str, max_duration_seconds: Optional[float] = None) -> List[tuple]:
         """
@@ -45,41 +42,282 @@ class VideoProcessorService:
 
         # Get video properties
         fps = cap.get(cv2.CAP_PROP_FPS)
-        min_frame_interval = int(fps * Config.MIN_INTERVAL_SECONDS)
         max_frame = int(max_duration_seconds * fps) if max_duration_seconds else None
 
+        scan = self._scan_video(cap, fps, max_frame)
+
+        cap.release()
+        return scan["keyframes"]
+
+    def prepare_media(self, video_path: str, prefix_seconds: float = 5.0, hook_frame_time: int = 1,
+                      include_video: bool = True, include_audio: bool = True,
+                      keyframe_store: Optional[KeyframeStore] = None) -> MediaBundle:
+        """
+        Decode a video once and collect everything the feature stages need from it.
+
+        Args:
+            video_path: Path to the video file.
+            prefix_seconds: Length of the opening segment whose keyframes are exposed as prefix_keyframes.
+            hook_frame_time: Time in seconds of the hook frame.
+            include_video: Decode the frames (keyframes and hook frame), skip it when only the audio is needed.
+            include_audio: Extract the audio track as PCM wav.
+            keyframe_store: Store keeping the frames of the bundle compressed (None keeps the arrays).
+
+        Returns:
+            MediaBundle shared by the downstream stages.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {video_path}")
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        duration = frame_count / fps if fps else 0.0
+
+        bundle = MediaBundle(video_path=video_path, fps=fps, frame_count=frame_count, duration=duration)
+
+        if include_video:
+            # Same boundaries extract_keyframes(video_path, min(duration, prefix_seconds)) and
+            # extract_hook_frame(video_path, hook_frame_time) would use
+            prefix_duration = min(duration, prefix_seconds)
+            prefix_frame = int(prefix_duration * fps) if prefix_duration else None
+            hook_frame_number = math.ceil(fps * hook_frame_time) - 1
+
+            scan = self._scan_video(
+                cap, fps, prefix_frame=prefix_frame, hook_frame_number=hook_frame_number, keyframe_store=keyframe_store
+            )
+            bundle.keyframes = scan["keyframes"]
+            bundle.prefix_count = scan["prefix_count"]
+            bundle.prefix_tail = scan["prefix_tail"]
+            bundle.hook_frame = scan["hook_frame"]
+
+        cap.release()
+
+        if include_audio:
+            base_name = os.path.splitext(os.path.basename(video_path))[0]
+            audio_path = os.path.join(tempfile.gettempdir(), f"{base_name}.wav")
+            bundle.audio_path = audio_path if extract_audio(video_path, audio_path) else None
+
+        return bundle
+
+    def _scan_video(self, cap: cv2.VideoCapture, fps: float, max_frame: Optional[int] = None,
+                    prefix_frame: Optional[int] = None, hook_frame_number: Optional[int] = None,
+                    keyframe_store: Optional[KeyframeStore] = None) -> dict:
+        """
+        Single decoding pass that detects keyframes based on scene changes.
+        Scene changes are detected by the shot detector on reduced frames, and the frames in the cooldown after
+        a keyframe are skipped without being decoded.
+
+        Args:
+            cap: Opened video capture.
+            fps: Frames per second of the video.
+            max_frame: Frame number to stop at (None for the entire video).
+            prefix_frame: Frame number where a shorter scan would have stopped, to also return its keyframes.
+            hook_frame_number: Frame number of a frame to return as is.
+            keyframe_store: Store the returned frames go to as soon as they are found (None keeps the arrays).
+
+        Returns:
+            dict with the keyframes, the number of keyframes before prefix_frame, the extra last frame
+            a scan stopping at prefix_frame would have added and the hook frame.
+        """
+        min_frame_interval = int(fps * Config.MIN_INTERVAL_SECONDS)
+        keep = self._get_keep(keyframe_store)
+        is_boundary = self.shot_detector.get_boundary_test()
+        # Frames from here on are decoded, so that the last frame of the video is never just grabbed
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        last_frame = min(frame_count, max_frame) - 1 if max_frame else frame_count - 1
+
         # Initialize variables
         keyframes = []
-        prev_frame = None
-        frames_extracted = set()
+        prev_frame = prev_reduced = None
+        prev_frame_number = -1
         frame_number = 0
         frames_since_last_keyframe = 0
+        prefix_count = prefix_tail = hook_frame = None
 
         while True:
-            ret, frame = cap.read()
-            if not ret or (max_frame and frame_number >= max_frame):
+            if not cap.grab() or (max_frame and frame_number >= max_frame):
                 break  # Stop if video ends or max duration is reached
 
-            # Check if it's the first frame or a significant scene change
-            if prev_frame is None or (
-                    frames_since_last_keyframe >= min_frame_interval
-                    and self._is_scene_change(frame, prev_frame)
-            ):
-                keyframes.append((frame_number, frame_number / fps, frame.copy()))
-                frames_extracted.add(frame_number)
-                frames_since_last_keyframe = 0  # Reset counter
+            if prefix_frame and frame_number == prefix_frame and prefix_count is None:
+                prefix_count = len(keyframes)
+                if prev_frame is not None:
+                    prefix_tail = (frame_number, frame_number / fps, keep(prev_frame))
+
+            # Frames in the cooldown after a keyframe are only grabbed, unless the next frame is compared to them
+            # or they are returned
+            is_candidate = prev_reduced is None or frames_since_last_keyframe >= min_frame_interval
+            if (is_candidate or frames_since_last_keyframe + 1 >= min_frame_interval
+                    or frame_number == hook_frame_number or frame_number >= last_frame
+                    or (prefix_frame and frame_number == prefix_frame - 1)):
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                # Each retrieve returns a new array, so keyframes keep the frame without copying it
+                reduced = self.shot_detector.reduce(frame)
+
+                if frame_number == hook_frame_number:
+                    hook_frame = keep(frame)
+
+                # Check if it's the first frame or a significant scene change
+                if is_candidate and (
+                        prev_reduced is None
+                        or is_boundary(self.shot_detector.get_difference(reduced, prev_reduced))
+                ):
+                    keyframes.append((frame_number, frame_number / fps, keep(frame)))
+                    frames_since_last_keyframe = 0  # Reset counter
+
+                prev_frame, prev_reduced, prev_frame_number = frame, reduced, frame_number
 
             # Update tracking variables
-            prev_frame = frame.copy()
             frame_number += 1
             frames_since_last_keyframe += 1
 
-        # Ensure the last frame is included if it wasn't already
-        if prev_frame is not None and frame_number not in frames_extracted:
-            keyframes.append((frame_number, frame_number / fps, prev_frame.copy()))
+        # The frame count of the container can be too high, then the last frame was only grabbed
+        if frame_number and prev_frame_number != frame_number - 1:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number - 1)
+            ret, frame = cap.read()
+            if ret:
+                prev_frame = frame
+
+        # Ensure the last frame is included
+        if prev_frame is not None:
+            keyframes.append((frame_number, frame_number / fps, keep(prev_frame)))
+
+        return {
+            "keyframes": keyframes,
+            "prefix_count": prefix_count,
+            "prefix_tail": prefix_tail,
+            "hook_frame": hook_frame
+        }
+
+    def get_segments(self, frame_count: int, fps: float) -> List[Tuple[int, Optional[int]]]:
+        """
+        Split a video into time segments to scan in parallel with scan_segment.
+
+        Args:
+            frame_count: Number of frames to scan.
+            fps: Frames per second of the video.
+
+        Returns:
+            (start frame, end frame) of each segment, the last one ends with the video (None).
+        """
+        duration = frame_count / fps if fps else 0.0
+        count = max(1, min(Config.CPU_POOL_WORKERS, int(duration // Config.SEGMENTED_DECODE_MIN_SEGMENT_SECONDS)))
+        bounds = [round(frame_count * i / count) for i in range(count)]
+        return [(start, end) for start, end in zip(bounds, bounds[1:] + [None])]
+
+    def scan_segment(self, video_path: str, start_frame: int, end_frame: Optional[int] = None,
+                     shot_detector: Optional[ShotDetector] = None) -> np.ndarray:
+        """
+        Scene differences of the frames of one segment of a video.
+        The first frame of the segment is compared with the last frame of the previous one, so the differences of
+        consecutive segments put together are the ones of a scan of the whole video.
+
+        Args:
+            video_path: Path to the video file.
+            start_frame: First frame of the segment.
+            end_frame: Frame after the last one of the segment (None for the end of the video).
+            shot_detector: Detector computing the differences, e.g. the one of the service selecting the keyframes
+                (None for this service's).
+
+        Returns:
+            Difference of each frame with the frame before it, infinite for the first frame of the video.
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video file: {video_path}")
+
+        shot_detector = shot_detector or self.shot_detector
+        differences = []
+        prev_reduced = None
+        frame_number = max(start_frame - 1, 0)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+
+        while end_frame is None or frame_number < end_frame:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            reduced = shot_detector.reduce(frame)
+            if frame_number >= start_frame:
+                differences.append(
+                    shot_detector.get_difference(reduced, prev_reduced) if prev_reduced is not None else np.inf
+                )
+            prev_reduced = reduced
+            frame_number += 1
 
         cap.release()
-        return keyframes
+        return np.asarray(differences, dtype=np.float32)
+
+    def select_keyframes(self, video_path: str, differences: np.ndarray, fps: float,
+                         prefix_frame: Optional[int] = None, hook_frame_number: Optional[int] = None,
+                         keyframe_store: Optional[KeyframeStore] = None) -> dict:
+        """
+        Apply the keyframe rules of _scan_video to the scene differences of a whole video,
+        then read the selected frames with the frame reader.
+
+        Args:
+            video_path: Path to the video file.
+            differences: Scene differences of all the frames to scan, e.g. the segments of scan_segment put together.
+            fps: Frames per second of the video.
+            prefix_frame: Frame number where a shorter scan would have stopped, to also return its keyframes.
+            hook_frame_number: Frame number of a frame to return as is.
+            keyframe_store: Store the returned frames go to (None keeps the arrays).
+
+        Returns:
+            Same dict as _scan_video.
+        """
+        frame_total = len(differences)
+        min_frame_interval = int(fps * Config.MIN_INTERVAL_SECONDS)
+        # Given the differences of the same frames as in _scan_video, so stateful tests agree with it
+        is_boundary = self.shot_detector.get_boundary_test()
+
+        keyframe_numbers = []
+        frames_since_last_keyframe = 0
+        for frame_number, difference in enumerate(differences):
+            if not keyframe_numbers or (
+                    frames_since_last_keyframe >= min_frame_interval and is_boundary(float(difference))
+            ):
+                keyframe_numbers.append(frame_number)
+                frames_since_last_keyframe = 0
+            frames_since_last_keyframe += 1
+
+        has_prefix = bool(prefix_frame) and prefix_frame < frame_total
+        has_hook = hook_frame_number is not None and 0 <= hook_frame_number < frame_total
+        extra_numbers = [frame_total - 1] if frame_total else []
+        if has_prefix:
+            extra_numbers.append(prefix_frame - 1)
+        if has_hook:
+            extra_numbers.append(hook_frame_number)
+
+        keep = self._get_keep(keyframe_store)
+        frames = {
+            frame_number: keep(frame) if frame is not None else None
+            for frame_number, frame in zip(
+                keyframe_numbers + extra_numbers,
+                self.frame_reader.read_frames(video_path, keyframe_numbers + extra_numbers)
+            )
+        }
+
+        keyframes = [
+            (frame_number, frame_number / fps, frames[frame_number])
+            for frame_number in keyframe_numbers if frames[frame_number] is not None
+        ]
+        prefix_count = prefix_tail = None
+        if has_prefix:
+            prefix_count = len([keyframe for keyframe in keyframes if keyframe[0] < prefix_frame])
+            if frames[prefix_frame - 1] is not None:
+                prefix_tail = (prefix_frame, prefix_frame / fps, frames[prefix_frame - 1])
+        # The last frame is always included, numbered after the last scanned frame like in _scan_video
+        if frame_total and frames[frame_total - 1] is not None:
+            keyframes.append((frame_total, frame_total / fps, frames[frame_total - 1]))
+
+        return {
+            "keyframes": keyframes,
+            "prefix_count": prefix_count,
+            "prefix_tail": prefix_tail,
+            "hook_frame": frames[hook_frame_number] if has_hook else None
+        }
 
     def extract_hook_frame(self, video_path: str, frame_time: int = 1) -> Optional[np.ndarray]:
         """
@@ -92,24 +330,29 @@ class VideoProcessorService:
         Returns:
             numpy.ndarray: The extracted frame, or None if extraction failed
         """
+        index = self.frame_reader.get_index(video_path)
+        if index is None:
+            return None
 
-        frame = None
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            print(f"Error opening video file: {video_path}")
+        # Last frame shown before frame_time
+        frame_number = math.ceil(index.fps * frame_time) - 1
+        if frame_number < 0:
+            return None
+        if index.frame_count > 0 and frame_number >= index.frame_count:
+            print(f"Error: Video has fewer than {frame_number + 1} frames")
             return None
 
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_number = fps * frame_time
+        return self.frame_reader.read_frames(video_path, [frame_number])[0]
 
-        current_frame = 0
-        while current_frame < frame_number:
-            ret, frame = cap.read()
-            if not ret:
-                print(f"Error: Video has fewer than {frame_number} frames")
-                cap.release()
-                return None
-            current_frame += 1
+    def extract_frames_at(self, video_path: str, timestamps: List[float]) -> List[Optional[np.ndarray]]:
+        """
+        Extract the frames shown at the given times, e.g. the moments of a screenplay
 
-        cap.release()
-        return frame
+        Args:
+            video_path: Path to the video file.
+            timestamps: Times in seconds, in any order.
+
+        Returns:
+            The frames in the order of timestamps, None for the ones that could not be read.
+        """
+        return self.frame_reader.read_frames_at(video_path, timestamps)
@@ -0,0 +1,48 @@
+import threading
+import time
+from typing import Hashable, Iterable
+
+
+class TtlSet:
+    """
+    Thread-safe in-process set whose members expire after a fixed time to live
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int = 100_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._expiry = {}
+        self._lock = threading.Lock()
+
+    def add(self, item: Hashable):
+        self.update([item])
+
+    def update(self, items: Iterable[Hashable]):
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for item in items:
+                self._expiry[item] = expires_at
+            if len(self._expiry) > self.max_size:
+                self._evict()
+
+    def discard(self, item: Hashable):
+        with self._lock:
+            self._expiry.pop(item, None)
+
+    def __contains__(self, item: Hashable) -> bool:
+        with self._lock:
+            expires_at = self._expiry.get(item)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._expiry[item]
+                return False
+            return True
+
+    def _evict(self):
+        now = time.monotonic()
+        self._expiry = {item: expires_at for item, expires_at in self._expiry.items() if expires_at >= now}
+        # Drop the entries closest to expiry if the set is still too big
+        if len(self._expiry) > self.max_size:
+            newest = sorted(self._expiry.items(), key=lambda entry: entry[1])[-self.max_size:]
+            self._expiry = dict(newest)
@@ -0,0 +1,80 @@
+import contextvars
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from typing import Optional
+
+# Whether the LLM calls of the current task are deferred to message batches
+_deferred_llm = contextvars.ContextVar("deferred_llm", default=False)
+# Usage tracker of the job and post the LLM calls of the current task are accounted to
+_llm_usage_tracker = contextvars.ContextVar("llm_usage_tracker", default=None)
+_llm_post_id = contextvars.ContextVar("llm_post_id", default=None)
+# Monotonic time by which the current request must be answered
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+@contextmanager
+def deferred_llm_calls(enabled: bool = True):
+    token = _deferred_llm.set(enabled)
+    try:
+        yield
+    finally:
+        _deferred_llm.reset(token)
+
+
+def is_deferred_llm() -> bool:
+    return _deferred_llm.get()
+
+
+@contextmanager
+def llm_usage_scope(tracker, post_id=None):
+    tracker_token = _llm_usage_tracker.set(tracker)
+    post_token = _llm_post_id.set(post_id)
+    try:
+        yield
+    finally:
+        _llm_post_id.reset(post_token)
+        _llm_usage_tracker.reset(tracker_token)
+
+
+def get_llm_usage_tracker():
+    return _llm_usage_tracker.get()
+
+
+def get_llm_post_id():
+    return _llm_post_id.get()
+
+
+@contextmanager
+def request_deadline(seconds: Optional[float]):
+    """Give the enclosed work a deadline, an outer deadline that is sooner is kept"""
+    deadline = time.monotonic() + seconds if seconds is not None else None
+    outer = _deadline.get()
+    if outer is not None and (deadline is None or outer < deadline):
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_remaining_seconds() -> Optional[float]:
+    """Seconds left before the deadline of the current request, None without a deadline"""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+
+def check_deadline(step: str):
+    remaining = get_remaining_seconds()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceededError(f"Deadline exceeded before {step}")
+
+
+def submit_in_context(executor: Executor, func, *args, **kwargs) -> Future:
+    """Submit to an executor with the caller's context variables, which worker threads don't inherit"""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
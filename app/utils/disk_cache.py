@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import stat as stat_module
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+
+
+def make_private_directory(directory: str):
+    """
+    Creates directory readable by the current user only, or tightens its permissions if it exists.
+    Raises PermissionError if another user owns it, e.g. one created first in the shared temp directory.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid'):
+        stat = os.stat(directory)
+        if stat.st_uid != os.getuid():
+            raise PermissionError(f"Directory {directory} is not owned by the current user")
+        if stat.st_mode & (stat_module.S_IRWXG | stat_module.S_IRWXO):
+            os.chmod(directory, 0o700)
+
+
+class DiskCache:
+    """
+    Local disk-backed key-value store with least-recently-used eviction once the total size goes over max_size_bytes.
+    Entries older than ttl_seconds are treated as missing. Values are stored as JSON, one file per entry, so a planted
+    entry can at worst be a wrong value. The directory must be owned by the current user and is kept private to it.
+    """
+
+    def __init__(self, directory: str, max_size_bytes: int, ttl_seconds: Optional[float] = None):
+        self.directory = directory
+        self.max_size_bytes = max_size_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        make_private_directory(self.directory)
+        self._size = self._scan_size()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl_seconds is not None and time.time() - stat.st_mtime > self.ttl_seconds:
+                self.delete(key)
+                return default
+
+            with open(path, 'r', encoding='utf-8') as file:
+                value = json.load(file)
+
+            # Access time drives the LRU eviction, set it explicitly since many filesystems mount with noatime
+            os.utime(path, (time.time(), stat.st_mtime))
+            return value
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            print(f"Error reading cache entry {key}: {e}")
+            self.delete(key)
+            return default
+
+    def set(self, key: str, value: Any):
+        """Store a JSON serializable value, numpy scalars and arrays included (tuples come back as lists)"""
+        path = self._path(key)
+        temp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(value, file, default=self._to_json)
+
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            new_size = os.path.getsize(temp_path)
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Error writing cache entry {key}: {e}")
+            # A value that can't be serialized leaves a partial temp file behind
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            self._size += new_size - old_size
+            if self._size > self.max_size_bytes:
+                self._evict()
+
+    def delete(self, key: str):
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._size -= size
+
+    """
+        Helper functions
+    """
+
+    @staticmethod
+    def _to_json(value: Any) -> Any:
+        # numpy scalars and arrays, e.g. in the audio features
+        if hasattr(value, 'tolist'):
+            return value.tolist()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self) -> list:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if not filename.endswith('.json'):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Evict down to 90% of the cap so that eviction doesn't run on every write
+        target_size = int(self.max_size_bytes * 0.9)
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= target_size:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except FileNotFoundError:
+                continue
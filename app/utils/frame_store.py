@@ -0,0 +1,83 @@
+import tempfile
+import threading
+from typing import Optional
+
+import numpy as np
+
+from app.config.settings import Config
+from app.utils.video import decode_frame, encode_frame
+
+
+class StoredFrame:
+    """
+    Frame kept by a KeyframeStore. It holds no pixels: each load decodes the frame again,
+    so a full-size array only lives as long as the caller keeps it.
+    """
+
+    def __init__(self, store: "KeyframeStore", offset: int, size: int, data: Optional[bytes] = None):
+        self.store = store
+        self.offset = offset
+        self.size = size
+        # JPEG bytes while they are kept in memory, None once they are in the spill file
+        self.data = data
+
+    def load(self) -> np.ndarray:
+        return decode_frame(self.data if self.data is not None else self.store.read(self.offset, self.size))
+
+
+class KeyframeStore:
+    """
+    Holds the keyframes of one request as JPEG bytes, in memory up to max_memory_bytes and in a temporary spill
+    file beyond that, instead of full-resolution arrays. A 1080x1920 frame takes about 6 MB as an array
+    and a few hundred KB here.
+
+    Args:
+        max_memory_bytes: Max size of the encoded frames kept in memory
+        quality: JPEG quality of the stored frames
+    """
+
+    def __init__(self, max_memory_bytes: int = Config.KEYFRAME_STORE_MAX_MEMORY_BYTES,
+                 quality: int = Config.KEYFRAME_STORE_QUALITY):
+        self.max_memory_bytes = max_memory_bytes
+        self.quality = quality
+        self.memory_bytes = 0
+        self.spill_file = None
+        self.spill_bytes = 0
+        self.lock = threading.Lock()
+
+    def add(self, frame: np.ndarray) -> StoredFrame:
+        return self.add_encoded(encode_frame(frame, self.quality))
+
+    def add_encoded(self, data: bytes) -> StoredFrame:
+        """Store a frame that is already JPEG encoded, e.g. one coming back from a worker process"""
+        with self.lock:
+            if self.memory_bytes + len(data) <= self.max_memory_bytes:
+                self.memory_bytes += len(data)
+                return StoredFrame(self, 0, len(data), data)
+
+            if self.spill_file is None:
+                self.spill_file = tempfile.TemporaryFile(prefix="tapestry_keyframes_", dir=Config.KEYFRAME_STORE_DIR)
+            offset = self.spill_bytes
+            self.spill_file.seek(offset)
+            self.spill_file.write(data)
+            self.spill_bytes += len(data)
+            return StoredFrame(self, offset, len(data))
+
+    def read(self, offset: int, size: int) -> bytes:
+        with self.lock:
+            if self.spill_file is None:
+                raise ValueError("The keyframe store is closed")
+            self.spill_file.seek(offset)
+            return self.spill_file.read(size)
+
+    def close(self):
+        with self.lock:
+            if self.spill_file is not None:
+                self.spill_file.close()
+                self.spill_file = None
+
+    def __enter__(self) -> "KeyframeStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,108 @@
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, TimeoutError, wait
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Set
+
+from app.utils.context import submit_in_context
+
+
+class HedgePolicy:
+    """
+    Keeps the recent latencies of each kind of call and tells how long to wait before hedging one
+
+    Args:
+        percentile: Latency percentile after which a duplicate is sent, e.g. 0.95
+        min_samples: Number of latencies needed before a kind of call is hedged
+        window_size: Number of recent latencies kept per kind of call
+        min_delay_seconds: Lower bound of the hedging delay, so fast calls are not duplicated on noise
+    """
+
+    def __init__(self, percentile: float, min_samples: int, window_size: int, min_delay_seconds: float = 0.0):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window_size = window_size
+        self.min_delay_seconds = min_delay_seconds
+        self.latencies: Dict[Hashable, Deque[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, key: Hashable, seconds: float):
+        with self.lock:
+            self.latencies.setdefault(key, deque(maxlen=self.window_size)).append(seconds)
+
+    def get_delay(self, key: Hashable) -> Optional[float]:
+        """
+        Returns:
+            Seconds to wait for the call before sending a duplicate, None when there are too few latencies yet
+        """
+        with self.lock:
+            latencies = sorted(self.latencies.get(key, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        index = min(int(len(latencies) * self.percentile), len(latencies) - 1)
+        return max(latencies[index], self.min_delay_seconds)
+
+
+def hedged_call(executor: Executor, func: Callable, delay_seconds: float,
+                on_discarded: Optional[Callable[[Future], None]] = None,
+                is_success: Optional[Callable[[Any], bool]] = None):
+    """
+    Run func, and run it a second time if it hasn't finished after delay_seconds. The first run to succeed wins:
+    a run that raises or whose result fails is_success (e.g. a 429 or 5xx response) doesn't end the wait for the
+    other one. The losing run can't be stopped once started, so it is left to finish.
+
+    Args:
+        executor: Executor running the calls, it must not run anything waiting on other tasks of its own
+        func: Call to run
+        delay_seconds: Time to wait for the first run before starting the second one
+        on_discarded: Called in the caller's context with the future of a run that started but wasn't used
+        is_success: Check of a result, every result counts as a success when not given
+
+    Returns:
+        Result of the winning run, and "not_hedged", "original" or "hedge" for which run it came from.
+        When both runs fail, the last failed result if there is one.
+
+    Raises:
+        The error of the last run to fail when both raise
+    """
+    is_success = is_success or (lambda result: True)
+    first = submit_in_context(executor, func)
+    try:
+        return first.result(timeout=delay_seconds), "not_hedged"
+    except TimeoutError:
+        pass
+
+    second = submit_in_context(executor, func)
+    pending = {first, second}
+    failed_result = error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+            elif is_success(future.result()):
+                _discard_others(future, {first, second}, on_discarded)
+                return future.result(), "hedge" if future is second else "original"
+            else:
+                failed_result = future
+
+    if failed_result is None:
+        raise error
+    _discard_others(failed_result, {first, second}, on_discarded)
+    return failed_result.result(), "hedge" if failed_result is second else "original"
+
+
+def _discard_others(used: Future, futures: Set[Future], on_discarded: Optional[Callable[[Future], None]]):
+    if not on_discarded:
+        return
+    callback = _run_in_context(on_discarded)
+    for other in futures - {used}:
+        if other.done() and other.exception() is not None:
+            continue
+        other.add_done_callback(callback)
+
+
+def _run_in_context(func: Callable) -> Callable:
+    # Future callbacks run in the thread completing the future, without the context of the caller
+    context = contextvars.copy_context()
+    return lambda *args: context.run(func, *args)
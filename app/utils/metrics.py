@@ -0,0 +1,259 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Metric:
+    """
+    Base of the in-process metrics, one value per combination of label values
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}"
+        ]
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in sorted(values, key=lambda item: item[0]):
+            lines.extend(self._render_value(label_values, value))
+        return lines
+
+    """
+        Helper functions
+    """
+
+    def _get_label_values(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects the labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _format_labels(self, label_values: Tuple[str, ...], extra: Optional[dict] = None) -> str:
+        pairs = list(zip(self.label_names, label_values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        escaped = [f'{name}="{_escape_label_value(value)}"' for name, value in pairs]
+        return "{" + ",".join(escaped) + "}"
+
+    def _render_value(self, label_values: Tuple[str, ...], value) -> List[str]:
+        return [f"{self.name}{self._format_labels(label_values)} {_format_number(value)}"]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._get_label_values(labels)
+        with self._lock:
+            # [bucket counts..., sum, count]
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    """
+        Helper functions
+    """
+
+    def _render_value(self, label_values: Tuple[str, ...], value) -> List[str]:
+        lines = [
+            f"{self.name}_bucket{self._format_labels(label_values, {'le': _format_number(bound)})} {count}"
+            for bound, count in zip(self.buckets, value)
+        ]
+        lines.append(f"{self.name}_bucket{self._format_labels(label_values, {'le': '+Inf'})} {value[-1]}")
+        lines.append(f"{self.name}_sum{self._format_labels(label_values)} {_format_number(value[-2])}")
+        lines.append(f"{self.name}_count{self._format_labels(label_values)} {value[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of the process and renders them in the Prometheus text exposition format
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    """
+        Helper functions
+    """
+
+    def _get_or_create(self, metric_class, name: str, documentation: str, label_names: Iterable[str], **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, label_names, **kwargs)
+                self.metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}")
+            return metric
+
+
+class TrackedCall:
+    def __init__(self):
+        self.error = False
+
+    def set_error(self):
+        self.error = True
+
+
+class Instrument:
+    """
+    Latency histogram, call and error counters and in-flight gauge of one kind of operation
+
+    Args:
+        registry: Registry to add the metrics to
+        prefix: Common prefix of the metric names
+        description: What is being measured, used in the metric documentation
+        label_names: Labels identifying the operation
+    """
+
+    def __init__(self, registry: MetricsRegistry, prefix: str, description: str, label_names: Iterable[str]):
+        self.duration = registry.histogram(f"{prefix}_duration_seconds", f"Latency of {description}", label_names)
+        self.calls = registry.counter(f"{prefix}_total", f"Number of {description}", label_names)
+        self.errors = registry.counter(f"{prefix}_errors_total", f"Number of failed {description}", label_names)
+        self.in_flight = registry.gauge(f"{prefix}_in_flight", f"Number of {description} in progress", label_names)
+
+    @contextmanager
+    def track(self, **labels):
+        """
+        Measure the enclosed block. It counts as an error when it raises or calls set_error on the yielded call.
+        """
+        call = TrackedCall()
+        self.in_flight.inc(**labels)
+        start = time.perf_counter()
+        try:
+            yield call
+        except BaseException:
+            call.set_error()
+            raise
+        finally:
+            self.duration.observe(time.perf_counter() - start, **labels)
+            self.calls.inc(**labels)
+            if call.error:
+                self.errors.inc(**labels)
+            self.in_flight.dec(**labels)
+
+    def wrap(self, is_error: Optional[Callable[[object], bool]] = None, **labels):
+        """
+        Decorator measuring every call of the function
+
+        Args:
+            is_error: Tells from the return value whether the call failed, for functions that don't raise
+            labels: Label values of the function's metrics
+        """
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.track(**labels) as call:
+                    result = func(*args, **kwargs)
+                    if is_error and is_error(result):
+                        call.set_error()
+                    return result
+
+            return wrapper
+
+        return decorator
+
+
+def _format_number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+ingest_stages = Instrument(registry, "tapestry_ingest_stage", "ingestion stage runs", ["stage"])
+dependency_calls = Instrument(
+    registry, "tapestry_dependency_request", "requests to external services", ["dependency", "operation"]
+)
+llm_requests = Instrument(registry, "tapestry_llm_request", "LLM API requests", ["model", "method"])
+llm_tokens = registry.counter(
+    "tapestry_llm_tokens_total",
+    "Number of LLM tokens by kind: uncached input, output, prompt cache writes and prompt cache reads",
+    ["model", "kind"]
+)
+llm_cost = registry.counter(
+    "tapestry_llm_cost_usd_total", "Estimated cost of the LLM calls in USD", ["model", "method"]
+)
+llm_hedged_requests = registry.counter(
+    "tapestry_llm_hedged_requests_total",
+    "Number of LLM requests sent a second time for being slow, by which of the two answered first",
+    ["model", "method", "winner"]
+)
+llm_prompt_cache_saved_tokens = registry.counter(
+    "tapestry_llm_prompt_cache_saved_tokens_total",
+    "Input tokens saved by the prompt cache, as full price input tokens not paid for",
+    ["model"]
+)
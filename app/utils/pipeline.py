@@ -0,0 +1,130 @@
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+# Marks the end of the stream on a stage queue
+_END = object()
+
+
+class PipelineCancelledError(Exception):
+    pass
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+class StreamingPipeline:
+    """
+    Run items through a chain of stages where every stage has its own group of worker threads.
+    Stages are connected by bounded queues, so each item moves on as soon as the current stage is done with it
+    while the next item is already being processed by the previous stage.
+
+    A stage drops an item by returning None. Exceptions raised by a stage also drop the item
+    and are reported through the optional on_error callback.
+    Items still queued when the stop event is set are dropped with a PipelineCancelledError.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 1,
+                 on_error: Optional[Callable[[Stage, Any, Exception], None]] = None):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = max(queue_size, 1)
+        self.on_error = on_error
+
+    def run(self, items: Iterable, stop_event: Optional[threading.Event] = None) -> Iterator:
+        """
+        Stream items through all stages.
+
+        Args:
+            items: Input items for the first stage
+            stop_event: Event to stop feeding new items and drop the ones in flight
+
+        Returns:
+            Iterator over the items that made it through the last stage, in completion order
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        # The output queue is unbounded so that workers never block on a slow consumer
+        queues.append(queue.Queue())
+
+        stop_event = stop_event if stop_event else threading.Event()
+
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0], stop_event), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            next_workers = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+            state = {'remaining': stage.workers, 'lock': threading.Lock()}
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[index], queues[index + 1], state, next_workers, stop_event),
+                    name=f"pipeline-{stage.name}",
+                    daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+
+        output = queues[-1]
+        while True:
+            item = output.get()
+            if item is _END:
+                break
+            yield item
+
+    """
+        Helper functions
+    """
+
+    def _feed(self, items: Iterable, first_queue: queue.Queue, stop_event: threading.Event):
+        try:
+            for item in items:
+                if stop_event.is_set():
+                    break
+                first_queue.put(item)
+        except Exception as e:
+            print(f"Error reading pipeline input: {e}")
+        finally:
+            for _ in range(self.stages[0].workers):
+                first_queue.put(_END)
+
+    def _report_error(self, stage: Stage, item: Any, error: Exception):
+        if not self.on_error:
+            return
+        try:
+            self.on_error(stage, item, error)
+        except Exception as e:
+            print(f"Error in pipeline error handler for stage '{stage.name}': {e}")
+
+    def _work(self, stage: Stage, in_queue: queue.Queue, out_queue: queue.Queue, state: dict, next_workers: int,
+              stop_event: threading.Event):
+        while True:
+            item = in_queue.get()
+            if item is _END:
+                break
+
+            if stop_event.is_set():
+                self._report_error(stage, item, PipelineCancelledError(f"Cancelled before stage '{stage.name}'"))
+                continue
+
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                print(f"Error in pipeline stage '{stage.name}': {e}")
+                self._report_error(stage, item, e)
+                result = None
+
+            if result is not None:
+                out_queue.put(result)
+
+        # The last worker of a stage closes the stream for the next stage
+        with state['lock']:
+            state['remaining'] -= 1
+            last_worker = state['remaining'] == 0
+        if last_worker:
+            for _ in range(next_workers):
+                out_queue.put(_END)
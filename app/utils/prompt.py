@@ -1,10 +1,75 @@
 import json
+import threading
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config.settings import Config
+
+PROMPTS_DIR = Path(__file__).parent.parent / 'config' / 'prompts'
+
+# Placeholders the callers fill in, which their templates must contain
+PROMPT_PLACEHOLDERS = {
+    ('feature_extraction', 'summary_generator'): ["{caption}"],
+    ('feature_extraction', 'hook_frame_analyzer'): ["{transcript}"],
+    ('feature_extraction', 'UGC_style_identifier'): ["{{TRANSCRIPT}}"]
+}
+
+
+class PromptRegistry:
+    """
+    In-memory store of the prompt templates, read from disk and validated once
+    """
+
+    def __init__(self, prompts_dir: Path = PROMPTS_DIR):
+        self.prompts_dir = prompts_dir
+        self.prompts: Optional[Dict[Tuple[str, str], str]] = None
+        self._lock = threading.Lock()
+
+    def load_all(self) -> int:
+        """
+        Read and validate every prompt template
+
+        Returns:
+            Number of loaded templates
+
+        Raises:
+            ValueError: A template is empty or misses one of its placeholders
+        """
+        prompts = {}
+        for prompt_path in sorted(self.prompts_dir.glob('*/*.txt')):
+            with open(prompt_path, 'r', encoding='utf-8') as file:
+                prompts[(prompt_path.parent.name, prompt_path.stem)] = file.read().strip()
+
+        for (provider, prompt_name), placeholders in PROMPT_PLACEHOLDERS.items():
+            if (provider, prompt_name) not in prompts:
+                raise ValueError(f"Prompt file not found: {provider}/{prompt_name}.txt")
+        for (provider, prompt_name), prompt in prompts.items():
+            if not prompt:
+                raise ValueError(f"Prompt {provider}/{prompt_name} is empty")
+            missing = [p for p in PROMPT_PLACEHOLDERS.get((provider, prompt_name), []) if p not in prompt]
+            if missing:
+                raise ValueError(f"Prompt {provider}/{prompt_name} is missing the placeholders {missing}")
+
+        with self._lock:
+            self.prompts = prompts
+        return len(prompts)
+
+    def get(self, prompt_name: str, provider: str = 'feature_extraction') -> str:
+        if self.prompts is None:
+            self.load_all()
+
+        prompt = self.prompts.get((provider, prompt_name))
+        if prompt is None:
+            raise FileNotFoundError(f"Prompt file not found: {self.prompts_dir / provider / f'{prompt_name}.txt'}")
+        return prompt
+
+
+prompt_registry = PromptRegistry()
 
 
 def load_prompt(prompt_name: str, provider: str = 'feature_extraction') -> str:
     """
-    Load prompt from a text file.
+    Load prompt from the prompt registry.
 
     Args:
         provider: Name of the prompt provider
@@ -14,19 +79,42 @@ def load_prompt(prompt_name: str, provider: str = 'feature_extraction') -> str:
         str: Content of the prompt file
     """
     try:
-        # Get the absolute path to the prompts directory
-        provider_name = provider
-        prompts_dir = Path(__file__).parent.parent / 'config' / 'prompts' / provider_name
-        prompt_path = prompts_dir / f"{prompt_name}.txt"
+        return prompt_registry.get(prompt_name, provider)
+    except Exception as e:
+        raise Exception(f"Error loading prompt {prompt_name}: {str(e)}")
 
-        if not prompt_path.exists():
-            raise FileNotFoundError(f"Prompt file not found: {prompt_path}")
 
-        with open(prompt_path, 'r', encoding='utf-8') as file:
-            return file.read().strip()
+def prompt_blocks(prompt_name: str, replacements: Optional[Dict[str, str]] = None,
+                  provider: str = 'feature_extraction') -> List[dict]:
+    """
+    Build the text content blocks of a prompt. The static part of the template, up to its first placeholder,
+    is a block of its own marked for provider-side prompt caching, the part with the filled in values follows.
 
-    except Exception as e:
-        raise Exception(f"Error loading prompt {prompt_name}: {str(e)}")
+    Args:
+        prompt_name: Name of the prompt file without .txt extension
+        replacements: Placeholders of the template and their values
+        provider: Name of the prompt provider
+
+    Returns:
+        List of text content blocks
+    """
+    template = load_prompt(prompt_name, provider)
+    replacements = replacements or {}
+
+    positions = [template.find(placeholder) for placeholder in replacements if placeholder in template]
+    split_at = min(positions) if positions else len(template)
+    static_part, dynamic_part = template[:split_at], template[split_at:]
+    for placeholder, value in replacements.items():
+        dynamic_part = dynamic_part.replace(placeholder, value)
+
+    blocks = []
+    if static_part.strip():
+        blocks.append({"type": "text", "text": static_part})
+        if Config.LLM_PROMPT_CACHING:
+            blocks[0]["cache_control"] = {"type": "ephemeral"}
+    if dynamic_part:
+        blocks.append({"type": "text", "text": dynamic_part})
+    return blocks
 
 
 def extract_json(response_text: str) -> dict:
@@ -0,0 +1,218 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Mapping, Optional
+
+
+class PolitenessPolicy:
+    """
+    Spaces out requests to a host by a random delay, like a polite crawler.
+    Only the thread that is about to hit the host waits for its turn.
+    """
+
+    def __init__(self, min_delay_seconds: float, max_delay_seconds: float):
+        self.min_delay_seconds = min_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self._next_turn_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait_turn(self) -> float:
+        """
+        Block until the caller may hit the host and reserve the following slot for the next caller.
+
+        Returns:
+            Seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            turn_at = max(now, self._next_turn_at)
+            self._next_turn_at = turn_at + random.uniform(self.min_delay_seconds, self.max_delay_seconds)
+
+        wait_seconds = turn_at - now
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+
+class TokenBucket:
+    """
+    Continuously refilled budget. Callers reserve from it up front and may leave it in debt,
+    in which case they wait until the refill has paid the debt back.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """
+        Returns:
+            Seconds to wait before the reserved amount may be used
+        """
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        if self.level >= 0:
+            return 0.0
+        return -self.level / self.refill_per_second
+
+    def refund(self, amount: float, now: float):
+        self._refill(now)
+        self.level = min(self.level + amount, self.capacity)
+
+    def set_limit(self, limit: float, now: float, period_seconds: float = 60.0):
+        self._refill(now)
+        self.capacity = limit
+        self.refill_per_second = limit / period_seconds
+        self.level = min(self.level, limit)
+
+    def sync(self, remaining: float, now: float):
+        # The server's count wins when it has less left than we think
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+    """
+        Helper functions
+    """
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+
+class AdaptiveRateLimiter:
+    """
+    Paces requests and tokens per minute for every thread sharing it, ahead of the server's limits.
+    It starts from the configured limits and adapts to the limits, remaining budgets and resets
+    that the server reports in its rate limit headers. A retry-after pauses all the callers.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 0) -> float:
+        """
+        Block until one request using the given number of tokens may be sent.
+
+        Returns:
+            Seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait_seconds = max(
+                self._paused_until - now,
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now)
+            )
+
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+        return max(wait_seconds, 0.0)
+
+    def record_usage(self, reserved_tokens: float, used_tokens: float):
+        """Correct the token budget once the actual usage of a request is known"""
+        with self._lock:
+            now = time.monotonic()
+            if used_tokens < reserved_tokens:
+                self.tokens.refund(reserved_tokens - used_tokens, now)
+            else:
+                self.tokens.reserve(used_tokens - reserved_tokens, now)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str], requests_prefix: str, tokens_prefix: str):
+        """
+        Adapt to the '<prefix>-limit', '<prefix>-remaining' and '<prefix>-reset' headers of the request
+        and token budgets, and to the 'retry-after' header.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for bucket, prefix in ((self.requests, requests_prefix), (self.tokens, tokens_prefix)):
+                limit = _parse_float(headers.get(f"{prefix}-limit"))
+                remaining = _parse_float(headers.get(f"{prefix}-remaining"))
+                reset_seconds = parse_reset_seconds(headers.get(f"{prefix}-reset"))
+
+                if limit:
+                    bucket.set_limit(limit, now)
+                if remaining is not None:
+                    bucket.sync(remaining, now)
+                    if remaining <= 0 and reset_seconds:
+                        self._paused_until = max(self._paused_until, now + reset_seconds)
+
+            retry_after = _parse_float(headers.get("retry-after"))
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+
+class RetryPolicy:
+    """
+    Bounded retries with jittered exponential backoff
+
+    Args:
+        max_attempts: Max number of attempts, the first one included
+        base_delay_seconds: Backoff of the first retry
+        max_delay_seconds: Cap of the backoff
+        deadline_seconds: Total time after which no more attempts are made
+    """
+
+    def __init__(self, max_attempts: int, base_delay_seconds: float, max_delay_seconds: float,
+                 deadline_seconds: Optional[float] = None):
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.deadline_seconds = deadline_seconds
+
+    def get_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Args:
+            attempt: Number of the attempt that just failed, starting at 1
+            retry_after: Delay requested by the server, if any
+
+        Returns:
+            Seconds to wait before the next attempt
+        """
+        backoff = min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempt - 1))
+        # Full jitter, so that the threads that failed together don't retry together
+        delay = random.uniform(0, backoff)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay_seconds)
+        return delay
+
+    def can_retry(self, attempt: int, elapsed_seconds: float, delay_seconds: float = 0.0) -> bool:
+        if attempt >= self.max_attempts:
+            return False
+        if self.deadline_seconds is not None and elapsed_seconds + delay_seconds > self.deadline_seconds:
+            return False
+        return True
+
+
+def parse_reset_seconds(value: Optional[str]) -> Optional[float]:
+    """
+    Returns:
+        Seconds until a reset given as a number of seconds or an RFC 3339 timestamp
+    """
+    if not value:
+        return None
+
+    seconds = _parse_float(value)
+    if seconds is not None:
+        return max(seconds, 0.0)
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except ValueError:
+        return None
+
+
+def _parse_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
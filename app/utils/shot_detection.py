@@ -0,0 +1,166 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import cv2
+import numpy as np
+
+from app.config.settings import Config
+from app.utils.video import perceptual_hash
+
+
+def downscale_frame(frame: np.ndarray, width: Optional[int] = None) -> np.ndarray:
+    """
+    Downscaled version of a frame for the shot boundary detection, Config.SCENE_DETECTION_WIDTH wide by default
+    (0 keeps the frame size). Area averaging keeps the mean difference of a cut, it only smooths out the noise of
+    fine textures.
+    """
+    width = Config.SCENE_DETECTION_WIDTH if width is None else width
+    height, frame_width = frame.shape[:2]
+    if width and frame_width > width:
+        size = (width, max(round(height * width / frame_width), 1))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+class ShotDetector(ABC):
+    """
+    Tells whether a frame starts a new shot, by comparing a reduced version of it with the one of the frame before.
+    Frames are reduced once and the reductions compared pairwise, so the scene differences of a video can be
+    computed in parallel segments and the boundaries decided afterwards (see VideoProcessorService.scan_segment).
+
+    Args:
+        threshold: Difference above which a frame starts a new shot
+    """
+    name = None
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    @abstractmethod
+    def reduce(self, frame: np.ndarray):
+        """Reduced version of a BGR frame, the only thing get_difference gets to see"""
+
+    @abstractmethod
+    def get_difference(self, reduced, prev_reduced) -> float:
+        """Difference between the reductions of a frame and of the frame before it"""
+
+    def get_boundary_test(self) -> Callable[[float], bool]:
+        """
+        Test deciding whether a difference is a shot boundary, for one scan.
+        It is given the differences of the frames outside the cooldown after a keyframe, in order,
+        so a test can keep state about the video (see AdaptiveThresholdDetector).
+        """
+        return lambda difference: difference > self.threshold
+
+
+class MeanDifferenceDetector(ShotDetector):
+    """Mean absolute difference of the grayscale frames, cheap but sensitive to motion"""
+    name = "mean_difference"
+
+    def reduce(self, frame: np.ndarray) -> np.ndarray:
+        return cv2.cvtColor(downscale_frame(frame), cv2.COLOR_BGR2GRAY)
+
+    def get_difference(self, reduced, prev_reduced) -> float:
+        return float(np.mean(cv2.absdiff(reduced, prev_reduced)))
+
+
+class HistogramDetector(ShotDetector):
+    """Bhattacharyya distance of the hue/saturation histograms, ignores where things are so pans barely register"""
+    name = "histogram"
+
+    def __init__(self, threshold: float, bins: tuple = (16, 8)):
+        super().__init__(threshold)
+        self.bins = list(bins)
+
+    def reduce(self, frame: np.ndarray) -> np.ndarray:
+        hsv = cv2.cvtColor(downscale_frame(frame), cv2.COLOR_BGR2HSV)
+        histogram = cv2.calcHist([hsv], [0, 1], None, self.bins, [0, 180, 0, 256])
+        return cv2.normalize(histogram, histogram).flatten()
+
+    def get_difference(self, reduced, prev_reduced) -> float:
+        return float(cv2.compareHist(reduced, prev_reduced, cv2.HISTCMP_BHATTACHARYYA))
+
+
+class HashDetector(ShotDetector):
+    """Number of differing bits of the perceptual hashes, the same measure the keyframe deduplication uses"""
+    name = "phash"
+
+    def reduce(self, frame: np.ndarray) -> int:
+        return perceptual_hash(downscale_frame(frame))
+
+    def get_difference(self, reduced, prev_reduced) -> float:
+        return float(bin(reduced ^ prev_reduced).count("1"))
+
+
+class AdaptiveThresholdDetector(ShotDetector):
+    """
+    Another detector whose threshold follows the recent differences of the video: mean plus factor standard
+    deviations of the last window_size ones, but never below min_ratio of the detector's own threshold.
+    Shots with a lot of motion need a bigger jump to count as a cut, and cuts between still shots are caught.
+
+    Args:
+        detector: Detector providing the differences
+        window_size: Number of recent differences the threshold is computed from
+        factor: Number of standard deviations above the mean a boundary must be
+        min_ratio: Lower bound of the threshold, as a ratio of the threshold of detector
+        min_samples: Number of differences needed before the threshold adapts, detector's threshold until then
+    """
+    name = "adaptive"
+
+    def __init__(self, detector: ShotDetector, window_size: int, factor: float, min_ratio: float,
+                 min_samples: int = 5):
+        super().__init__(detector.threshold)
+        self.detector = detector
+        self.window_size = window_size
+        self.factor = factor
+        self.min_ratio = min_ratio
+        self.min_samples = min_samples
+
+    def reduce(self, frame: np.ndarray):
+        return self.detector.reduce(frame)
+
+    def get_difference(self, reduced, prev_reduced) -> float:
+        return self.detector.get_difference(reduced, prev_reduced)
+
+    def get_boundary_test(self) -> Callable[[float], bool]:
+        differences = deque(maxlen=self.window_size)
+
+        def is_boundary(difference: float) -> bool:
+            threshold = self.threshold
+            if len(differences) >= self.min_samples:
+                mean = sum(differences) / len(differences)
+                deviation = math.sqrt(sum((value - mean) ** 2 for value in differences) / len(differences))
+                threshold = max(mean + self.factor * deviation, self.threshold * self.min_ratio)
+            # The first frame of the video has no difference
+            if math.isfinite(difference):
+                differences.append(difference)
+            return difference > threshold
+
+        return is_boundary
+
+
+def get_shot_detector(name: Optional[str] = None) -> ShotDetector:
+    """
+    Shot detector by name (Config.SHOT_DETECTOR by default), with the thresholds of Config.SHOT_DETECTOR_THRESHOLDS.
+    "adaptive" adapts the threshold of Config.SHOT_DETECTOR_ADAPTIVE_BASE.
+    """
+    name = name or Config.SHOT_DETECTOR
+    if name == AdaptiveThresholdDetector.name:
+        return AdaptiveThresholdDetector(
+            get_shot_detector(Config.SHOT_DETECTOR_ADAPTIVE_BASE),
+            window_size=Config.SHOT_DETECTOR_ADAPTIVE_WINDOW,
+            factor=Config.SHOT_DETECTOR_ADAPTIVE_FACTOR,
+            min_ratio=Config.SHOT_DETECTOR_ADAPTIVE_MIN_RATIO
+        )
+    if name not in SHOT_DETECTORS:
+        raise ValueError(f"Unknown shot detector: {name}")
+    return SHOT_DETECTORS[name](Config.SHOT_DETECTOR_THRESHOLDS[name])
+
+
+SHOT_DETECTORS: Dict[str, type] = {
+    detector.name: detector for detector in (MeanDifferenceDetector, HistogramDetector, HashDetector)
+}
+# Every name get_shot_detector accepts
+SHOT_DETECTOR_NAMES = list(SHOT_DETECTORS) + [AdaptiveThresholdDetector.name]
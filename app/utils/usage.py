@@ -0,0 +1,173 @@
+import threading
+from dataclasses import dataclass, fields
+from enum import Enum
+from typing import Dict, Optional
+
+from app.config.settings import Config
+from app.utils.context import get_llm_usage_tracker
+
+
+class BudgetState(Enum):
+    OK = "ok"
+    # Calls are moved to cheaper models
+    DEGRADED = "degraded"
+    # Optional stages are skipped as well
+    EXHAUSTED = "exhausted"
+
+
+@dataclass
+class LlmUsage:
+    calls: int = 0
+    cached_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_write_tokens: int = 0
+    cache_read_tokens: int = 0
+    cost_usd: float = 0.0
+
+    @classmethod
+    def from_response(cls, model: str, usage: dict, batch: bool = False) -> "LlmUsage":
+        """
+        Args:
+            model: Model that answered the request
+            usage: Usage block of the response
+            batch: The request went through a message batch, which is billed at a discount
+        """
+        result = cls(
+            calls=1,
+            input_tokens=usage.get("input_tokens", 0) or 0,
+            output_tokens=usage.get("output_tokens", 0) or 0,
+            cache_write_tokens=usage.get("cache_creation_input_tokens", 0) or 0,
+            cache_read_tokens=usage.get("cache_read_input_tokens", 0) or 0
+        )
+        result.cost_usd = get_llm_cost(model, result, batch)
+        return result
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens + self.cache_write_tokens + self.cache_read_tokens
+
+    def add(self, other: "LlmUsage"):
+        for usage_field in fields(self):
+            setattr(self, usage_field.name, getattr(self, usage_field.name) + getattr(other, usage_field.name))
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "cached_calls": self.cached_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "total_tokens": self.total_tokens,
+            "cost_usd": round(self.cost_usd, 6)
+        }
+
+
+@dataclass
+class LlmBudget:
+    """
+    Token and/or cost limit of an ingestion job. It is checked before each call, so calls already in flight
+    when it is reached can overshoot it.
+    """
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    degrade_ratio: float = Config.LLM_BUDGET_DEGRADE_RATIO
+
+    @classmethod
+    def from_config(cls) -> Optional["LlmBudget"]:
+        if Config.LLM_JOB_TOKEN_BUDGET is None and Config.LLM_JOB_COST_BUDGET_USD is None:
+            return None
+        return cls(Config.LLM_JOB_TOKEN_BUDGET, Config.LLM_JOB_COST_BUDGET_USD)
+
+    def get_state(self, usage: LlmUsage) -> BudgetState:
+        spent = max(
+            usage.total_tokens / self.max_tokens if self.max_tokens else 0.0,
+            usage.cost_usd / self.max_cost_usd if self.max_cost_usd else 0.0
+        )
+        if spent >= 1:
+            return BudgetState.EXHAUSTED
+        if spent >= self.degrade_ratio:
+            return BudgetState.DEGRADED
+        return BudgetState.OK
+
+    def to_dict(self) -> dict:
+        return {"max_tokens": self.max_tokens, "max_cost_usd": self.max_cost_usd, "degrade_ratio": self.degrade_ratio}
+
+
+class UsageTracker:
+    """
+    Aggregates the LLM usage of a job or of the whole process by model, agent method and post
+
+    Args:
+        budget: Optional budget to enforce on the tracked calls
+        track_posts: Keep the usage of every post, off for the process-wide tracker so that it doesn't grow forever
+    """
+
+    def __init__(self, budget: Optional[LlmBudget] = None, track_posts: bool = True):
+        self.budget = budget
+        self.track_posts = track_posts
+        self.total = LlmUsage()
+        self.by_model: Dict[str, LlmUsage] = {}
+        self.by_method: Dict[str, LlmUsage] = {}
+        self.by_post: Dict[str, LlmUsage] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> BudgetState:
+        if self.budget is None:
+            return BudgetState.OK
+        with self.lock:
+            return self.budget.get_state(self.total)
+
+    def record(self, model: str, method: str, usage: LlmUsage, post_id=None):
+        with self.lock:
+            self.total.add(usage)
+            self.by_model.setdefault(model, LlmUsage()).add(usage)
+            self.by_method.setdefault(method, LlmUsage()).add(usage)
+            if self.track_posts and post_id is not None:
+                self.by_post.setdefault(str(post_id), LlmUsage()).add(usage)
+
+    def to_dict(self, include_posts: bool = True) -> dict:
+        with self.lock:
+            usage = {
+                "total": self.total.to_dict(),
+                "by_model": {model: value.to_dict() for model, value in self.by_model.items()},
+                "by_method": {method: value.to_dict() for method, value in self.by_method.items()}
+            }
+            if include_posts and self.track_posts:
+                usage["by_post"] = {post_id: value.to_dict() for post_id, value in self.by_post.items()}
+            if self.budget is not None:
+                usage["budget"] = {**self.budget.to_dict(), "state": self.budget.get_state(self.total).value}
+        return usage
+
+
+def get_llm_cost(model: str, usage: LlmUsage, batch: bool = False) -> float:
+    """Cost in USD of the tokens of a call, 0 for models without a price"""
+    prices = Config.LLM_PRICES.get(model)
+    if prices is None:
+        return 0.0
+
+    input_price = prices["input"] / 1_000_000
+    cost = (
+        usage.input_tokens * input_price
+        + usage.cache_write_tokens * input_price * Config.LLM_PROMPT_CACHE_WRITE_COST_RATIO
+        + usage.cache_read_tokens * input_price * Config.LLM_PROMPT_CACHE_READ_COST_RATIO
+        + usage.output_tokens * prices["output"] / 1_000_000
+    )
+    return cost * Config.LLM_BATCH_COST_RATIO if batch else cost
+
+
+def get_llm_budget_state() -> BudgetState:
+    """Budget state of the job the current task works for"""
+    tracker = get_llm_usage_tracker()
+    return tracker.state if tracker is not None else BudgetState.OK
+
+
+def is_skipped_for_budget(stage: str) -> bool:
+    """Whether an optional stage is skipped because the budget of the current job is used up"""
+    return stage in Config.LLM_BUDGET_OPTIONAL_STAGES and get_llm_budget_state() == BudgetState.EXHAUSTED
+
+
+# Usage of every LLM call of the process
+usage_tracker = UsageTracker(track_posts=False)
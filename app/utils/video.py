@@ -1,27 +1,186 @@
 import base64
-import io
-from typing import List, Optional
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
 
 import cv2
 import numpy as np
-from PIL import Image
 
 from app.config.settings import Config
 
 
-def frame_to_base64(frame: np.ndarray) -> dict:
-    """Convert frame to base64 for API transmission."""
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    pil_image = Image.fromarray(rgb_frame)
-    buffer = io.BytesIO()
-    pil_image.save(buffer, format="JPEG", quality=95)
-    image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+def encode_frame(frame: np.ndarray, quality: int = 95) -> bytes:
+    """Encode a BGR frame as JPEG bytes, e.g. for a keyframe store or the LLM API."""
+    success, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise ValueError("Could not encode frame")
+    return buffer.tobytes()
 
-    return {
+
+def decode_frame(data: bytes) -> np.ndarray:
+    """Decode JPEG bytes back to a BGR frame."""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def load_frame(frame) -> np.ndarray:
+    """The frame as an array, decoded if it comes from a keyframe store (see app.utils.frame_store)"""
+    return frame if isinstance(frame, np.ndarray) else frame.load()
+
+
+@dataclass(frozen=True)
+class ImagePolicy:
+    """Size and quality of the frames sent to the LLM"""
+    max_edge: Optional[int] = None
+    quality: int = 95
+
+
+def get_image_policy(call_site: str) -> ImagePolicy:
+    policy = Config.IMAGE_POLICIES.get(call_site, Config.IMAGE_POLICIES["default"])
+    return ImagePolicy(**policy)
+
+
+# Encoded frames by frame object and policy, least recently used first. Entries are dropped when the frame is
+# garbage collected, or evicted past Config.ENCODED_FRAME_MEMO_SIZE so stored frames don't all stay encoded in memory
+_encoded_frames: "OrderedDict[Tuple[int, ImagePolicy], dict]" = OrderedDict()
+_tracked_frames = set()
+_encoded_frames_lock = threading.RLock()
+
+
+def frame_to_base64(frame, policy: Optional[ImagePolicy] = None) -> dict:
+    """
+    Convert frame to base64 for API transmission.
+    A frame is encoded once per policy, the other calls get the memoized image block while it is among the most
+    recently used.
+    Stored frames are only decoded when they are not memoized yet.
+    """
+    policy = policy or ImagePolicy()
+    key = (id(frame), policy)
+    with _encoded_frames_lock:
+        image = _encoded_frames.get(key)
+        if image is not None:
+            _encoded_frames.move_to_end(key)
+            return image
+
+    pixels = load_frame(frame)
+    height, width = pixels.shape[:2]
+    if policy.max_edge and max(height, width) > policy.max_edge:
+        scale = policy.max_edge / max(height, width)
+        frame_to_encode = cv2.resize(
+            pixels, (max(int(width * scale), 1), max(int(height * scale), 1)), interpolation=cv2.INTER_AREA
+        )
+    else:
+        frame_to_encode = pixels
+    image_base64 = base64.b64encode(encode_frame(frame_to_encode, policy.quality)).decode('utf-8')
+
+    image = {
         "type": "image",
         "source": {
             "type": "base64",
             "media_type": "image/jpeg",
             "data": image_base64
         }
-    }
\ No newline at end of file
+    }
+
+    with _encoded_frames_lock:
+        frame_id = id(frame)
+        if frame_id not in _tracked_frames:
+            _tracked_frames.add(frame_id)
+            weakref.finalize(frame, _forget_frame, frame_id)
+        _encoded_frames[key] = image
+        while len(_encoded_frames) > Config.ENCODED_FRAME_MEMO_SIZE:
+            _encoded_frames.popitem(last=False)
+    return image
+
+
+def perceptual_hash(frame) -> int:
+    """64 bit DCT hash of the frame, close frames have hashes a few bits apart"""
+    frame = load_frame(frame)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_frequencies = cv2.dct(small)[:8, :8].flatten()
+    # The DC term only reflects the overall brightness
+    bits = low_frequencies > np.median(low_frequencies[1:])
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def prune_similar_frames(keyframes: List[tuple], max_distance: int = Config.IMAGE_DEDUP_MAX_DISTANCE,
+                         frame_index: int = 2) -> List[tuple]:
+    """
+    Drop keyframes that are near duplicates of an earlier kept keyframe
+
+    Args:
+        keyframes: Keyframe tuples, e.g. (frame number, frame time, frame)
+        max_distance: Max number of differing hash bits for two frames to count as duplicates, negative keeps all
+        frame_index: Position of the frame in the tuples
+
+    Returns:
+        The kept keyframes, in order
+    """
+    if max_distance < 0:
+        return keyframes
+
+    kept, kept_hashes = [], []
+    for keyframe in keyframes:
+        frame_hash = perceptual_hash(keyframe[frame_index])
+        if any(bin(frame_hash ^ kept_hash).count("1") <= max_distance for kept_hash in kept_hashes):
+            continue
+        kept.append(keyframe)
+        kept_hashes.append(frame_hash)
+
+    if len(kept) < len(keyframes):
+        print(f"Pruned {len(keyframes) - len(kept)} near duplicate keyframes out of {len(keyframes)}")
+    return kept
+
+
+def order_by_information(keyframes: List[tuple], frame_index: int = 2) -> List[tuple]:
+    """
+    Order keyframes so that every prefix covers the video as well as possible: the sharpest frame first,
+    then each time the frame whose perceptual hash is the farthest from the frames already picked
+
+    Args:
+        keyframes: Keyframe tuples, e.g. (frame number, frame time, frame)
+        frame_index: Position of the frame in the tuples
+
+    Returns:
+        The same keyframes, most informative first
+    """
+    if len(keyframes) <= 2:
+        return list(keyframes)
+
+    hashes, sharpness = [], []
+    for keyframe in keyframes:
+        # Stored frames are decoded once for both measures
+        frame = load_frame(keyframe[frame_index])
+        hashes.append(perceptual_hash(frame))
+        sharpness.append(_get_sharpness(frame))
+    remaining = list(range(len(keyframes)))
+    first = max(remaining, key=lambda i: sharpness[i])
+    order = [first]
+    remaining.remove(first)
+    # Distance of each remaining frame to the closest picked frame
+    distances = {i: bin(hashes[i] ^ hashes[first]).count("1") for i in remaining}
+
+    while remaining:
+        # Ties go to the earliest frame
+        best = max(remaining, key=lambda i: (distances[i], -i))
+        order.append(best)
+        remaining.remove(best)
+        for i in remaining:
+            distances[i] = min(distances[i], bin(hashes[i] ^ hashes[best]).count("1"))
+
+    return [keyframes[i] for i in order]
+
+
+def _get_sharpness(frame: np.ndarray) -> float:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (256, 256), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(small, cv2.CV_64F).var())
+
+
+def _forget_frame(frame_id: int):
+    with _encoded_frames_lock:
+        _tracked_frames.discard(frame_id)
+        for key in [key for key in _encoded_frames if key[0] == frame_id]:
+            del _encoded_frames[key]
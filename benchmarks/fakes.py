@@ -0,0 +1,279 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Set, Iterable
+
+from app.services.client.s3_service import S3Service
+from app.services.client.scraper_service import ScraperService
+from app.services.client.vector_db_service import VectorDBService
+from app.utils.prompt import load_prompt
+
+
+class FixtureScraperService(ScraperService):
+    """
+    Serves local MP4 fixtures instead of scraping TikTok. Each URL always maps to the same fixture.
+    """
+
+    def __init__(self, fixtures: List[str], latency_seconds: float = 0.0):
+        super().__init__(driver=None)
+        self.fixtures = fixtures
+        self.latency_seconds = latency_seconds
+
+    def download_video(self, video_url: str, filename: str) -> str | None:
+        fixture = self.fixtures[zlib.crc32(video_url.encode('utf-8')) % len(self.fixtures)]
+        download_path = os.path.join(tempfile.gettempdir(), filename)
+
+        time.sleep(self.latency_seconds)
+        shutil.copyfile(fixture, download_path)
+        return download_path
+
+
+class LocalS3Service(S3Service):
+    """
+    S3 stand-in keeping the buckets as folders of a local directory
+    """
+
+    def __init__(self, root_dir: str):
+        self.client = None
+        self.root_dir = root_dir
+
+    def exists_in_bucket(self, bucket_name: str, filename: str) -> bool:
+        return os.path.exists(self._path(bucket_name, filename))
+
+    def upload_to_s3(self, bucket_name: str, filename: str, temp_file: str) -> str | None:
+        path = self._path(bucket_name, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(temp_file, path)
+        return f"s3://{bucket_name}/{filename}"
+
+    def download_from_s3(self, s3_url: str, local_path: str) -> bool:
+        bucket_name = s3_url.split("/")[2]
+        key = "/".join(s3_url.split("/")[3:])
+        try:
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            shutil.copyfile(self._path(bucket_name, key), local_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    """
+        Helper functions
+    """
+
+    def _path(self, bucket_name: str, key: str) -> str:
+        return os.path.join(self.root_dir, bucket_name, key)
+
+
+class InMemoryVectorDBService(VectorDBService):
+    """
+    Vector DB stand-in keeping the collections in memory. Search is a plain substring match.
+    """
+
+    def __init__(self):
+        super().__init__(client=None)
+        self.collections: Dict[str, Dict[str, dict]] = {}
+        self.lock = threading.Lock()
+
+    def create_collection(self, schema: dict) -> bool:
+        with self.lock:
+            self.collections.setdefault(schema['collection_name'], {})
+        return True
+
+    def batch_add(self, schema: dict, records: List[dict]):
+        primary_key = schema['primary_key']
+        with self.lock:
+            collection = self.collections.setdefault(schema['collection_name'], {})
+            for record in records:
+                collection[str(record[primary_key])] = record
+        return True
+
+    def records_exist(self, schema: dict, primary_keys: Iterable) -> Set[str]:
+        with self.lock:
+            collection = self.collections.get(schema['collection_name'], {})
+            return {str(key) for key in primary_keys if str(key) in collection}
+
+    def search(self, schema: dict, query: str, limit: int = 5, offset: int = 0) -> Optional[List[dict]]:
+        with self.lock:
+            records = list(self.collections.get(schema['collection_name'], {}).values())
+        matches = [record for record in records if query.lower() in json.dumps(record).lower()]
+        return matches[offset:offset + limit]
+
+
+class StubLlmServer:
+    """
+    Local HTTP server speaking the subset of the Messages and Message Batches APIs the LLM agent uses.
+    It answers every request with a canned response for its prompt after a fixed latency.
+    A batch ends once the latency has passed since it was created.
+    """
+
+    CANNED_RESPONSES = {
+        "style_feature_extractor": json.dumps({"face_visible": True, "hand_visible": True, "product_visible": True}),
+        "visual_feature_extractor": json.dumps({
+            "subject": {
+                name: {"description": "Benchmark description", "score": 7}
+                for name in ("appearance", "camera_proximity", "contrast_with_background", "expressiveness")
+            },
+            "background": {
+                name: {"description": "Benchmark description", "score": 6}
+                for name in ("appeal", "lighting_quality", "distracting_elements")
+            },
+            "text_overlay": {
+                "main_text": {"description": "This serum changed my skin", "score": 8},
+                "presence": {"description": "PRESENT", "score": 8}
+            },
+            "overall_score": 7.0
+        }),
+        "hook_frame_analyzer": json.dumps({
+            "screen_hook": "This serum changed my skin",
+            "visual_style_summary": "Creator holds the product up to the camera while talking to the viewer",
+            "visual_style": "Close-up selfie shot in a bright bathroom.",
+            "audio_style": "Energetic voiceover with trending music.",
+            "creator_instructions": "1. Hold the product close to the lens in the first second."
+        }),
+        "UGC_style_identifier": "Hook & Sell"
+    }
+
+    def __init__(self, latency_seconds: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency_seconds = latency_seconds
+        self.requests = Counter()
+        self.markers = self._get_markers()
+        self.batches: Dict[str, dict] = {}
+        self.batches_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._get_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stub-llm", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1/messages"
+
+    @property
+    def batch_url(self) -> str:
+        return f"{self.url}/batches"
+
+    def start(self) -> "StubLlmServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    """
+        Helper functions
+    """
+
+    def _get_markers(self) -> List[tuple]:
+        # The start of each prompt, up to its first placeholder, identifies the request
+        markers = []
+        for name in self.CANNED_RESPONSES:
+            prompt = load_prompt(name)
+            markers.append((name, prompt.split("{")[0][:200].strip()))
+        return markers
+
+    def _get_response_text(self, payload: dict) -> tuple[str, str]:
+        content = payload["messages"][0]["content"]
+        text = content if isinstance(content, str) else next(
+            (block["text"] for block in content if block.get("type") == "text"), ""
+        )
+        for name, marker in self.markers:
+            if marker and text.startswith(marker):
+                return name, self.CANNED_RESPONSES[name]
+        return "unknown", "Benchmark response"
+
+    def _get_message(self, payload: dict) -> dict:
+        name, text = self._get_response_text(payload)
+        self.requests[name] += 1
+        return {
+            "id": "msg_benchmark",
+            "type": "message",
+            "role": "assistant",
+            "model": payload.get("model"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": len(json.dumps(payload)) // 4, "output_tokens": len(text) // 4}
+        }
+
+    def _create_batch(self, payload: dict) -> dict:
+        with self.batches_lock:
+            batch_id = f"msgbatch_{len(self.batches) + 1}"
+            self.batches[batch_id] = {"created_at": time.monotonic(), "requests": payload["requests"]}
+        self.requests["batches"] += 1
+        return self._get_batch(batch_id)
+
+    def _get_batch(self, batch_id: str) -> Optional[dict]:
+        with self.batches_lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        ended = time.monotonic() - batch["created_at"] >= self.latency_seconds
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "results_url": f"{self.batch_url}/{batch_id}/results" if ended else None
+        }
+
+    def _get_batch_results(self, batch_id: str) -> Optional[str]:
+        with self.batches_lock:
+            batch = self.batches.get(batch_id)
+        if batch is None:
+            return None
+        return "\n".join(
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "result": {"type": "succeeded", "message": self._get_message(request["params"])}
+            })
+            for request in batch["requests"]
+        )
+
+    def _get_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if self.path.rstrip("/").endswith("/batches"):
+                    self._send_json(stub._create_batch(payload))
+                    return
+
+                time.sleep(stub.latency_seconds)
+                self._send_json(stub._get_message(payload))
+
+            def do_GET(self):
+                parts = self.path.rstrip("/").split("/")
+                if parts[-1] == "results":
+                    results = stub._get_batch_results(parts[-2])
+                    if results is None:
+                        self._send(404, b"", "text/plain")
+                    else:
+                        self._send(200, results.encode('utf-8'), "application/x-jsonl")
+                    return
+
+                batch = stub._get_batch(parts[-1])
+                if batch is None:
+                    self._send(404, b"", "text/plain")
+                else:
+                    self._send_json(batch)
+
+            def _send_json(self, payload: dict):
+                self._send(200, json.dumps(payload).encode('utf-8'), "application/json")
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
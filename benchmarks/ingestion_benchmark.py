@@ -0,0 +1,263 @@
+"""
+Offline end-to-end ingestion benchmark.
+
+Replays an ingest request through IngestionService.process against local stand-ins: the scraper serves MP4 fixtures,
+S3 is a local directory, the vector DB lives in memory and the LLM is a stub server with a configurable latency.
+Transcription, audio analysis and frame decoding run for real, so the numbers reflect the CPU work of an ingest.
+
+Usage:
+    python -m benchmarks.ingestion_benchmark --limit 10 --llm-latency 1.5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from app.config.settings import Config
+
+# Row helpers of IngestionService timed as pipeline stages, shared by the streaming and the batch modes
+TIMED_STAGES = {
+    "download": "_get_video_links",
+    "prepare_media": "_prepare_media",
+    "transcribe": "_transcribe_video",
+    "features": "_extract_features",
+    "style": "_extract_style_features",
+    "hook": "_get_hook",
+    "visual": "_extract_visual_features",
+    "audio": "_extract_audio_features",
+    "shooting_style": "_extract_shooting_style",
+    "cleanup": "_cleanup_local_files",
+    "vector_db": "add_to_vector_db"
+}
+
+
+class StageTimer:
+    """
+    Collects the duration of every call of the wrapped functions, per stage
+    """
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def wrap(self, stage: str, func):
+        @wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.durations[stage].append(time.perf_counter() - start)
+
+        return timed
+
+    def report(self) -> List[dict]:
+        rows = []
+        for stage in TIMED_STAGES:
+            durations = sorted(self.durations.get(stage, []))
+            if not durations:
+                continue
+            rows.append({
+                "stage": stage,
+                "calls": len(durations),
+                "total_seconds": sum(durations),
+                "mean_seconds": statistics.mean(durations),
+                "p95_seconds": durations[min(int(len(durations) * 0.95), len(durations) - 1)]
+            })
+        return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline offline")
+    parser.add_argument("--input", default="input/ingest_request.json", help="Ingest request to replay")
+    parser.add_argument("--limit", type=int, default=None, help="Number of posts to replay")
+    parser.add_argument("--mode", choices=["streaming", "batch"], default=None,
+                        help="Ingestion mode, defaults to Config.STREAMING_INGESTION")
+    parser.add_argument("--fixtures-dir", default=None,
+                        help="Directory of MP4 fixtures, generated with ffmpeg when not provided")
+    parser.add_argument("--fixture-count", type=int, default=3, help="Number of fixtures to generate")
+    parser.add_argument("--fixture-seconds", type=float, default=15, help="Duration of the generated fixtures")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Latency of the stub LLM in seconds")
+    parser.add_argument("--deferred-llm", action="store_true", help="Send the LLM requests through message batches")
+    parser.add_argument("--batch-wait", type=float, default=2.0,
+                        help="Max wait before a partial message batch is sent, and poll interval of the batches")
+    parser.add_argument("--download-latency", type=float, default=0.5, help="Latency of the fixture scraper")
+    parser.add_argument("--download-delay", type=float, default=0.0,
+                        help="Politeness delay between downloads from the same host")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="Keep the artifact and LLM caches between runs instead of starting from empty ones")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+
+def generate_fixtures(directory: str, count: int, duration: float) -> List[str]:
+    """
+    Generate test-pattern MP4s with a tone, changing the hue every 2 seconds so that scene detection finds keyframes
+    """
+    os.makedirs(directory, exist_ok=True)
+    fixtures = []
+    for i in range(count):
+        path = os.path.join(directory, f"fixture_{i}.mp4")
+        fixtures.append(path)
+        if os.path.exists(path):
+            continue
+
+        print(f"Generating fixture {path}...")
+        subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc2=size=576x1024:rate=30:duration={duration}",
+            "-f", "lavfi", "-i", f"sine=frequency={220 * (i + 1)}:duration={duration}",
+            "-vf", f"hue=H=2*PI*floor(t/2)/7+{i}",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest",
+            path
+        ], check=True)
+    return fixtures
+
+
+def get_peak_rss_mb() -> Dict[str, Optional[float]]:
+    if resource is None:
+        return {"process": None, "children": None}
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "process": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    }
+
+
+def configure(args, work_dir: str, llm_server):
+    Config.LLM_API_URL = llm_server.url
+    Config.LLM_BATCH_API_URL = llm_server.batch_url
+    Config.LLM_BATCH_MAX_WAIT_SECONDS = args.batch_wait
+    Config.LLM_BATCH_POLL_SECONDS = args.batch_wait
+    Config.LLM_API_KEY = "benchmark"
+    Config.DOWNLOAD_MIN_DELAY_SECONDS = args.download_delay
+    Config.DOWNLOAD_MAX_DELAY_SECONDS = args.download_delay
+    Config.RESUME_INGESTION_ON_STARTUP = False
+    if args.mode:
+        Config.STREAMING_INGESTION = args.mode == "streaming"
+    if not args.warm_cache:
+        Config.ARTIFACT_CACHE_DIR = os.path.join(work_dir, "artifacts")
+        Config.LLM_CACHE_DIR = os.path.join(work_dir, "llm_cache")
+
+
+def build_service(args, work_dir: str, fixtures: List[str], timer: StageTimer):
+    # Imported after the configuration since some services read it when they are created
+    from app.services.client.download_scheduler_service import DownloadSchedulerService
+    from app.services.ingestion_journal_service import IngestionJournalService
+    from app.services.ingestion_service import IngestionService
+    from benchmarks.fakes import FixtureScraperService, InMemoryVectorDBService, LocalS3Service
+
+    service = IngestionService()
+    service.s3 = LocalS3Service(os.path.join(work_dir, "s3"))
+    service.vector_db = InMemoryVectorDBService()
+    service.scraper = FixtureScraperService(fixtures, args.download_latency)
+    service.download_scheduler = DownloadSchedulerService(service.scraper)
+    service.journal = IngestionJournalService(os.path.join(work_dir, "journal.db"))
+
+    # Instance attributes shadow the methods, so both ingestion modes call the timed versions
+    for stage, method_name in TIMED_STAGES.items():
+        setattr(service, method_name, timer.wrap(stage, getattr(service, method_name)))
+    return service
+
+
+def print_report(report: dict):
+    print()
+    print(f"Posts: {report['posts']} replayed, {report['saved']} saved "
+          f"({report['mode']} mode, {report['llm_mode']} LLM calls)")
+    print(f"Wall time: {report['wall_seconds']:.1f}s, {report['posts_per_minute']:.2f} posts/minute")
+
+    rss = report['peak_rss_mb']
+    if rss['process'] is not None:
+        print(f"Peak RSS: {rss['process']:.0f} MB (largest worker process {rss['children']:.0f} MB)")
+
+    print()
+    print(f"{'stage':<16}{'calls':>8}{'total s':>12}{'mean s':>12}{'p95 s':>12}")
+    for row in report['stages']:
+        print(f"{row['stage']:<16}{row['calls']:>8}{row['total_seconds']:>12.2f}"
+              f"{row['mean_seconds']:>12.2f}{row['p95_seconds']:>12.2f}")
+
+    print()
+    print("LLM requests: " + ", ".join(f"{name}={count}" for name, count in sorted(report['llm_requests'].items())))
+
+    print()
+    print(f"{'LLM method':<28}{'calls':>8}{'cached':>8}{'tokens':>12}{'cost $':>12}")
+    for method, usage in sorted(report['llm_usage']['by_method'].items()):
+        print(f"{method:<28}{usage['calls']:>8}{usage['cached_calls']:>8}{usage['total_tokens']:>12}"
+              f"{usage['cost_usd']:>12.4f}")
+
+
+def main():
+    args = parse_args()
+
+    from benchmarks.fakes import StubLlmServer
+    from app.services.compute.process_pool_service import ProcessPoolService
+    from app.utils.dataframe import get_dataframe
+    from app.utils.usage import usage_tracker
+
+    with open(args.input, 'r', encoding='utf-8') as file:
+        records = json.load(file)
+    if args.limit:
+        records = records[:args.limit]
+
+    with tempfile.TemporaryDirectory(prefix="tapestry_benchmark_") as work_dir:
+        fixtures_dir = args.fixtures_dir or os.path.join(tempfile.gettempdir(), "tapestry_benchmark_fixtures")
+        fixtures = sorted(
+            os.path.join(fixtures_dir, name) for name in os.listdir(fixtures_dir) if name.endswith(".mp4")
+        ) if args.fixtures_dir else generate_fixtures(fixtures_dir, args.fixture_count, args.fixture_seconds)
+        if not fixtures:
+            raise ValueError(f"No MP4 fixtures found in {fixtures_dir}")
+
+        llm_server = StubLlmServer(args.llm_latency).start()
+        configure(args, work_dir, llm_server)
+
+        timer = StageTimer()
+        service = build_service(args, work_dir, fixtures, timer)
+        posts = get_dataframe(records)
+
+        try:
+            start = time.perf_counter()
+            saved_posts = service.process(posts, deferred_llm=args.deferred_llm)
+            wall_seconds = time.perf_counter() - start
+        finally:
+            # Worker processes only count towards the children's peak RSS once they have exited
+            ProcessPoolService.shutdown(wait=True)
+            llm_server.stop()
+
+    report = {
+        "mode": "streaming" if Config.STREAMING_INGESTION or args.deferred_llm else "batch",
+        "llm_mode": "deferred" if args.deferred_llm else "interactive",
+        "posts": len(records),
+        "saved": len(saved_posts or []),
+        "wall_seconds": wall_seconds,
+        "posts_per_minute": len(records) / wall_seconds * 60 if wall_seconds else 0.0,
+        "peak_rss_mb": get_peak_rss_mb(),
+        "stages": timer.report(),
+        "llm_requests": dict(llm_server.requests),
+        "llm_usage": usage_tracker.to_dict()
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
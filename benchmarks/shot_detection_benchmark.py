@@ -0,0 +1,138 @@
+"""
+Offline shot detection benchmark.
+
+Extracts the keyframes of local MP4 fixtures with each shot detector of app/utils/shot_detection.py and reports the
+decoding speed and the number of keyframes, along with the number of images left once near duplicates are pruned,
+which is what the style analysis sends to the LLM.
+Generated fixtures change hue every 2 seconds, so their expected number of keyframes is known.
+
+Usage:
+    python -m benchmarks.shot_detection_benchmark --detectors mean_difference adaptive --repeat 3
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import tempfile
+import time
+from typing import List, Optional
+
+import cv2
+
+from app.utils.shot_detection import SHOT_DETECTOR_NAMES, get_shot_detector
+from app.utils.video import prune_similar_frames
+from benchmarks.ingestion_benchmark import generate_fixtures
+
+# Seconds between the hue changes of the generated fixtures
+FIXTURE_SHOT_SECONDS = 2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the shot detectors of the keyframe extraction")
+    parser.add_argument("--detectors", nargs="+", choices=SHOT_DETECTOR_NAMES, default=SHOT_DETECTOR_NAMES,
+                        help="Shot detectors to compare")
+    parser.add_argument("--fixtures-dir", default=None,
+                        help="Directory of MP4 fixtures, generated with ffmpeg when not provided")
+    parser.add_argument("--fixture-count", type=int, default=3, help="Number of fixtures to generate")
+    parser.add_argument("--fixture-seconds", type=float, default=15, help="Duration of the generated fixtures")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per detector and fixture, the median is kept")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file")
+    return parser.parse_args()
+
+
+def get_frame_count(video_path: str) -> int:
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frame_count
+
+
+def get_expected_keyframes(duration: float) -> int:
+    # One keyframe per shot plus the last frame, which is always included
+    return math.ceil(duration / FIXTURE_SHOT_SECONDS) + 1
+
+
+def benchmark_detector(name: str, fixtures: List[str], repeat: int, expected: Optional[int]) -> dict:
+    from app.services.visual.video_processor_service import VideoProcessorService
+
+    video_processor = VideoProcessorService(shot_detector=get_shot_detector(name))
+    frames = keyframes = images = errors = 0
+    seconds = 0.0
+    for fixture in fixtures:
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fixture_keyframes = video_processor.extract_keyframes(fixture)
+            durations.append(time.perf_counter() - start)
+
+        frames += get_frame_count(fixture)
+        seconds += statistics.median(durations)
+        keyframes += len(fixture_keyframes)
+        images += len(prune_similar_frames(fixture_keyframes))
+        if expected is not None:
+            errors += abs(len(fixture_keyframes) - expected)
+
+    return {
+        "detector": name,
+        "fixtures": len(fixtures),
+        "frames": frames,
+        "seconds": seconds,
+        "frames_per_second": frames / seconds if seconds else 0.0,
+        "keyframes": keyframes,
+        "images": images,
+        "keyframe_errors": errors if expected is not None else None
+    }
+
+
+def print_report(report: dict):
+    print()
+    print(f"Fixtures: {report['fixtures']}, {report['repeat']} run(s) each")
+    if report['expected_keyframes'] is not None:
+        print(f"Expected keyframes per fixture: {report['expected_keyframes']}")
+
+    print()
+    print(f"{'detector':<18}{'frames':>10}{'seconds':>10}{'frames/s':>10}{'keyframes':>11}{'images':>8}{'errors':>8}")
+    for row in report['detectors']:
+        errors = row['keyframe_errors'] if row['keyframe_errors'] is not None else "-"
+        print(f"{row['detector']:<18}{row['frames']:>10}{row['seconds']:>10.2f}{row['frames_per_second']:>10.0f}"
+              f"{row['keyframes']:>11}{row['images']:>8}{errors:>8}")
+
+
+def main():
+    args = parse_args()
+
+    if args.fixtures_dir:
+        fixtures = sorted(
+            os.path.join(args.fixtures_dir, name) for name in os.listdir(args.fixtures_dir) if name.endswith(".mp4")
+        )
+        expected = None
+    else:
+        # Fixtures are reused between runs, keep the ones of each duration apart so the expected count holds
+        fixtures_dir = os.path.join(
+            tempfile.gettempdir(), f"tapestry_shot_detection_fixtures_{args.fixture_seconds:g}s"
+        )
+        fixtures = generate_fixtures(fixtures_dir, args.fixture_count, args.fixture_seconds)
+        expected = get_expected_keyframes(args.fixture_seconds)
+    if not fixtures:
+        raise ValueError(f"No MP4 fixtures found in {args.fixtures_dir}")
+
+    report = {
+        "fixtures": len(fixtures),
+        "repeat": args.repeat,
+        "expected_keyframes": expected,
+        # Fewest images sent to the LLM first, then the fastest
+        "detectors": sorted(
+            (benchmark_detector(name, fixtures, args.repeat, expected) for name in args.detectors),
+            key=lambda row: (row['images'], row['seconds'])
+        )
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
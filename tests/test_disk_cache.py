@@ -0,0 +1,89 @@
+import os
+import stat
+import time
+
+import pytest
+
+from app.utils.disk_cache import DiskCache
+
+# Each value below takes 102 bytes once stored as JSON
+VALUE = "x" * 100
+
+
+def _set_access_time(cache: DiskCache, key: str, access_time: float):
+    path = cache._path(key)
+    os.utime(path, (access_time, os.stat(path).st_mtime))
+
+
+def test_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_size_bytes=10_000)
+    key = DiskCache.make_key("post", 1)
+
+    cache.set(key, {"features": (1, 2), "text": "hook"})
+
+    assert cache.get(key) == {"features": [1, 2], "text": "hook"}
+    assert cache.get(DiskCache.make_key("post", 2), "missing") == "missing"
+
+
+def test_make_key_separates_parts():
+    assert DiskCache.make_key("ab", "c") != DiskCache.make_key("a", "bc")
+    assert DiskCache.make_key("a", b"b") == DiskCache.make_key("a", "b")
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_size_bytes=350)
+    keys = [DiskCache.make_key(name) for name in "abcd"]
+    for key, access_time in zip(keys[:3], (100, 200, 300)):
+        cache.set(key, VALUE)
+        _set_access_time(cache, key, access_time)
+
+    # Reading the oldest entry makes the second one the least recently used
+    assert cache.get(keys[0]) == VALUE
+    cache.set(keys[3], VALUE)
+
+    assert cache.get(keys[1]) is None
+    assert [cache.get(key) for key in (keys[0], keys[2], keys[3])] == [VALUE] * 3
+
+
+def test_size_survives_reopening(tmp_path):
+    directory = str(tmp_path / "cache")
+    cache = DiskCache(directory, max_size_bytes=350)
+    for name in "abc":
+        cache.set(DiskCache.make_key(name), VALUE)
+
+    reopened = DiskCache(directory, max_size_bytes=350)
+    reopened.set(DiskCache.make_key("d"), VALUE)
+
+    assert sum(reopened.get(DiskCache.make_key(name)) is not None for name in "abcd") == 3
+
+
+def test_expired_entries_are_missing(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_size_bytes=10_000, ttl_seconds=60)
+    key = DiskCache.make_key("a")
+    cache.set(key, VALUE)
+    old = time.time() - 120
+    os.utime(cache._path(key), (old, old))
+
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+
+
+def test_unserializable_value_is_not_stored(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_size_bytes=10_000)
+    key = DiskCache.make_key("a")
+
+    cache.set(key, object())
+
+    assert cache.get(key) is None
+    assert not any(files for _, _, files in os.walk(cache.directory))
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+def test_directory_is_private(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir(mode=0o755)
+    os.chmod(directory, 0o755)
+
+    DiskCache(str(directory), max_size_bytes=10_000)
+
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
@@ -0,0 +1,24 @@
+from app.services.visual.frame_reader_service import VideoIndex
+
+
+def test_keyframe_before():
+    index = VideoIndex(fps=30, frame_count=100, keyframes=[0, 30, 60])
+
+    assert index.get_keyframe_before(0) == 0
+    assert index.get_keyframe_before(29) == 0
+    assert index.get_keyframe_before(30) == 30
+    assert index.get_keyframe_before(99) == 60
+
+
+def test_no_keyframe_before():
+    assert VideoIndex(fps=30, frame_count=100, keyframes=[10]).get_keyframe_before(5) is None
+    assert VideoIndex(fps=30, frame_count=100).get_keyframe_before(50) is None
+
+
+def test_frame_number_is_clamped():
+    index = VideoIndex(fps=30, frame_count=100)
+
+    assert index.get_frame_number(1.0) == 30
+    assert index.get_frame_number(-1.0) == 0
+    assert index.get_frame_number(10.0) == 99
+    assert VideoIndex(fps=30, frame_count=0).get_frame_number(10.0) == 300
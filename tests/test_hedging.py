@@ -0,0 +1,95 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.utils.hedging import HedgePolicy, hedged_call
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield executor
+
+
+def _runs(*behaviours):
+    """Call whose nth run sleeps for the nth delay, then returns its value or raises it"""
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def func():
+        with lock:
+            delay, outcome = behaviours[next(counter)]
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return func
+
+
+def test_fast_call_is_not_hedged(executor):
+    assert hedged_call(executor, _runs((0, "ok")), delay_seconds=1) == ("ok", "not_hedged")
+
+
+def test_hedge_wins_over_slow_original(executor):
+    discarded = []
+
+    result = hedged_call(executor, _runs((0.5, "slow"), (0, "fast")), delay_seconds=0.05,
+                         on_discarded=discarded.append)
+
+    assert result == ("fast", "hedge")
+    executor.shutdown(wait=True)
+    assert len(discarded) == 1 and discarded[0].result() == "slow"
+
+
+def test_failure_does_not_beat_a_slower_success(executor):
+    result = hedged_call(executor, _runs((0.2, "ok"), (0, "rate_limited")), delay_seconds=0.05,
+                         is_success=lambda outcome: outcome == "ok")
+
+    assert result == ("ok", "original")
+
+
+def test_error_does_not_beat_a_slower_success(executor):
+    result = hedged_call(executor, _runs((0.2, "ok"), (0, ConnectionError("reset"))), delay_seconds=0.05)
+
+    assert result == ("ok", "original")
+
+
+def test_last_failure_is_returned_when_both_fail(executor):
+    result = hedged_call(executor, _runs((0.2, "overloaded"), (0, "rate_limited")), delay_seconds=0.05,
+                         is_success=lambda outcome: outcome == "ok")
+
+    assert result == ("overloaded", "original")
+
+
+def test_error_is_raised_when_both_raise(executor):
+    with pytest.raises(ConnectionError):
+        hedged_call(executor, _runs((0.2, ConnectionError("a")), (0, ConnectionError("b"))), delay_seconds=0.05)
+
+
+def test_policy_needs_enough_samples():
+    policy = HedgePolicy(percentile=0.9, min_samples=3, window_size=10)
+    policy.observe("summary", 1.0)
+    policy.observe("summary", 2.0)
+
+    assert policy.get_delay("summary") is None
+    assert policy.get_delay("hook") is None
+
+
+def test_policy_delay_is_the_latency_percentile():
+    policy = HedgePolicy(percentile=0.9, min_samples=3, window_size=10, min_delay_seconds=0.5)
+    for seconds in range(1, 11):
+        policy.observe("summary", seconds / 10)
+
+    assert policy.get_delay("summary") == 1.0
+
+
+def test_policy_keeps_recent_latencies_above_the_minimum():
+    policy = HedgePolicy(percentile=0.5, min_samples=1, window_size=2, min_delay_seconds=0.5)
+    for seconds in (10.0, 0.1, 0.2):
+        policy.observe("summary", seconds)
+
+    assert policy.get_delay("summary") == 0.5
@@ -0,0 +1,144 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from app.models.job import JobStatus, PostStatus
+from app.services.job_service import JobService
+
+
+class FakeJournal:
+    def __init__(self, unfinished=()):
+        self.unfinished = list(unfinished)
+        self.cancelled = []
+
+    def get_unfinished(self):
+        return [{"post_id": post_id} for post_id in self.unfinished]
+
+    def mark_cancelled(self, post_ids):
+        self.cancelled.extend(post_ids)
+
+
+class FakeIngestionService:
+    """Saves the first post of a job, then waits to be released before finishing or failing"""
+
+    def __init__(self, error: Exception = None):
+        self.journal = FakeJournal()
+        self.error = error
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def process_streaming(self, posts, job, deferred_llm=False):
+        self.started.set()
+        job.add_results([{"post_id": str(posts['post_id'].iloc[0])}])
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return job.results
+
+    def resume(self, job):
+        return self.process_streaming(pd.DataFrame({'post_id': self.journal.unfinished}), job)
+
+
+@pytest.fixture
+def ingestion_service():
+    return FakeIngestionService()
+
+
+@pytest.fixture
+def job_service(ingestion_service):
+    job_service = JobService(ingestion_service)
+    yield job_service
+    ingestion_service.release.set()
+    job_service.executor.shutdown(wait=True)
+
+
+def _posts(*post_ids) -> pd.DataFrame:
+    return pd.DataFrame({'post_id': list(post_ids)})
+
+
+def _wait_finished(job_service: JobService, job):
+    job_service.executor.submit(lambda: None).result(timeout=5)
+    assert job.is_finished
+
+
+def _statuses(job) -> dict:
+    return {post_id: progress.status for post_id, progress in job.posts.items()}
+
+
+def test_job_completes(job_service, ingestion_service):
+    job = job_service.submit(_posts("1"))
+    ingestion_service.release.set()
+    _wait_finished(job_service, job)
+
+    assert job.status == JobStatus.COMPLETED
+    assert _statuses(job) == {"1": PostStatus.SAVED}
+    assert job.started_at and job.finished_at
+
+
+def test_failed_job_fails_its_unfinished_posts(job_service, ingestion_service):
+    ingestion_service.error = RuntimeError("scraper down")
+    job = job_service.submit(_posts("1", "2"))
+    ingestion_service.release.set()
+    _wait_finished(job_service, job)
+
+    assert job.status == JobStatus.FAILED
+    assert job.error == "scraper down"
+    assert _statuses(job) == {"1": PostStatus.SAVED, "2": PostStatus.FAILED}
+
+
+def test_cancel_running_job(job_service, ingestion_service):
+    job = job_service.submit(_posts("1", "2"))
+    assert ingestion_service.started.wait(5)
+
+    assert job_service.cancel(job.job_id).status == JobStatus.CANCELLING
+    assert job.cancel_event.is_set()
+    assert ingestion_service.journal.cancelled == ["2"]
+
+    ingestion_service.release.set()
+    _wait_finished(job_service, job)
+    assert job.status == JobStatus.CANCELLED
+    assert _statuses(job) == {"1": PostStatus.SAVED, "2": PostStatus.CANCELLED}
+
+
+def test_cancel_queued_job(job_service, ingestion_service):
+    running = job_service.submit(_posts("1"))
+    assert ingestion_service.started.wait(5)
+    queued = job_service.submit(_posts("2", "3"))
+
+    assert job_service.cancel(queued.job_id).status == JobStatus.CANCELLED
+    assert queued.finished_at is not None
+    assert _statuses(queued) == {"2": PostStatus.CANCELLED, "3": PostStatus.CANCELLED}
+    assert sorted(ingestion_service.journal.cancelled) == ["2", "3"]
+
+    ingestion_service.release.set()
+    _wait_finished(job_service, running)
+    # The worker skips the cancelled job instead of starting it
+    assert queued.started_at is None
+    assert queued.status == JobStatus.CANCELLED
+
+
+def test_cancel_finished_or_unknown_job(job_service, ingestion_service):
+    job = job_service.submit(_posts("1"))
+    ingestion_service.release.set()
+    _wait_finished(job_service, job)
+
+    assert job_service.cancel(job.job_id).status == JobStatus.COMPLETED
+    assert job_service.cancel("unknown") is None
+    assert ingestion_service.journal.cancelled == []
+
+
+def test_resume_runs_once(job_service, ingestion_service):
+    ingestion_service.journal.unfinished = ["1", "2"]
+
+    job = job_service.resume()
+    assert job_service.resume() is job
+    assert job.total == 2
+
+    ingestion_service.release.set()
+    _wait_finished(job_service, job)
+    assert job.status == JobStatus.COMPLETED
+
+
+def test_nothing_to_resume(job_service):
+    assert job_service.resume() is None
@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.utils.rate_limit import AdaptiveRateLimiter, RetryPolicy, TokenBucket, parse_reset_seconds
+
+REQUESTS_PREFIX = "anthropic-ratelimit-requests"
+TOKENS_PREFIX = "anthropic-ratelimit-input-tokens"
+
+
+def test_token_bucket_waits_for_its_debt():
+    bucket = TokenBucket(capacity=10, refill_per_second=2)
+    now = bucket.updated_at
+
+    assert bucket.reserve(10, now) == 0.0
+    assert bucket.reserve(4, now) == pytest.approx(2.0)
+    # One second later the refill has paid half of the debt back
+    assert bucket.reserve(0, now + 1) == pytest.approx(1.0)
+
+
+def test_token_bucket_caps_reservations_at_capacity():
+    bucket = TokenBucket(capacity=10, refill_per_second=1)
+    now = bucket.updated_at
+
+    assert bucket.reserve(50, now) == 0.0
+
+
+def test_acquire_does_not_wait_within_limits():
+    limiter = AdaptiveRateLimiter(requests_per_minute=60, tokens_per_minute=10_000)
+
+    assert limiter.acquire(1000) == 0.0
+
+
+def test_pause_holds_back_every_caller():
+    limiter = AdaptiveRateLimiter(requests_per_minute=60, tokens_per_minute=10_000)
+
+    limiter.pause(0.05)
+    start = time.monotonic()
+    waited = limiter.acquire()
+
+    assert waited > 0
+    assert time.monotonic() - start >= 0.04
+
+
+def test_record_usage_refunds_overestimates():
+    limiter = AdaptiveRateLimiter(requests_per_minute=60, tokens_per_minute=60)
+    limiter.acquire(60)
+
+    limiter.record_usage(reserved_tokens=60, used_tokens=10)
+
+    assert limiter.tokens.level == pytest.approx(50, abs=1)
+
+
+def test_headers_set_limits_and_pause():
+    limiter = AdaptiveRateLimiter(requests_per_minute=1000, tokens_per_minute=100_000)
+
+    limiter.update_from_headers({
+        f"{REQUESTS_PREFIX}-limit": "50",
+        f"{TOKENS_PREFIX}-limit": "20000",
+        f"{TOKENS_PREFIX}-remaining": "0",
+        f"{TOKENS_PREFIX}-reset": "30"
+    }, REQUESTS_PREFIX, TOKENS_PREFIX)
+
+    assert limiter.requests.capacity == 50
+    assert limiter.tokens.capacity == 20000
+    assert limiter.tokens.level <= 0
+    assert limiter._paused_until - time.monotonic() == pytest.approx(30, abs=1)
+
+
+def test_retry_after_header_pauses():
+    limiter = AdaptiveRateLimiter(requests_per_minute=1000, tokens_per_minute=100_000)
+
+    limiter.update_from_headers({"retry-after": "12"}, REQUESTS_PREFIX, TOKENS_PREFIX)
+
+    assert limiter._paused_until - time.monotonic() == pytest.approx(12, abs=1)
+
+
+def test_parse_reset_seconds():
+    reset_at = (datetime.now(timezone.utc) + timedelta(seconds=30)).isoformat().replace("+00:00", "Z")
+
+    assert parse_reset_seconds("1.5") == 1.5
+    assert parse_reset_seconds("-3") == 0.0
+    assert parse_reset_seconds(reset_at) == pytest.approx(30, abs=1)
+    assert parse_reset_seconds("soon") is None
+    assert parse_reset_seconds(None) is None
+
+
+def test_retry_policy_delays():
+    policy = RetryPolicy(max_attempts=3, base_delay_seconds=1, max_delay_seconds=4)
+
+    for attempt in range(1, 6):
+        assert 0 <= policy.get_delay(attempt) <= min(2 ** (attempt - 1), 4)
+    assert 10 <= policy.get_delay(1, retry_after=10) <= 11
+
+
+def test_retry_policy_limits():
+    policy = RetryPolicy(max_attempts=3, base_delay_seconds=1, max_delay_seconds=4, deadline_seconds=10)
+
+    assert policy.can_retry(2, elapsed_seconds=5, delay_seconds=1)
+    assert not policy.can_retry(3, elapsed_seconds=0)
+    assert not policy.can_retry(1, elapsed_seconds=8, delay_seconds=3)
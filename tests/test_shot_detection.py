@@ -0,0 +1,94 @@
+import math
+
+import cv2
+import numpy as np
+import pytest
+
+from app.config.settings import Config
+from app.utils.shot_detection import (
+    SHOT_DETECTOR_NAMES, AdaptiveThresholdDetector, HashDetector, MeanDifferenceDetector, ShotDetector,
+    downscale_frame, get_shot_detector
+)
+
+BASE_DETECTORS = ["mean_difference", "histogram", "phash"]
+
+
+def _shot_frame(seed: int) -> np.ndarray:
+    # Large blocks of saturated colors, each seed a different shot
+    rng = np.random.default_rng(seed)
+    hsv = np.stack([
+        rng.integers(0, 180, (4, 4)), rng.integers(150, 256, (4, 4)), rng.integers(50, 256, (4, 4))
+    ], axis=-1).astype(np.uint8)
+    blocks = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+    return cv2.resize(blocks, (640, 360), interpolation=cv2.INTER_NEAREST)
+
+
+def _difference(detector: ShotDetector, frame: np.ndarray, prev_frame: np.ndarray) -> float:
+    return detector.get_difference(detector.reduce(frame), detector.reduce(prev_frame))
+
+
+def test_shot_detector_is_abstract():
+    with pytest.raises(TypeError):
+        ShotDetector(threshold=1.0)
+
+
+def test_downscale_keeps_the_aspect_ratio():
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+    assert downscale_frame(frame, 320).shape == (180, 320, 3)
+    assert downscale_frame(frame, 0).shape == frame.shape
+    assert downscale_frame(frame[:100, :200], 320).shape == (100, 200, 3)
+
+
+@pytest.mark.parametrize("name", SHOT_DETECTOR_NAMES)
+def test_get_shot_detector(name):
+    detector = get_shot_detector(name)
+
+    assert detector.name == name
+    assert detector.threshold == Config.SHOT_DETECTOR_THRESHOLDS.get(name, detector.threshold)
+
+
+def test_unknown_shot_detector():
+    with pytest.raises(ValueError):
+        get_shot_detector("unknown")
+
+
+@pytest.mark.parametrize("name", BASE_DETECTORS)
+def test_cut_crosses_the_threshold(name):
+    detector = get_shot_detector(name)
+    frame, other_shot = _shot_frame(0), _shot_frame(1)
+    is_boundary = detector.get_boundary_test()
+
+    assert _difference(detector, frame, frame) == pytest.approx(0, abs=1e-6)
+    assert not is_boundary(_difference(detector, frame, frame))
+    assert is_boundary(_difference(detector, other_shot, frame))
+
+
+def test_hash_difference_counts_bits():
+    assert HashDetector(threshold=14).get_difference(0b1011, 0b0001) == 2
+
+
+def test_adaptive_threshold_follows_the_video():
+    detector = AdaptiveThresholdDetector(
+        MeanDifferenceDetector(threshold=15), window_size=10, factor=3.0, min_ratio=0.5, min_samples=5
+    )
+    is_boundary = detector.get_boundary_test()
+
+    # Busy video: differences around 20 are motion, not cuts
+    assert is_boundary(math.inf)
+    for difference in (18, 22, 19, 21, 20):
+        is_boundary(difference)
+    assert not is_boundary(22)
+    assert is_boundary(40)
+
+
+def test_adaptive_threshold_catches_cuts_between_still_shots():
+    detector = AdaptiveThresholdDetector(
+        MeanDifferenceDetector(threshold=15), window_size=10, factor=3.0, min_ratio=0.5, min_samples=5
+    )
+    is_boundary = detector.get_boundary_test()
+
+    for difference in (1, 1, 1, 1, 1):
+        assert not is_boundary(difference)
+    # Below the base threshold, above the floor of min_ratio of it
+    assert is_boundary(10)
@@ -0,0 +1,73 @@
+import base64
+
+import cv2
+import numpy as np
+
+from app.config.settings import Config
+from app.utils import video
+from app.utils.video import ImagePolicy, frame_to_base64, order_by_information, perceptual_hash, prune_similar_frames
+
+
+def _noise_frame(seed: int) -> np.ndarray:
+    # Blocky noise, so the frames differ in the low frequencies the perceptual hash looks at
+    blocks = np.random.default_rng(seed).integers(0, 200, (9, 16, 3), dtype=np.uint8)
+    return cv2.resize(blocks, (320, 180), interpolation=cv2.INTER_NEAREST)
+
+
+def _keyframes(frames) -> list:
+    return [(number, number / 30, frame) for number, frame in enumerate(frames)]
+
+
+def test_brightness_does_not_change_the_hash():
+    frame = _noise_frame(0)
+
+    assert perceptual_hash(frame) == perceptual_hash(frame + 20)
+    assert bin(perceptual_hash(frame) ^ perceptual_hash(_noise_frame(1))).count("1") > Config.IMAGE_DEDUP_MAX_DISTANCE
+
+
+def test_prune_drops_near_duplicates():
+    first, second = _noise_frame(0), _noise_frame(1)
+    keyframes = _keyframes([first, first + 3, second, second])
+
+    assert [number for number, _, _ in prune_similar_frames(keyframes)] == [0, 2]
+
+
+def test_prune_keeps_everything_when_disabled():
+    frame = _noise_frame(0)
+    keyframes = _keyframes([frame, frame])
+
+    assert prune_similar_frames(keyframes, max_distance=-1) == keyframes
+
+
+def test_order_starts_with_the_sharpest_then_the_most_different():
+    sharp = _noise_frame(0)
+    blurred = cv2.GaussianBlur(_noise_frame(1), (31, 31), 0)
+    keyframes = _keyframes([blurred, sharp, cv2.GaussianBlur(sharp, (3, 3), 0)])
+
+    # The softened copy of the sharpest frame is a near duplicate of it, so it comes last
+    assert [number for number, _, _ in order_by_information(keyframes)] == [1, 0, 2]
+
+
+def test_order_keeps_short_lists():
+    keyframes = _keyframes([_noise_frame(0), _noise_frame(1)])
+
+    assert order_by_information(keyframes) == keyframes
+
+
+def test_encoded_frames_are_memoized(monkeypatch):
+    monkeypatch.setattr(Config, "ENCODED_FRAME_MEMO_SIZE", 2)
+    frames = [_noise_frame(seed) for seed in range(3)]
+    policy = ImagePolicy(max_edge=160, quality=80)
+
+    image = frame_to_base64(frames[0], policy)
+    assert frame_to_base64(frames[0], policy) is image
+    assert frame_to_base64(frames[0], ImagePolicy(quality=80)) is not image
+
+    data = base64.b64decode(image["source"]["data"])
+    decoded = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (90, 160, 3)
+
+    for frame in frames[1:]:
+        frame_to_base64(frame, policy)
+    assert len(video._encoded_frames) <= 2
+    assert (id(frames[0]), policy) not in video._encoded_frames